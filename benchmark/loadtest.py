@@ -0,0 +1,207 @@
+"""
+chat.completions のデプロイメントに対する負荷試験
+
+model/o1-gpt-4.py と同じクライアント（AZURE_OPENAI_ENDPOINT、または AZURE_OPENAI_DEPLOYMENTS の複数接続先）で
+ストリーミングのリクエストを送り、同時実行数・プロンプト長・max_completion_tokens の組み合わせごとに
+以下を計測する。
+
+    - 応答完了までの時間（p50 / p95 / p99）
+    - 最初のトークンまでの時間（TTFT、p50 / p95 / p99）
+    - 1リクエストあたりの生成速度（トークン/秒）
+    - エラー率（429 とそれ以外）
+    - スループット（リクエスト/秒、出力トークン/秒）
+
+使い方:
+    python benchmark/loadtest.py --model gpt-4o --concurrency 1 4 16 --prompt-tokens 100 2000 --max-completion-tokens 256 1024
+    python benchmark/loadtest.py --standin --llm-latency 0.3 --chunk-delay 0.01 --error-rate 0.05  # ローカルの代替サービスで試す
+"""
+
+import argparse
+import concurrent.futures
+import itertools
+import json
+import os
+import sys
+import time
+
+from dotenv import load_dotenv
+
+from standins import ChatStandIn, _percentile
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(REPO_DIR)
+from utils.client_pool import DEFAULT_API_VERSION, create_azure_client, supports_stream_usage
+
+PROMPT_WORD = "token "  # 英単語1つがおよそ1トークン
+
+
+def build_prompt(prompt_tokens):
+    # おおよそ指定したトークン数になるプロンプトを作る
+    filler = (PROMPT_WORD * max(prompt_tokens - 20, 0)).strip()
+    return f"次の文字列を無視して、大規模言語モデルの特徴をできるだけ長く説明してください。\n{filler}"
+
+
+def run_request(client, model, prompt, max_completion_tokens, stream_usage=True):
+    """
+    ストリーミングで1リクエストを送り、所要時間を計測する
+
+    Args:
+        client: AzureOpenAIクライアント
+        model: デプロイ名
+        prompt: プロンプト
+        max_completion_tokens: 生成するトークン数の上限
+        stream_usage: 応答の最後に使用量を返させるか（Falseなら生成トークン数は断片の数で数える）
+
+    Returns:
+        dict: latency, ttft, completion_tokens, tokens_per_second, error
+    """
+    start = time.perf_counter()
+    first_token = None
+    chunks = 0
+    usage_tokens = None
+    # stream_options は古いAPIバージョンでは400になるので、対応している場合だけ送る
+    options = {"stream_options": {"include_usage": True}} if stream_usage else {}
+    try:
+        stream = client.chat.completions.create(
+            model=model,
+            messages=[{"role": "user", "content": prompt}],
+            max_completion_tokens=max_completion_tokens,
+            stream=True,
+            **options
+        )
+        for chunk in stream:
+            if chunk.usage is not None:
+                usage_tokens = chunk.usage.completion_tokens
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                chunks += 1
+    except Exception as e:
+        status = getattr(e, "status_code", None)
+        return {"latency": time.perf_counter() - start, "error": f"{status}" if status else type(e).__name__}
+
+    end = time.perf_counter()
+    completion_tokens = usage_tokens if usage_tokens is not None else chunks
+    generation_time = end - first_token if first_token is not None else 0.0
+    return {
+        "latency": end - start,
+        "ttft": first_token - start if first_token is not None else None,
+        "completion_tokens": completion_tokens,
+        # 最初のトークン以降の生成速度
+        "tokens_per_second": (completion_tokens - 1) / generation_time if generation_time > 0 and completion_tokens > 1 else None,
+        "error": None
+    }
+
+
+def distribution(values):
+    return {"p50": _percentile(values, 50), "p95": _percentile(values, 95), "p99": _percentile(values, 99)}
+
+
+def run_scenario(client, model, concurrency, prompt_tokens, max_completion_tokens, requests, stream_usage=True):
+    """
+    1つの条件でリクエストを同時に送り、結果を集計する
+
+    Args:
+        client: AzureOpenAIクライアント
+        model: デプロイ名
+        concurrency: 同時実行数
+        prompt_tokens: プロンプトのおおよそのトークン数
+        max_completion_tokens: 生成するトークン数の上限
+        requests: 送るリクエスト数
+        stream_usage: 応答の最後に使用量を返させるか
+
+    Returns:
+        dict: 集計結果
+    """
+    prompt = build_prompt(prompt_tokens)
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(lambda _: run_request(client, model, prompt, max_completion_tokens, stream_usage), range(requests)))
+    wall = time.perf_counter() - start
+
+    succeeded = [r for r in results if r["error"] is None]
+    errors = {}
+    for r in results:
+        if r["error"] is not None:
+            errors[r["error"]] = errors.get(r["error"], 0) + 1
+    output_tokens = sum(r["completion_tokens"] for r in succeeded)
+    return {
+        "concurrency": concurrency,
+        "prompt_tokens": prompt_tokens,
+        "max_completion_tokens": max_completion_tokens,
+        "requests": requests,
+        "wall": wall,
+        "latency": distribution([r["latency"] for r in succeeded]),
+        "ttft": distribution([r["ttft"] for r in succeeded if r["ttft"] is not None]),
+        "tokens_per_second": distribution([r["tokens_per_second"] for r in succeeded if r["tokens_per_second"] is not None]),
+        "completion_tokens_mean": output_tokens / len(succeeded) if succeeded else 0.0,
+        "error_rate": (requests - len(succeeded)) / requests if requests else 0.0,
+        "errors": errors,
+        "throughput": len(succeeded) / wall if wall else 0.0,          # リクエスト/秒
+        "output_tokens_per_second": output_tokens / wall if wall else 0.0
+    }
+
+
+def print_report(scenarios):
+    print(f"\n{'並列':>4} {'入力':>6} {'上限':>6} | {'応答 p50/p95/p99 (s)':>22} | {'TTFT p50/p95/p99 (s)':>22} | "
+          f"{'tok/s p50':>9} | {'エラー':>6} | {'req/s':>6} {'出力tok/s':>9}")
+    for s in scenarios:
+        latency, ttft = s["latency"], s["ttft"]
+        print(f"{s['concurrency']:>4} {s['prompt_tokens']:>6} {s['max_completion_tokens']:>6} | "
+              f"{latency['p50']:6.2f} {latency['p95']:6.2f} {latency['p99']:6.2f}   | "
+              f"{ttft['p50']:6.2f} {ttft['p95']:6.2f} {ttft['p99']:6.2f}   | "
+              f"{s['tokens_per_second']['p50']:9.1f} | {s['error_rate']:6.1%} | {s['throughput']:6.2f} {s['output_tokens_per_second']:9.1f}")
+        if s["errors"]:
+            print(f"{'':>19}エラーの内訳: {json.dumps(s['errors'], ensure_ascii=False)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='chat.completions のデプロイメントに対する負荷試験')
+    parser.add_argument('--model', type=str, default='gpt-4o', help='デプロイ名（o1-gpt-4.py と同じ）')
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16], help='同時実行数（複数指定で順に計測）')
+    parser.add_argument('--prompt-tokens', type=int, nargs='+', default=[200], help='プロンプトのおおよそのトークン数（複数指定可）')
+    parser.add_argument('--max-completion-tokens', type=int, nargs='+', default=[512], help='生成トークン数の上限（複数指定可）')
+    parser.add_argument('--requests', type=int, default=20, help='条件ごとのリクエスト数')
+    parser.add_argument('--api-version', type=str, default=DEFAULT_API_VERSION, help='APIバージョン（2024-09-01 より前なら使用量を要求せず、断片の数で数える）')
+    parser.add_argument('--max-retries', type=int, default=0, help='SDKの再試行回数（既定0: 429などをそのままエラーとして数える）')
+    parser.add_argument('--output', type=str, help='計測結果を書き出すJSONファイル')
+    parser.add_argument('--standin', action='store_true', help='ローカルの代替サービスに対して計測する')
+    parser.add_argument('--llm-latency', type=float, default=0.3, help='代替サービスの最初の応答までの遅延（秒）')
+    parser.add_argument('--chunk-delay', type=float, default=0.01, help='代替サービスのトークン間隔（秒）')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='代替サービスが429を返す割合')
+    args = parser.parse_args()
+
+    # 実際のデプロイメントに対して計測する場合は .env から接続先を読み込む
+    load_dotenv()
+    stand_in = None
+    if args.standin:
+        stand_in = ChatStandIn(args.llm_latency, completion_chars=100000, chunk_delay=args.chunk_delay, error_rate=args.error_rate)
+        stand_in.start()
+        os.environ.update({"AZURE_OPENAI_API_KEY": "stand-in", "AZURE_OPENAI_ENDPOINT": stand_in.base_url})
+        os.environ.pop("AZURE_OPENAI_DEPLOYMENTS", None)
+
+    # o1-gpt-4.py と同じクライアントを使う（応答キャッシュは計測の妨げになるので使わない）
+    client = create_azure_client(api_version=args.api_version, max_retries=args.max_retries)
+    stream_usage = supports_stream_usage(args.api_version)
+
+    scenarios = []
+    try:
+        for concurrency, prompt_tokens, max_tokens in itertools.product(args.concurrency, args.prompt_tokens, args.max_completion_tokens):
+            print(f"計測中: 同時実行 {concurrency} / 入力 {prompt_tokens} トークン / 上限 {max_tokens} トークン x {args.requests}")
+            scenarios.append(run_scenario(client, args.model, concurrency, prompt_tokens, max_tokens, args.requests, stream_usage))
+    finally:
+        if stand_in is not None:
+            stand_in.stop()
+
+    print_report(scenarios)
+    if hasattr(client, "stats"):
+        print("\n接続先ごとの実績:", json.dumps(client.stats(), ensure_ascii=False))
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"config": vars(args), "scenarios": scenarios}, f, ensure_ascii=False, indent=2)
+        print(f"\n計測結果を {args.output} に保存しました。")
+
+
+if __name__ == "__main__":
+    main()
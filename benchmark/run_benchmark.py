@@ -0,0 +1,352 @@
+"""
+ローカルの代替サービスを使ったエンドツーエンドのベンチマーク
+
+deepresearch-BraveSearch.py と modeldescription.py を代替サービスに向けて実行し、
+以下を計測する。
+
+    - エンドツーエンドの実行時間
+    - 段階（検索・スクレイピング・LLM呼び出し）ごとの所要時間
+    - 同時実行したセッションのスループット
+    - 最大メモリ使用量（ピークRSS）
+    - 起動時間（`--help` の実行時間と `-X importtime` によるモジュール読み込み時間）
+
+使い方:
+    python benchmark/run_benchmark.py --runs 3 --concurrency 1 4 8 --output bench.json
+    python benchmark/run_benchmark.py --baseline bench.json  # 前回の結果と比較して劣化を検出
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from standins import _percentile, add_standin_arguments, services_from_args
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TARGETS = ("deepresearch", "modeldescription")
+DEFAULT_QUERIES = ["生成AIモデルの比較", "大規模言語モデルの推論コスト", "マルチモーダルモデルの活用事例"]
+
+
+def build_command(target, index, args, work_dir):
+    """
+    対象スクリプトの実行コマンドを作成する
+    
+    Args:
+        target: 対象スクリプト名（TARGETS のいずれか）
+        index: 実行番号（クエリやセッション名の切り替えに使う）
+        args: コマンドライン引数
+        work_dir: 作業ディレクトリ
+        
+    Returns:
+        list: コマンドの引数リスト
+    """
+    if target == "deepresearch":
+        query = args.queries[index % len(args.queries)]
+        return [sys.executable, script_path(target),
+                "--query", query, "--iterations", str(args.iterations), "--session", f"bench-{index}"]
+    return [sys.executable, script_path(target), "--urls-file", os.path.join(work_dir, "urls.txt")]
+
+
+def script_path(target):
+    # 対象スクリプトのパス
+    name = "deepresearch-BraveSearch.py" if target == "deepresearch" else "modeldescription.py"
+    return os.path.join(REPO_DIR, name)
+
+
+def parse_importtime(stderr):
+    """
+    `-X importtime` の出力から、トップレベルで読み込んだモジュールごとの累積時間を取り出す
+    
+    Args:
+        stderr: 標準エラー出力
+        
+    Returns:
+        dict: モジュール名をキー、累積読み込み時間（秒）を値とする辞書
+    """
+    modules = {}
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # 字下げのないものがトップレベルの import（入れ子のものは累積時間に含まれる）
+        if not name.startswith("  ") and cumulative.strip().isdigit():
+            modules[name.strip()] = modules.get(name.strip(), 0.0) + int(cumulative) / 1e6
+    return modules
+
+
+def measure_startup(target, runs, work_dir):
+    """
+    `--help` を `-X importtime` 付きで実行し、起動にかかる時間を計測する
+    
+    Args:
+        target: 対象スクリプト名
+        runs: 計測回数
+        work_dir: 作業ディレクトリ
+        
+    Returns:
+        dict: 起動時間・読み込み時間の統計と、読み込みに時間のかかったモジュール
+    """
+    walls, import_totals, per_module = [], [], {}
+    for _ in range(runs):
+        start = time.perf_counter()
+        completed = subprocess.run([sys.executable, "-X", "importtime", script_path(target), "--help"],
+                                   cwd=work_dir, capture_output=True, text=True)
+        walls.append(time.perf_counter() - start)
+        modules = parse_importtime(completed.stderr)
+        import_totals.append(sum(modules.values()))
+        for name, seconds in modules.items():
+            per_module.setdefault(name, []).append(seconds)
+    
+    slowest = sorted(((name, sum(values) / len(values)) for name, values in per_module.items()),
+                     key=lambda item: item[1], reverse=True)[:10]
+    return {
+        "wall": summarize(walls),
+        "imports": summarize(import_totals),
+        "slowest_imports": [{"module": name, "seconds": seconds} for name, seconds in slowest]
+    }
+
+
+def wait_processes(processes):
+    """
+    子プロセスの終了を待ち、終了時刻・終了コード・ピークRSSを記録する
+    
+    Args:
+        processes: pidをキー、実行情報の辞書を値とする辞書
+    """
+    pending = dict(processes)
+    while pending:
+        if hasattr(os, "wait4"):
+            # 終わった順に回収してリソース使用量も取得する
+            pid, status, rusage = os.wait4(-1, 0)
+            if pid not in pending:
+                continue
+            run = pending.pop(pid)
+            run["returncode"] = os.waitstatus_to_exitcode(status)
+            run["peak_rss_mb"] = rusage.ru_maxrss / 1024  # Linux の ru_maxrss はKB単位
+        else:
+            pid, run = pending.popitem()
+            run["returncode"] = run["process"].wait()
+            run["peak_rss_mb"] = None
+        run["elapsed"] = time.perf_counter() - run["start"]
+
+
+def run_batch(target, indices, args, services, work_dir):
+    """
+    対象スクリプトを同時に起動し、すべて終わるまで待つ
+    
+    Args:
+        target: 対象スクリプト名
+        indices: 実行番号のリスト（同時に起動するプロセス数と同じ）
+        args: コマンドライン引数
+        services: 起動済みの StandInServices
+        work_dir: 作業ディレクトリ
+        
+    Returns:
+        tuple: (各実行の結果のリスト, 全体の所要時間)
+    """
+    processes = {}
+    batch_start = time.perf_counter()
+    for index in indices:
+        run_dir = os.path.join(work_dir, f"{target}-{index}")
+        os.makedirs(run_dir, exist_ok=True)
+        env = dict(os.environ, **services.env(),
+                   LLM_CACHE_MODE="off",
+                   STAGE_TIMINGS_FILE=os.path.join(run_dir, "stages.json"))
+        log = open(os.path.join(run_dir, "output.log"), "w", encoding="utf-8")
+        process = subprocess.Popen(build_command(target, index, args, work_dir), cwd=run_dir, env=env,
+                                   stdout=log, stderr=subprocess.STDOUT)
+        log.close()
+        processes[process.pid] = {"index": index, "run_dir": run_dir, "process": process, "start": time.perf_counter()}
+    
+    wait_processes(processes)
+    wall = time.perf_counter() - batch_start
+    
+    runs = []
+    for run in sorted(processes.values(), key=lambda r: r["index"]):
+        stages = {}
+        stages_file = os.path.join(run["run_dir"], "stages.json")
+        if os.path.exists(stages_file):
+            with open(stages_file, "r", encoding="utf-8") as f:
+                stages = json.load(f)
+        if run["returncode"] != 0:
+            print(f"  警告: {target} #{run['index']} が終了コード {run['returncode']} で終了しました（{run['run_dir']}/output.log）")
+        runs.append({
+            "index": run["index"],
+            "elapsed": run["elapsed"],
+            "returncode": run["returncode"],
+            "peak_rss_mb": run["peak_rss_mb"],
+            "stages": stages
+        })
+    return runs, wall
+
+
+def summarize(values):
+    return {
+        "mean": sum(values) / len(values) if values else 0.0,
+        "p50": _percentile(values, 50),
+        "p95": _percentile(values, 95),
+        "min": min(values) if values else 0.0,
+        "max": max(values) if values else 0.0
+    }
+
+
+def benchmark_target(target, args, services, work_dir):
+    """
+    1つのスクリプトについて逐次実行と同時実行のベンチマークを行う
+    
+    Args:
+        target: 対象スクリプト名
+        args: コマンドライン引数
+        services: 起動済みの StandInServices
+        work_dir: 作業ディレクトリ
+        
+    Returns:
+        dict: 計測結果
+    """
+    print(f"\n[{target}] 起動時間 x {args.startup_runs}")
+    startup = measure_startup(target, args.startup_runs, work_dir)
+    
+    print(f"[{target}] 逐次実行 x {args.runs}")
+    runs = []
+    for index in range(args.runs):
+        batch, _ = run_batch(target, [index], args, services, work_dir)
+        runs.extend(batch)
+    
+    stage_durations = {}
+    for run in runs:
+        for name, durations in run["stages"].items():
+            stage_durations.setdefault(name, []).extend(durations)
+    
+    result = {
+        "e2e": summarize([run["elapsed"] for run in runs]),
+        "stages": {name: dict(summarize(durations), count=len(durations), total=sum(durations))
+                   for name, durations in stage_durations.items()},
+        "peak_rss_mb": max((run["peak_rss_mb"] or 0) for run in runs),
+        "failures": sum(1 for run in runs if run["returncode"] != 0),
+        "startup": startup,
+        "concurrency": {}
+    }
+    
+    next_index = args.runs
+    for concurrency in args.concurrency:
+        print(f"[{target}] 同時実行 x {concurrency}")
+        batch, wall = run_batch(target, list(range(next_index, next_index + concurrency)), args, services, work_dir)
+        next_index += concurrency
+        result["concurrency"][str(concurrency)] = {
+            "wall": wall,
+            "throughput": concurrency / wall if wall else 0.0,  # セッション/秒
+            "e2e_p95": _percentile([run["elapsed"] for run in batch], 95),
+            "peak_rss_mb": max((run["peak_rss_mb"] or 0) for run in batch),
+            "failures": sum(1 for run in batch if run["returncode"] != 0)
+        }
+    return result
+
+
+def print_report(results):
+    for target, result in results["targets"].items():
+        e2e = result["e2e"]
+        print(f"\n===== {target} =====")
+        print(f"実行時間: 平均 {e2e['mean']:.2f}s / p50 {e2e['p50']:.2f}s / p95 {e2e['p95']:.2f}s（失敗 {result['failures']}件）")
+        print(f"ピークRSS: {result['peak_rss_mb']:.1f} MB")
+        startup = result.get("startup")
+        if startup:
+            print(f"起動時間（--help）: p50 {startup['wall']['p50']:.3f}s / うちモジュール読み込み p50 {startup['imports']['p50']:.3f}s")
+            print("  読み込みに時間のかかるモジュール: " + ", ".join(
+                f"{item['module']} {item['seconds'] * 1000:.0f}ms" for item in startup["slowest_imports"][:5]))
+        print("段階ごとの所要時間:")
+        for name, stats in result["stages"].items():
+            print(f"  {name:<14} 回数 {stats['count']:>4}  合計 {stats['total']:7.2f}s  平均 {stats['mean']:6.3f}s  p95 {stats['p95']:6.3f}s")
+        print("同時実行:")
+        for concurrency, stats in result["concurrency"].items():
+            print(f"  {concurrency:>3} 並列  所要 {stats['wall']:6.2f}s  スループット {stats['throughput']:6.3f} セッション/秒"
+                  f"  p95 {stats['e2e_p95']:6.2f}s  ピークRSS {stats['peak_rss_mb']:.1f} MB  失敗 {stats['failures']}件")
+    print("\n代替サービスへのリクエスト数:", json.dumps({name: stats["requests"] for name, stats in results["services"].items()}))
+
+
+def compare_with_baseline(results, baseline, threshold):
+    """
+    前回の結果と比較し、しきい値を超えて悪化した指標を返す
+    
+    Args:
+        results: 今回の計測結果
+        baseline: 前回の計測結果
+        threshold: 許容する悪化の割合（0.2 なら20%）
+        
+    Returns:
+        list: 悪化した指標の説明のリスト
+    """
+    regressions = []
+    
+    def check(label, current, previous, higher_is_better=False):
+        if not previous:
+            return
+        change = (previous - current) / previous if higher_is_better else (current - previous) / previous
+        if change > threshold:
+            regressions.append(f"{label}: {previous:.3f} -> {current:.3f}（{change:+.0%}）")
+    
+    for target, result in results["targets"].items():
+        base = baseline.get("targets", {}).get(target)
+        if not base:
+            continue
+        check(f"{target} 実行時間p50", result["e2e"]["p50"], base["e2e"]["p50"])
+        check(f"{target} ピークRSS", result["peak_rss_mb"], base.get("peak_rss_mb"))
+        if "startup" in result and "startup" in base:
+            check(f"{target} 起動時間p50", result["startup"]["wall"]["p50"], base["startup"]["wall"]["p50"])
+            check(f"{target} 読み込み時間p50", result["startup"]["imports"]["p50"], base["startup"]["imports"]["p50"])
+        for name, stats in result["stages"].items():
+            if name in base["stages"]:
+                check(f"{target} {name} 平均", stats["mean"], base["stages"][name]["mean"])
+        for concurrency, stats in result["concurrency"].items():
+            if concurrency in base["concurrency"]:
+                check(f"{target} {concurrency}並列スループット", stats["throughput"],
+                      base["concurrency"][concurrency]["throughput"], higher_is_better=True)
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='代替サービスを使ったエンドツーエンドのベンチマーク')
+    parser.add_argument('--target', choices=TARGETS, nargs='+', default=list(TARGETS), help='計測するスクリプト')
+    parser.add_argument('--runs', type=int, default=3, help='逐次実行の回数')
+    parser.add_argument('--startup-runs', type=int, default=5, help='起動時間の計測回数')
+    parser.add_argument('--concurrency', type=int, nargs='*', default=[4], help='同時実行するセッション数（複数指定可）')
+    parser.add_argument('--iterations', type=int, default=2, help='deepresearch の検索繰り返し回数')
+    parser.add_argument('--queries', type=str, nargs='+', default=DEFAULT_QUERIES, help='deepresearch の検索クエリ')
+    parser.add_argument('--output', type=str, help='計測結果を書き出すJSONファイル')
+    parser.add_argument('--baseline', type=str, help='比較する前回の計測結果（JSON）')
+    parser.add_argument('--threshold', type=float, default=0.2, help='劣化とみなす悪化の割合')
+    add_standin_arguments(parser)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory(prefix="bench-") as work_dir, services_from_args(args) as services:
+        # modeldescription 用のURL一覧（元のスクリプトと同じ9ページ）
+        with open(os.path.join(work_dir, "urls.txt"), "w", encoding="utf-8") as f:
+            f.write("\n".join(f"{services.corpus.base_url}{path}" for path in services.corpus.paths[:9]))
+        
+        results = {"config": {k: v for k, v in vars(args).items() if k not in ("output", "baseline")}, "targets": {}}
+        for target in args.target:
+            results["targets"][target] = benchmark_target(target, args, services, work_dir)
+        results["services"] = services.stats()
+    
+    print_report(results)
+    
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"\n計測結果を {args.output} に保存しました。")
+    
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare_with_baseline(results, json.load(f), args.threshold)
+        if regressions:
+            print(f"\n性能の劣化を検出しました（しきい値 {args.threshold:.0%}）:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print("\n前回の計測結果からの劣化はありません。")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,517 @@
+"""
+ベンチマーク用のローカル代替サービス
+
+本物のBrave Search API・Azure OpenAI・外部Webサイトの代わりに、
+ローカルで次の3つのHTTPサーバーを起動する。
+
+    BraveStandIn  : 決まった形式の検索結果を返す Brave Web Search API 互換サーバー
+    ChatStandIn   : 遅延とストリーミングを設定できる OpenAI 互換の chat.completions サーバー
+    CorpusStandIn : 保存済み（または合成した）Webページを返すサーバー
+
+単体で起動することもできる:
+    python benchmark/standins.py --llm-latency 0.5
+"""
+
+import argparse
+import email.parser
+import email.policy
+import hashlib
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+# 合成ページに使う語句
+CORPUS_MODELS = [
+    "GPT-4.1", "GPT-4.1 mini", "GPT-4.1 nano", "GPT-4o", "GPT-4o mini", "o1 mini",
+    "Claude 3.7 Sonnet", "Claude 3.5 Sonnet（v2）", "Claude 3.5 Sonnet（v1）", "Claude 3.5 Haiku",
+    "Claude 3 Haiku", "Amazon Nova Pro", "Amazon Nova Lite", "Amazon Nova Micro",
+    "Llama 3.3 70B", "Llama 3.2 90B Instruct", "Llama 3.1 405B Instruct"
+]
+CORPUS_PHRASES = [
+    "は長いコンテキストを扱えるモデルです。", "はコード生成と推論に強みがあります。",
+    "は低遅延で大量のリクエストを処理できます。", "は画像入力に対応しています。",
+    "は多言語の要約や翻訳に向いています。", "はコストを抑えたい用途に適しています。",
+    "の性能はベンチマークで大きく向上しました。", "は企業向けのセキュリティ機能を備えています。"
+]
+
+
+def _percentile(values, q):
+    # 線形補間なしの単純なパーセンタイル
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def build_corpus(pages=30, paragraphs=12, seed=0):
+    """
+    本文以外の要素（メニュー・Cookieバナー・関連記事など）を含む合成ページを作成する
+    
+    Args:
+        pages: ページ数
+        paragraphs: 1ページあたりの本文段落数
+        seed: 乱数シード（同じ値なら同じコーパスになる）
+        
+    Returns:
+        dict: パスをキー、HTMLを値とする辞書
+    """
+    rng = random.Random(seed)
+    corpus = {}
+    for page_no in range(pages):
+        nav = "".join(f'<li><a href="/page/{i}">メニュー {i}</a></li>' for i in range(25))
+        related = "".join(f'<li><a href="/page/{rng.randrange(pages)}">関連記事 {i}</a></li>' for i in range(10))
+        body = []
+        for _ in range(paragraphs):
+            sentences = [rng.choice(CORPUS_MODELS) + rng.choice(CORPUS_PHRASES) for _ in range(rng.randint(3, 8))]
+            body.append(f"<p>{''.join(sentences)}</p>")
+        corpus[f"/page/{page_no}"] = f"""<!DOCTYPE html>
+<html lang="ja"><head><title>モデル解説 {page_no}</title>
+<meta name="description" content="生成AIモデルの解説ページ {page_no}"></head>
+<body>
+<header><ul>{nav}</ul></header>
+<div class="cookie-banner">このサイトはCookieを使用します。<a href="/privacy">詳細</a> <a href="/accept">同意する</a></div>
+<main><article><h1>生成AIモデルの比較 {page_no}</h1><h2>概要</h2>{"".join(body)}</article></main>
+<div class="sidebar"><h3>関連記事</h3><ul>{related}</ul></div>
+<footer><p>Copyright Example Corp. All rights reserved.</p><ul>{nav}</ul></footer>
+</body></html>"""
+    return corpus
+
+
+class _StandInServer:
+    """リクエスト数と処理時間を記録するHTTPサーバーの基底クラス"""
+    
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.port = None
+        self._server = None
+        self._lock = threading.Lock()
+        self.request_times = []
+    
+    def handle(self, handler):
+        raise NotImplementedError
+    
+    def _record(self, elapsed):
+        with self._lock:
+            self.request_times.append(elapsed)
+    
+    def stats(self):
+        """
+        これまでに処理したリクエストの統計を返す
+        
+        Returns:
+            dict: リクエスト数と処理時間のパーセンタイル
+        """
+        with self._lock:
+            times = list(self.request_times)
+        return {
+            "requests": len(times),
+            "p50": _percentile(times, 50),
+            "p95": _percentile(times, 95)
+        }
+    
+    def start(self):
+        """空いているポートでサーバーをバックグラウンド起動する"""
+        stand_in = self
+        
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            
+            def log_message(self, format, *args):
+                pass
+            
+            def do_GET(self):
+                self._dispatch()
+            
+            def do_POST(self):
+                self._dispatch()
+            
+            def _dispatch(self):
+                start = time.perf_counter()
+                try:
+                    stand_in.handle(self)
+                finally:
+                    stand_in._record(time.perf_counter() - start)
+        
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        threading.Thread(target=self._server.serve_forever, daemon=True).start()
+        return self
+    
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+    
+    @property
+    def base_url(self):
+        return f"http://127.0.0.1:{self.port}"
+
+
+def send_body(handler, status, body, content_type="application/json"):
+    """
+    レスポンスを返す
+    
+    Args:
+        handler: BaseHTTPRequestHandler
+        status: HTTPステータスコード
+        body: 文字列またはバイト列の本文
+        content_type: Content-Type
+    """
+    data = body.encode("utf-8") if isinstance(body, str) else body
+    handler.send_response(status)
+    handler.send_header("Content-Type", content_type)
+    handler.send_header("Content-Length", str(len(data)))
+    handler.end_headers()
+    handler.wfile.write(data)
+
+
+def read_json_body(handler):
+    length = int(handler.headers.get("Content-Length") or 0)
+    return json.loads(handler.rfile.read(length) or b"{}")
+
+
+class CorpusStandIn(_StandInServer):
+    """保存済みページ（corpus_dir の *.html）と合成ページを返すWebサーバー"""
+    
+    def __init__(self, corpus_dir=None, pages=30, latency=0.0):
+        super().__init__(latency)
+        self.pages = build_corpus(pages)
+        if corpus_dir:
+            for name in sorted(os.listdir(corpus_dir)):
+                if name.endswith((".html", ".htm")):
+                    with open(os.path.join(corpus_dir, name), "r", encoding="utf-8", errors="replace") as f:
+                        self.pages[f"/saved/{name}"] = f.read()
+        self.paths = sorted(self.pages)
+    
+    def handle(self, handler):
+        time.sleep(self.latency)
+        page = self.pages.get(urlparse(handler.path).path)
+        if page is None:
+            send_body(handler, 404, "<html><body>Not Found</body></html>", "text/html; charset=utf-8")
+        else:
+            send_body(handler, 200, page, "text/html; charset=utf-8")
+
+
+class BraveStandIn(_StandInServer):
+    """クエリに応じてコーパス内のページを検索結果として返す Brave Web Search API 互換サーバー"""
+    
+    def __init__(self, corpus, latency=0.0):
+        super().__init__(latency)
+        self.corpus = corpus
+    
+    def handle(self, handler):
+        time.sleep(self.latency)
+        params = parse_qs(urlparse(handler.path).query)
+        query = params.get("q", [""])[0]
+        count = int(params.get("count", ["5"])[0])
+        
+        # クエリのハッシュで開始位置を決め、クエリごとに異なるページを返す
+        offset = int(hashlib.sha256(query.encode("utf-8")).hexdigest(), 16) % len(self.corpus.paths)
+        results = []
+        for i in range(count):
+            path = self.corpus.paths[(offset + i) % len(self.corpus.paths)]
+            results.append({
+                "title": f"{query} - 検索結果 {i + 1}",
+                "description": f"{query} に関するページ（{path}）",
+                "url": f"{self.corpus.base_url}{path}"
+            })
+        send_body(handler, 200, json.dumps({"web": {"results": results}}, ensure_ascii=False))
+
+
+class ChatStandIn(_StandInServer):
+    """
+    OpenAI互換（Azureのデプロイ形式のパスにも対応）の chat.completions サーバー
+    
+    応答までの遅延（latency）、応答の長さ（completion_chars）、
+    ストリーミング時のチャンク間隔（chunk_delay）を設定できる。
+    チャンク1つを1トークンとみなし、max_completion_tokens / max_tokens を超える分は切り詰める。
+    error_rate の割合で 429（Retry-After: 1）を返す。
+    Batch API（files / batches）にも対応し、バッチは batch_delay 秒後に完了する。
+    """
+    
+    def __init__(self, latency=0.0, completion_chars=2000, chunk_delay=0.0, chunk_chars=8, batch_delay=0.5, error_rate=0.0):
+        super().__init__(latency)
+        self.error_rate = error_rate
+        self.completion_chars = completion_chars
+        self.chunk_delay = chunk_delay
+        self.chunk_chars = chunk_chars
+        self.batch_delay = batch_delay
+        self.files = {}
+        self.batches = {}
+        self._ids = itertools.count(1)
+    
+    def completion_text(self, body):
+        """
+        リクエストの内容に合わせてそれらしい応答本文を作る
+        
+        Args:
+            body: chat.completions のリクエスト本文
+            
+        Returns:
+            str: 応答本文
+        """
+        prompt = "\n".join(str(message.get("content")) for message in body.get("messages", []))
+        
+        # deepresearch の分析ステップ
+        if "nextSearchTopic" in prompt:
+            topic = "追加調査 " + hashlib.sha256(prompt.encode("utf-8")).hexdigest()[:8]
+            return f'```json\n{{"nextSearchTopic": "{topic}", "shouldContinue": true}}\n```'
+        
+        # JSON形式を要求された場合はプロンプト中のモデル名ごとに35文字の説明文を返す
+        if (body.get("response_format") or {}).get("type") == "json_object":
+            names = [name for name in CORPUS_MODELS if name in prompt] or ["model"]
+            return json.dumps({name: ("高性能で汎用的な生成AIモデルです。" * 3)[:35] for name in names}, ensure_ascii=False)
+        
+        # 分析ステップの応答として、プロンプト中のモデル名を見出しにした本文を返す
+        names = [name for name in CORPUS_MODELS if name in prompt]
+        body = ("これはベンチマーク用の応答本文です。" * (self.completion_chars // 17 + 1))[:self.completion_chars]
+        return "### 分析結果\n" + "".join(f"- {name}: 情報不足\n" for name in names) + body
+    
+    def completion_response(self, body, text):
+        prompt_tokens = len(json.dumps(body, ensure_ascii=False)) // 4
+        return {
+            "id": "chatcmpl-standin",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": body.get("model", "stand-in"),
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": text}}],
+            "usage": {"prompt_tokens": prompt_tokens, "completion_tokens": len(text), "total_tokens": prompt_tokens + len(text)}
+        }
+    
+    def handle(self, handler):
+        path = urlparse(handler.path).path
+        if handler.command == "POST" and re.search(r"/chat/completions$", path):
+            self._chat(handler)
+        elif re.search(r"/files(/[^/]+)?$|/files/[^/]+/content$|/batches(/[^/]+)?$", path):
+            self._batch_api(handler, path)
+        else:
+            send_body(handler, 404, json.dumps({"error": {"message": f"not found: {path}"}}))
+    
+    def _chat(self, handler):
+        body = read_json_body(handler)
+        if self.error_rate and random.random() < self.error_rate:
+            handler.send_response(429)
+            handler.send_header("Retry-After", "1")
+            handler.send_header("Content-Type", "application/json")
+            payload = json.dumps({"error": {"code": "429", "message": "stand-in rate limit"}}).encode("utf-8")
+            handler.send_header("Content-Length", str(len(payload)))
+            handler.end_headers()
+            handler.wfile.write(payload)
+            return
+        time.sleep(self.latency)
+        text = self.completion_text(body)
+        max_tokens = body.get("max_completion_tokens") or body.get("max_tokens")
+        if max_tokens:
+            text = text[:max_tokens * self.chunk_chars]
+        
+        if body.get("stream"):
+            self._stream(handler, body.get("model", "stand-in"), text, body)
+            return
+        send_body(handler, 200, json.dumps(self.completion_response(body, text), ensure_ascii=False))
+    
+    def _batch_api(self, handler, path):
+        # ファイルのアップロード（multipart/form-data）
+        if handler.command == "POST" and path.endswith("/files"):
+            length = int(handler.headers.get("Content-Length") or 0)
+            raw = f"Content-Type: {handler.headers['Content-Type']}\r\n\r\n".encode("utf-8") + handler.rfile.read(length)
+            form = email.parser.BytesParser(policy=email.policy.default).parsebytes(raw)
+            fields = {part.get_param("name", header="content-disposition"): part for part in form.iter_parts()}
+            data = fields["file"].get_payload(decode=True)
+            file_id = f"file-{next(self._ids)}"
+            self.files[file_id] = {
+                "id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                "filename": fields["file"].get_filename() or "input.jsonl",
+                "purpose": fields["purpose"].get_content().strip() if "purpose" in fields else "batch",
+                "status": "processed", "data": data
+            }
+            send_body(handler, 200, json.dumps({k: v for k, v in self.files[file_id].items() if k != "data"}))
+            return
+        
+        content = re.search(r"/files/([^/]+)/content$", path)
+        if content:
+            file = self.files.get(content.group(1))
+            if file is None:
+                send_body(handler, 404, json.dumps({"error": {"message": "file not found"}}))
+            else:
+                send_body(handler, 200, file["data"], "application/octet-stream")
+            return
+        
+        retrieve = re.search(r"/files/([^/]+)$", path)
+        if retrieve:
+            file = self.files.get(retrieve.group(1))
+            if file is None:
+                send_body(handler, 404, json.dumps({"error": {"message": "file not found"}}))
+            else:
+                send_body(handler, 200, json.dumps({k: v for k, v in file.items() if k != "data"}))
+            return
+        
+        if handler.command == "POST" and path.endswith("/batches"):
+            body = read_json_body(handler)
+            batch_id = f"batch-{next(self._ids)}"
+            lines = self.files[body["input_file_id"]]["data"].decode("utf-8").splitlines()
+            self.batches[batch_id] = {
+                "id": batch_id, "object": "batch", "endpoint": body["endpoint"],
+                "input_file_id": body["input_file_id"], "completion_window": body["completion_window"],
+                "status": "in_progress", "created_at": int(time.time()), "output_file_id": None, "error_file_id": None,
+                "request_counts": {"total": len(lines), "completed": 0, "failed": 0}
+            }
+            threading.Thread(target=self._process_batch, args=(batch_id, lines), daemon=True).start()
+            send_body(handler, 200, json.dumps(self.batches[batch_id]))
+            return
+        
+        batch = self.batches.get(path.rsplit("/", 1)[-1])
+        if batch is None:
+            send_body(handler, 404, json.dumps({"error": {"message": "batch not found"}}))
+        else:
+            send_body(handler, 200, json.dumps(batch))
+    
+    def _process_batch(self, batch_id, lines):
+        time.sleep(self.batch_delay)
+        output = []
+        for line in lines:
+            if not line.strip():
+                continue
+            request = json.loads(line)
+            response = self.completion_response(request["body"], self.completion_text(request["body"]))
+            output.append(json.dumps({
+                "id": f"response-{next(self._ids)}", "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "request_id": "standin", "body": response}, "error": None
+            }, ensure_ascii=False))
+        
+        data = ("\n".join(output) + "\n").encode("utf-8")
+        file_id = f"file-{next(self._ids)}"
+        self.files[file_id] = {"id": file_id, "object": "file", "bytes": len(data), "created_at": int(time.time()),
+                               "filename": "output.jsonl", "purpose": "batch_output", "status": "processed", "data": data}
+        batch = self.batches[batch_id]
+        batch["request_counts"]["completed"] = len(output)
+        batch["output_file_id"] = file_id
+        batch["status"] = "completed"
+    
+    def _stream(self, handler, model, text, body):
+        # Server-Sent Events 形式で少しずつ送る（接続は送信後に閉じる）
+        handler.send_response(200)
+        handler.send_header("Content-Type", "text/event-stream")
+        handler.send_header("Connection", "close")
+        handler.end_headers()
+        handler.close_connection = True
+        
+        def event(choices, usage=None):
+            chunk = {"id": "chatcmpl-standin", "object": "chat.completion.chunk", "created": int(time.time()), "model": model, "choices": choices}
+            if usage:
+                chunk["usage"] = usage
+            handler.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+            handler.wfile.flush()
+        
+        event([{"index": 0, "delta": {"role": "assistant", "content": ""}, "finish_reason": None}])
+        for i in range(0, len(text), self.chunk_chars):
+            time.sleep(self.chunk_delay)
+            event([{"index": 0, "delta": {"content": text[i:i + self.chunk_chars]}, "finish_reason": None}])
+        event([{"index": 0, "delta": {}, "finish_reason": "stop"}])
+        if (body.get("stream_options") or {}).get("include_usage"):
+            completion_tokens = -(-len(text) // self.chunk_chars)
+            event([], {"prompt_tokens": len(json.dumps(body)) // 4, "completion_tokens": completion_tokens, "total_tokens": len(json.dumps(body)) // 4 + completion_tokens})
+        handler.wfile.write(b"data: [DONE]\n\n")
+        handler.wfile.flush()
+
+
+class StandInServices:
+    """3つの代替サービスをまとめて起動・停止する"""
+    
+    def __init__(self, corpus_dir=None, corpus_pages=30, brave_latency=0.0, page_latency=0.0,
+                 llm_latency=0.0, completion_chars=2000, chunk_delay=0.0):
+        self.corpus = CorpusStandIn(corpus_dir, corpus_pages, page_latency)
+        self.brave = BraveStandIn(self.corpus, brave_latency)
+        self.chat = ChatStandIn(llm_latency, completion_chars, chunk_delay)
+    
+    def start(self):
+        self.corpus.start()
+        self.brave.start()
+        self.chat.start()
+        return self
+    
+    def stop(self):
+        for service in (self.chat, self.brave, self.corpus):
+            service.stop()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.stop()
+    
+    def env(self):
+        """
+        各スクリプトを代替サービスに向けるための環境変数を返す
+        
+        Returns:
+            dict: 環境変数の辞書
+        """
+        return {
+            "AZURE_OPENAI_API_KEY": "stand-in",
+            "AZURE_OPENAI_ENDPOINT": self.chat.base_url,
+            "BRAVE_API_KEY": "stand-in",
+            "BRAVE_ENDPOINT": f"{self.brave.base_url}/res/v1/web/search"
+        }
+    
+    def stats(self):
+        return {
+            "brave": self.brave.stats(),
+            "chat": self.chat.stats(),
+            "corpus": self.corpus.stats()
+        }
+
+
+def add_standin_arguments(parser):
+    """
+    代替サービスの設定用のコマンドライン引数を追加する
+    
+    Args:
+        parser: argparse.ArgumentParser
+    """
+    parser.add_argument('--corpus-dir', type=str, help='保存済みページ（*.html）のディレクトリ')
+    parser.add_argument('--corpus-pages', type=int, default=30, help='合成ページの数')
+    parser.add_argument('--brave-latency', type=float, default=0.05, help='検索APIの応答遅延（秒）')
+    parser.add_argument('--page-latency', type=float, default=0.05, help='Webページの応答遅延（秒）')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='chat.completions の応答遅延（秒）')
+    parser.add_argument('--completion-chars', type=int, default=2000, help='chat.completions の応答文字数')
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='ストリーミング時のチャンク間隔（秒）')
+
+
+def services_from_args(args):
+    return StandInServices(
+        corpus_dir=args.corpus_dir,
+        corpus_pages=args.corpus_pages,
+        brave_latency=args.brave_latency,
+        page_latency=args.page_latency,
+        llm_latency=args.llm_latency,
+        completion_chars=args.completion_chars,
+        chunk_delay=args.chunk_delay
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description='ベンチマーク用の代替サービスを起動する')
+    add_standin_arguments(parser)
+    args = parser.parse_args()
+    
+    with services_from_args(args) as services:
+        print("代替サービスを起動しました。以下の環境変数を設定してスクリプトを実行してください:")
+        for name, value in services.env().items():
+            print(f"export {name}={value}")
+        try:
+            while True:
+                time.sleep(3600)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
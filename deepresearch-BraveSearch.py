@@ -1,19 +1,26 @@
 # python deepresearch-BraveSearch.py --iterations 3 --query "調査したいトピック"
 
-from openai import AzureOpenAI
 import os
 import requests
-from PIL import Image
 import json
 from dotenv import load_dotenv
-import urllib.parse
 import argparse
 import re
 import sys
 import datetime
 import time
 import concurrent.futures
-from bs4 import BeautifulSoup
+import gzip
+import threading
+import uuid
+from utils.completion_cache import wrap_client
+from utils.client_pool import ClientPool, create_azure_client
+from utils.corpus_store import CorpusStore
+from utils.knowledge_index import KnowledgeIndex
+from utils.domain_stats import DomainStats, domain_of
+from utils.document_fetcher import fetch_document, UnsupportedDocumentError
+from utils.stage_timer import stage, timer
+from utils.profiler import profiler, default_profile_path, DEFAULT_TOP as PROFILE_TOP
 
 # 環境変数の読み込み
 load_dotenv() 
@@ -25,6 +32,17 @@ MAX_TOKENS = 65536     # モデルの最大トークン数 (gpt-4o: 4096, gpt-4o
 SCRAPE_PAGES = True    # ウェブページのスクレイピングを有効にするかどうか
 MAX_SCRAPE_PAGES = 3   # 各検索で何ページまでスクレイピングするか (処理速度とトークン制限のバランス)
 MAX_SCRAPE_LENGTH = 3000  # スクレイピングするコンテンツの最大長さ
+MAX_DOCUMENT_LENGTH = 30000  # PDFなどを読み進める文字数の上限（ローカル知識インデックスに保存する分を含む）
+CHECKPOINT_DIR = "checkpoints"  # 調査セッションのチェックポイントを保存するディレクトリ
+KNOWLEDGE_INDEX_PATH = "knowledge/index.db"  # セッションをまたいで使うローカル知識インデックス
+KNOWLEDGE_MAX_AGE_DAYS = 30  # これより古いページはローカル知識インデックスの検索対象外
+KNOWLEDGE_MIN_RESULTS = 3    # ローカルで関連ページがこの件数以上見つかればWeb検索を省略
+DOMAIN_STATS_PATH = "knowledge/domain_stats.db"  # ドメインごとのスクレイピング実績の保存先
+HTTP_POOL_SIZE = 20  # 接続を使い回すHTTPコネクションプールの大きさ（ホストごと）
+# 同じプロセスで複数の調査を並行する場合（--queries-file / --serve）に全体で共有する同時実行数の上限
+MAX_CONCURRENT_SEARCHES = 2      # Brave Search APIへの同時リクエスト数
+MAX_CONCURRENT_SCRAPES = 10      # ウェブページの同時取得数
+MAX_CONCURRENT_LLM_REQUESTS = 4  # Azure OpenAIへの同時リクエスト数
 
 # -------------
 
@@ -62,7 +80,7 @@ class BraveWebSearch:
         }
         
         try:
-            response = requests.get(self.brave_endpoint, headers=headers, params=params)
+            response = get_http_session().get(self.brave_endpoint, headers=headers, params=params)
             response.raise_for_status()
             return response.json()
         except requests.exceptions.HTTPError as e:
@@ -75,18 +93,89 @@ class BraveWebSearch:
             print(f"検索エラー: {e}")
             return None
 
-# AzureOpenAIのクライアント作成
-client = AzureOpenAI(
-    api_version="2024-02-01",  
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-)
+# 各クライアントは初回使用時に作成する（--help やローカル検索だけの実行で openai を読み込まない）
+_client = None
+_live_client = None  # キャッシュの裏で実際に作った接続（replay モードでは作らずに None のまま）
+_brave_client = None
+_http_session = None
+_client_lock = threading.Lock()
 
-# Brave Web Searchのクライアント作成
-brave_client = BraveWebSearch(
-    api_key = os.getenv("BRAVE_API_KEY"),
-    brave_endpoint = os.getenv("BRAVE_ENDPOINT")
-)
+_search_slots = threading.BoundedSemaphore(MAX_CONCURRENT_SEARCHES)
+_scrape_slots = threading.BoundedSemaphore(MAX_CONCURRENT_SCRAPES)
+_llm_slots = threading.BoundedSemaphore(MAX_CONCURRENT_LLM_REQUESTS)
+
+def get_http_session():
+    """
+    検索とスクレイピングで共有するHTTPセッションを返す（同じホストへの接続を使い回す）
+    
+    Returns:
+        requests.Session
+    """
+    global _http_session
+    with _client_lock:
+        if _http_session is None:
+            _http_session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=HTTP_POOL_SIZE, pool_maxsize=HTTP_POOL_SIZE)
+            _http_session.mount("http://", adapter)
+            _http_session.mount("https://", adapter)
+        return _http_session
+
+def _create_live_client():
+    # wrap_client がAPIを呼ぶ必要があるときだけ呼ぶ（作った接続は実績の集計用に覚えておく）
+    global _live_client
+    _live_client = create_azure_client()
+    return _live_client
+
+def get_client():
+    """
+    AzureOpenAIのクライアントを返す（LLM_CACHE_MODE に応じて応答キャッシュ付きでラップ）
+    
+    AZURE_OPENAI_DEPLOYMENTS が設定されていれば複数の接続先に振り分ける
+    
+    Returns:
+        AzureOpenAIクライアント
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = wrap_client(_create_live_client)
+        return _client
+
+def get_brave_client():
+    """
+    Brave Web Searchのクライアントを返す
+    
+    Returns:
+        BraveWebSearch
+    """
+    global _brave_client
+    with _client_lock:
+        if _brave_client is None:
+            _brave_client = BraveWebSearch(
+                api_key = os.getenv("BRAVE_API_KEY"),
+                brave_endpoint = os.getenv("BRAVE_ENDPOINT")
+            )
+        return _brave_client
+
+# ローカル知識インデックス（main() で初期化、--no-knowledge の場合は None のまま）
+knowledge_index = None
+
+# ドメインごとのスクレイピング実績（main() で初期化）
+domain_stats = None
+
+def record_domain_fetch(url, start, ok, text_length=0, status=None):
+    """
+    スクレイピング結果をドメインごとの実績として記録する
+    
+    Args:
+        url: スクレイピングしたURL
+        start: スクレイピング開始時刻（time.perf_counter の値）
+        ok: 成功したかどうか
+        text_length: 抽出できた本文の文字数
+        status: HTTPステータスコード
+    """
+    if domain_stats is not None:
+        domain_stats.record(url, time.perf_counter() - start, ok, text_length, status)
 
 def scrape_webpage(url):
     """
@@ -98,6 +187,7 @@ def scrape_webpage(url):
     Returns:
         str: 抽出されたテキストコンテンツ
     """
+    start = time.perf_counter()
     try:
         # ユーザーエージェントを設定して、ブロックされないようにする
         headers = {
@@ -105,20 +195,16 @@ def scrape_webpage(url):
             "Accept-Language": "ja-JP,ja;q=0.9,en-US;q=0.8,en;q=0.7"
         }
         
-        response = requests.get(url, headers=headers, timeout=10)
-        response.raise_for_status()
+        # Content-Type に応じて本文を抽出（HTMLは定型部分を除き、PDFは上限の文字数に達したページで取得を打ち切る）
+        with _scrape_slots:
+            document = fetch_document(url, headers=headers, max_chars=MAX_DOCUMENT_LENGTH, timeout=10, session=get_http_session())
+        title = document["title"]
+        text = document["text"]
+        record_domain_fetch(url, start, True, len(text), document["status_code"])
         
-        # HTMLを解析
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # 不要なタグを削除
-        for tag in soup(["script", "style", "nav", "footer", "header", "aside", "iframe", "noscript"]):
-            tag.decompose()
-        
-        # テキストを抽出して整形
-        text = soup.get_text(separator='\n')
-        lines = [line.strip() for line in text.splitlines() if line.strip()]
-        text = '\n'.join(lines)
+        # 次回以降のセッションで使えるよう、切り詰める前の全文をローカル知識インデックスに保存
+        if knowledge_index is not None and text:
+            knowledge_index.add(url, title, text)
         
         # 長いテキストを制限
         if len(text) > MAX_SCRAPE_LENGTH:
@@ -126,12 +212,19 @@ def scrape_webpage(url):
         
         return text
     except requests.exceptions.Timeout:
+        record_domain_fetch(url, start, False)
         return f"スクレイピングがタイムアウトしました: {url}"
     except requests.exceptions.HTTPError as e:
+        record_domain_fetch(url, start, False, status=e.response.status_code if e.response is not None else None)
         return f"HTTPエラー発生: {e} - URL: {url}"
     except requests.exceptions.ConnectionError:
+        record_domain_fetch(url, start, False)
         return f"接続エラー: {url} に接続できません"
+    except UnsupportedDocumentError as e:
+        # ドメインの不調ではないので実績には記録しない
+        return f"スクレイピングできません: {e}"
     except Exception as e:
+        record_domain_fetch(url, start, False)
         return f"スクレイピングエラー: {str(e)} - URL: {url}"
 
 def parallel_scrape_webpages(urls, titles):
@@ -283,8 +376,7 @@ def format_search_results(results, previous_urls=None):
         return "新しい検索結果が見つかりませんでした。", [], previous_urls
     
     formatted_results = []
-    urls_to_scrape = []
-    titles_to_scrape = []
+    result_titles = {}
     
     for i, result in enumerate(diverse_results, 1):
         title = result.get('title', 'タイトルなし')
@@ -293,17 +385,54 @@ def format_search_results(results, previous_urls=None):
         
         formatted_result = f"【{i}】\nタイトル: {title}\n内容: {description}\nURL: {url}\n"
         formatted_results.append(formatted_result)
-        
-        # スクレイピング対象のURLとタイトルを収集
-        if SCRAPE_PAGES and i <= MAX_SCRAPE_PAGES:
-            urls_to_scrape.append(url)
-            titles_to_scrape.append(title)
+        result_titles[url] = title
+    
+    # スクレイピング対象のURLとタイトルを収集
+    urls_to_scrape = []
+    if SCRAPE_PAGES:
+        if domain_stats is not None:
+            # 全検索結果から順位とドメインの実績を合わせた順に選び、不調なドメインは避ける
+            urls_to_scrape, skipped_urls = domain_stats.choose(list(result_titles), MAX_SCRAPE_PAGES)
+            for url in skipped_urls:
+                print(f"  不調なドメインのためスクレイピングを省略: {domain_of(url)}")
+        else:
+            urls_to_scrape = list(result_titles)[:MAX_SCRAPE_PAGES]
+    titles_to_scrape = [result_titles[url] for url in urls_to_scrape]
     
     # 並行してスクレイピング
     scraped_contents = []
     if urls_to_scrape:
         print(f"  {len(urls_to_scrape)}ページを並行スクレイピング中...")
-        scraped_contents = parallel_scrape_webpages(urls_to_scrape, titles_to_scrape)
+        with stage("scrape"):
+            scraped_contents = parallel_scrape_webpages(urls_to_scrape, titles_to_scrape)
+    
+    return "\n".join(formatted_results), scraped_contents, previous_urls
+
+def format_local_results(pages, previous_urls):
+    """
+    ローカル知識インデックスの検索結果を format_search_results と同じ形式にする
+    
+    Args:
+        pages: KnowledgeIndex.search の結果
+        previous_urls: 以前に取得したURLのセット
+        
+    Returns:
+        tuple: (フォーマットされた検索結果のテキスト, スクレイピングデータのリスト, 更新されたURLのセット)
+    """
+    formatted_results = []
+    scraped_contents = []
+    
+    for i, page in enumerate(pages, 1):
+        title = page['title'] or 'タイトルなし'
+        formatted_results.append(f"【{i}】\nタイトル: {title}\n内容: {page['snippet']}\nURL: {page['url']}\n")
+        previous_urls.add(page['url'])
+        
+        # 保存済みの本文をスクレイピング結果として使う
+        if SCRAPE_PAGES:
+            content = page['content']
+            if len(content) > MAX_SCRAPE_LENGTH:
+                content = content[:MAX_SCRAPE_LENGTH] + "...(省略)"
+            scraped_contents.append({"url": page['url'], "title": title, "content": content})
     
     return "\n".join(formatted_results), scraped_contents, previous_urls
 
@@ -416,56 +545,197 @@ def manage_token_usage(all_findings_text, detailed_content, max_tokens):
     return all_findings_text, detailed_content
 
 
+def checkpoint_path(session_id):
+    """
+    セッションIDからチェックポイントファイルのパスを求める
+    
+    Args:
+        session_id: セッションID、またはチェックポイントファイルのパス
+        
+    Returns:
+        str: チェックポイントファイルのパス
+    """
+    # ファイルパスが直接指定された場合はそのまま使う
+    if session_id.endswith(".json.gz") or os.path.sep in session_id:
+        return session_id
+    return os.path.join(CHECKPOINT_DIR, f"{session_id}.json.gz")
 
-def main():
-    # コマンドライン引数の解析
-    parser = argparse.ArgumentParser(description=f'DeepResearch: {MODEL_NAME}モデルとBrave Search APIを使用した深い調査') # 説明を動的に
-    parser.add_argument('--iterations', type=int, default=3, help='検索の最大繰り返し回数')
-    parser.add_argument('--query', type=str, required=True, help='最初の検索クエリ')
-    parser.add_argument('--scrape', action='store_true', help='ウェブページのスクレイピングを有効にする')
-    args = parser.parse_args()
+def corpus_path(session_id):
+    """
+    セッションのスクレイピング内容を保存するコーパスストアのパスを求める
+    
+    Args:
+        session_id: セッションID、またはチェックポイントファイルのパス
+        
+    Returns:
+        str: コーパスストア（SQLite）のファイルパス
+    """
+    path = checkpoint_path(session_id)
+    if path.endswith(".json.gz"):
+        path = path[:-len(".json.gz")]
+    return path + ".corpus.db"
+
+def save_checkpoint(session_id, state):
+    """
+    調査の途中状態をgzip圧縮したJSONとして保存する
     
-    max_iterations = args.iterations
-    initial_query = args.query
+    書き込み途中で中断されても既存のチェックポイントが壊れないよう、
+    一時ファイルに書き出してから置き換える。
     
-    # コマンドラインからスクレイピング設定を上書き
-    global SCRAPE_PAGES
-    if args.scrape:
-        SCRAPE_PAGES = True
+    Args:
+        session_id: セッションID
+        state: 保存する状態の辞書
+    """
+    path = checkpoint_path(session_id)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
     
-    # 調査情報の初期化
-    current_query = initial_query
-    iterations_done = 0
-    all_findings = []
-    scraped_data = []
-    searched_topics = [current_query]
-    previous_urls = set()  # 既に処理したURLを追跡
-    
-    print(f"調査トピック: {initial_query}")
-    print(f"最大繰り返し回数: {max_iterations}")
-    print(f"使用モデル: {MODEL_NAME}")
-    print(f"ウェブスクレイピング: {'有効' if SCRAPE_PAGES else '無効'}")
-    
-    # 調査のメインループ
-    while iterations_done < max_iterations:
+    tmp_path = path + ".tmp"
+    with gzip.open(tmp_path, "wt", encoding="utf-8") as f:
+        json.dump(state, f, ensure_ascii=False, separators=(",", ":"))
+    os.replace(tmp_path, path)
+
+def load_checkpoint(session_id):
+    """
+    保存されたチェックポイントを読み込む
+    
+    Args:
+        session_id: セッションID、またはチェックポイントファイルのパス
+        
+    Returns:
+        dict: 保存されていた状態の辞書
+    """
+    with gzip.open(checkpoint_path(session_id), "rt", encoding="utf-8") as f:
+        return json.load(f)
+
+def new_session_id():
+    """
+    新しいセッションIDを作成する（同じ秒に複数の調査を始めても重ならないよう乱数を付ける）
+    
+    Returns:
+        str: セッションID
+    """
+    return f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+
+def init_stores(use_knowledge=True):
+    """
+    ローカル知識インデックスとドメインごとの実績を開く（プロセスで1回だけ呼ぶ）
+    
+    Args:
+        use_knowledge: ローカル知識インデックスを使うかどうか
+    """
+    global knowledge_index, domain_stats
+    if use_knowledge and knowledge_index is None:
+        knowledge_index = KnowledgeIndex(KNOWLEDGE_INDEX_PATH)
+    if domain_stats is None:
+        domain_stats = DomainStats(DOMAIN_STATS_PATH)
+
+def run_research(initial_query=None, max_iterations=3, session_id=None, resume=None, log=print):
+    """
+    検索・分析を繰り返して最終レポートを作成する
+    
+    CLI・バッチ・サービスモードのいずれからも使う。ラウンドごとにチェックポイントを保存する
+    
+    Args:
+        initial_query: 最初の検索クエリ（resume を指定した場合は不要）
+        max_iterations: 検索の最大繰り返し回数
+        session_id: チェックポイントのセッション名（省略時は自動生成）
+        resume: 再開するセッションID、またはチェックポイントファイルのパス
+        log: 進捗メッセージの出力先
+        
+    Returns:
+        dict: "session_id", "iterations"（実行した検索回数）, "final_report"
+    """
+    if resume:
+        # チェックポイントから調査情報を復元
+        checkpoint = load_checkpoint(resume)
+        session_id = checkpoint['session_id']
+        resume_stage = checkpoint['stage']
+        initial_query = checkpoint['initial_query']
+        max_iterations = checkpoint['max_iterations']
+        current_query = checkpoint['current_query']
+        iterations_done = checkpoint['iterations_done']
+        all_findings = checkpoint['all_findings']
+        searched_topics = checkpoint['searched_topics']
+        previous_urls = set(checkpoint['previous_urls'])
+        log(f"セッション「{session_id}」を再開します（完了済みラウンド: {iterations_done}）")
+        
+        # レポートまで完了している場合は保存済みのレポートを返す
+        if resume_stage == 'done':
+            return {"session_id": session_id, "iterations": iterations_done, "final_report": checkpoint['final_report']}
+    else:
+        session_id = session_id or new_session_id()
+        resume_stage = 'research'
+        
+        # 調査情報の初期化
+        current_query = initial_query
+        iterations_done = 0
+        all_findings = []
+        searched_topics = [current_query]
+        previous_urls = set()  # 既に処理したURLを追跡
+    
+    # 再開時は読み込んだチェックポイントと同じファイルに保存し続ける
+    session_ref = resume or session_id
+    
+    # スクレイピングした本文はメモリに溜めずにチェックポイントの隣のコーパスストアへ書き出す
+    # （例外や中断でも接続が残らないよう、使うたびに with で開いて閉じる）
+    corpus_file = corpus_path(session_ref)
+    
+    def build_checkpoint(checkpoint_stage, **extra):
+        # 現在の調査情報をチェックポイント用の辞書にまとめる
+        return {
+            "session_id": session_id,
+            "stage": checkpoint_stage,
+            "initial_query": initial_query,
+            "max_iterations": max_iterations,
+            "current_query": current_query,
+            "iterations_done": iterations_done,
+            "all_findings": all_findings,
+            "searched_topics": searched_topics,
+            "previous_urls": sorted(previous_urls),
+            **extra
+        }
+    
+    log(f"調査トピック: {initial_query}")
+    log(f"最大繰り返し回数: {max_iterations}")
+    log(f"使用モデル: {MODEL_NAME}")
+    log(f"ウェブスクレイピング: {'有効' if SCRAPE_PAGES else '無効'}")
+    log(f"セッション: {session_id}")
+    
+    # 調査のメインループ（最終レポート待ちで再開した場合はスキップ）
+    while resume_stage == 'research' and iterations_done < max_iterations:
         iterations_done += 1
-        print(f"\n--- 調査ラウンド {iterations_done}/{max_iterations} ---")
-        print(f"現在の検索クエリ: {current_query}")
+        log(f"\n--- 調査ラウンド {iterations_done}/{max_iterations} ---")
+        log(f"現在の検索クエリ: {current_query}")
+        
+        # まずローカル知識インデックスを検索し、未取得の関連ページを集める
+        local_pages = []
+        if knowledge_index is not None:
+            with stage("local_search"):
+                local_pages = [page for page in knowledge_index.search(current_query, limit=MAX_SCRAPE_PAGES * 2, max_age_days=KNOWLEDGE_MAX_AGE_DAYS)
+                               if page['url'] not in previous_urls][:MAX_SCRAPE_PAGES]
         
-        # Brave Search APIで検索実行
-        search_results = brave_client.search(current_query)
-        if not search_results:
-            print("検索結果が取得できませんでした。")
-            break
+        if len(local_pages) >= KNOWLEDGE_MIN_RESULTS:
+            # ローカルで十分な情報があればWeb検索とスクレイピングを省略
+            log(f"ローカル知識インデックスから関連ページを取得しました（{len(local_pages)}件、Web検索を省略）")
+            formatted_results, current_scraped_data, previous_urls = format_local_results(local_pages, previous_urls)
+        else:
+            # Brave Search APIで検索実行
+            with stage("search"), _search_slots:
+                search_results = get_brave_client().search(current_query)
+            if not search_results:
+                log("検索結果が取得できませんでした。")
+                break
+            
+            # 検索結果のフォーマットとスクレイピング
+            formatted_results, current_scraped_data, previous_urls = format_search_results(search_results, previous_urls)
+            log(f"検索結果を取得しました（{len(search_results.get('web', {}).get('results', []))}件）")
         
-        # 検索結果のフォーマットとスクレイピング
-        formatted_results, current_scraped_data, previous_urls = format_search_results(search_results, previous_urls)
         all_findings.append({"query": current_query, "results": formatted_results})
-        scraped_data.extend(current_scraped_data)
+        with CorpusStore(corpus_file) as corpus:
+            corpus.add_pages(current_scraped_data)
         
-        print(f"検索結果を取得しました（{len(search_results.get('web', {}).get('results', []))}件）")
         if SCRAPE_PAGES:
-            print(f"スクレイピングしたページ数: {len(current_scraped_data)}件")
+            log(f"スクレイピングしたページ数: {len(current_scraped_data)}件")
         
         # 全ての検索結果とトピックをまとめる
         all_results_text = ""
@@ -503,11 +773,12 @@ shouldContinue: bool
         research_prompt = research_prompt.replace("{{#conversation.topics#}}", ", ".join(searched_topics))
         
         # モデルに分析を依頼
-        response = client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[{"role": "user", "content": research_prompt}],
-            max_completion_tokens = MAX_TOKENS
-        )
+        with stage("analysis"), _llm_slots:
+            response = get_client().chat.completions.create(
+                model=MODEL_NAME,
+                messages=[{"role": "user", "content": research_prompt}],
+                max_completion_tokens = MAX_TOKENS
+            )
         
         # 分析結果を受け取り
         analysis_result = response.choices[0].message.content
@@ -519,13 +790,17 @@ shouldContinue: bool
         # 次の検索トピックが取得できなかった場合はデフォルトトピックを使用
         if not next_topic:
             next_topic = f"{initial_query} 追加情報"
-            print(f"次の検索トピックが見つからなかったため、デフォルトトピック「{next_topic}」を使用します。")
+            log(f"次の検索トピックが見つからなかったため、デフォルトトピック「{next_topic}」を使用します。")
         
         # 次の検索トピックを設定
         current_query = next_topic
         searched_topics.append(current_query)
+        
+        # ラウンドごとにチェックポイントを保存
+        save_checkpoint(session_ref, build_checkpoint('research'))
     
-    print(f"調査が完了しました（{iterations_done}回の検索を実行）。")
+    log(f"調査が完了しました（{iterations_done}回の検索を実行）。")
+    save_checkpoint(session_ref, build_checkpoint('final'))
     
     # 全ての検索結果をまとめる
     all_findings_text = ""
@@ -533,14 +808,15 @@ shouldContinue: bool
         all_findings_text += f"### 検索トピック {i}: {finding['query']}\n"
         all_findings_text += finding['results'] + "\n\n"
     
-    # スクレイピングしたデータを組み込んだコンテンツを作成
-    detailed_content = ""
-    if scraped_data:
-        for i, page_data in enumerate(scraped_data, 1):
-            detailed_content += f"\n## スクレイピングしたコンテンツ {i}: {page_data['title']}\n"
-            detailed_content += f"URL: {page_data['url']}\n\n"
-            detailed_content += f"{page_data['content']}\n\n"
-            detailed_content += "---\n\n"
+    # スクレイピングしたデータを組み込んだコンテンツを作成（ストアから1ページずつ読み出して一度に連結）
+    with CorpusStore(corpus_file) as corpus:
+        detailed_content = "".join(
+            f"\n## スクレイピングしたコンテンツ {i}: {page_data['title']}\n"
+            f"URL: {page_data['url']}\n\n"
+            f"{page_data['content']}\n\n"
+            "---\n\n"
+            for i, page_data in enumerate(corpus.iter_pages(), 1)
+        )
     
     # トークン管理
     all_findings_text, detailed_content = manage_token_usage(all_findings_text, detailed_content, MAX_TOKENS)
@@ -567,11 +843,12 @@ Provide important insights, conclusions, and remaining uncertainties. Cite sourc
     final_prompt = final_prompt.replace("{{#conversation.findings#}}", all_findings_text)
     final_prompt = final_prompt.replace("{{#detailed.content#}}", detailed_content)
     
-    final_response = client.chat.completions.create(
-        model=MODEL_NAME,
-        messages=[{"role": "user", "content": final_prompt}],
-        max_completion_tokens = MAX_TOKENS
-    )
+    with stage("final_report"), _llm_slots:
+        final_response = get_client().chat.completions.create(
+            model=MODEL_NAME,
+            messages=[{"role": "user", "content": final_prompt}],
+            max_completion_tokens = MAX_TOKENS
+        )
     
     # レポートを受け取り、整形する
     final_report = final_response.choices[0].message.content
@@ -586,10 +863,196 @@ Provide important insights, conclusions, and remaining uncertainties. Cite sourc
 
 {final_report}
 """
+    save_checkpoint(session_ref, build_checkpoint('done', final_report=final_report))
+    log(f"最終レポートを作成しました（セッション: {session_id}）")
+    
+    return {"session_id": session_id, "iterations": iterations_done, "final_report": final_report}
+
+def load_queries(path):
+    """
+    バッチ実行するクエリをファイルから読み込む
+    
+    不正な行（JSONとして読めない、"query" がない、"iterations" が1以上の整数でないなど）でも
+    バッチ全体は止めず、行番号付きの "error" を持つ辞書として返し、そのクエリだけを失敗として記録する。
+    
+    Args:
+        path: 1行に1クエリ、または {"query": ..., "iterations": ..., "session": ...} のJSONLのファイル
+        
+    Returns:
+        list: "query" と任意の "iterations", "session"（不正な行は "error"）を持つ辞書のリスト
+    """
+    queries = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line_number, line in enumerate(f, 1):
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            if not line.startswith("{"):
+                queries.append({"query": line})
+                continue
+            try:
+                options = json.loads(line)
+            except json.JSONDecodeError as e:
+                queries.append({"error": f"{line_number}行目: JSONとして読めません（{e}）"})
+                continue
+            if not isinstance(options, dict) or not isinstance(options.get("query"), str) or not options["query"].strip():
+                queries.append({"error": f"{line_number}行目: query を指定してください"})
+            elif "iterations" in options and (not isinstance(options["iterations"], int)
+                                              or isinstance(options["iterations"], bool) or options["iterations"] < 1):
+                queries.append({"query": options["query"], "error": f"{line_number}行目: iterations には1以上の整数を指定してください"})
+            elif not isinstance(options.get("session") or "", str):
+                queries.append({"query": options["query"], "error": f"{line_number}行目: session には文字列を指定してください"})
+            else:
+                queries.append(options)
+    return queries
+
+def run_batch(queries, concurrency, output_dir, default_iterations):
+    """
+    複数のクエリを並行して調査し、レポートと所要時間のまとめを書き出す
+    
+    Args:
+        queries: load_queries の結果
+        concurrency: 同時に実行する調査の数
+        output_dir: レポートとまとめ（summary.json）の保存先
+        default_iterations: クエリごとに指定がない場合の検索の最大繰り返し回数
+        
+    Returns:
+        dict: 実行結果のまとめ
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    print_lock = threading.Lock()
+    
+    def run_one(index, options):
+        # 並行する調査の出力が混ざらないよう番号を付けて1行ずつ出す
+        def log(message):
+            with print_lock:
+                for line in str(message).strip().splitlines():
+                    print(f"[{index}] {line}")
+        
+        entry = {"index": index, "query": options.get("query", ""), "session_id": None}
+        start = time.perf_counter()
+        with timer.collect() as stages:
+            try:
+                if "error" in options:
+                    raise ValueError(options["error"])
+                session_id = entry["session_id"] = options.get("session") or new_session_id()
+                result = run_research(options["query"], options.get("iterations", default_iterations),
+                                      session_id=session_id, log=log)
+                report_path = os.path.join(output_dir, f"{index:03d}-{session_id}.md")
+                with open(report_path, "w", encoding="utf-8") as f:
+                    f.write(result["final_report"])
+                entry.update(status="done", iterations=result["iterations"], report=report_path)
+            except Exception as e:
+                log(f"エラーが発生しました: {e}")
+                entry.update(status="error", error=str(e))
+        entry["elapsed"] = round(time.perf_counter() - start, 3)
+        entry["stages"] = {name: round(sum(durations), 3) for name, durations in stages.items()}
+        return entry
+    
+    start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as executor:
+        entries = list(executor.map(lambda item: run_one(*item), enumerate(queries, 1)))
+    wall = time.perf_counter() - start
+    
+    summary = {
+        "concurrency": concurrency,
+        "wall": round(wall, 3),
+        "throughput": round(len(entries) / wall, 4) if wall else 0.0,  # 調査/秒
+        "succeeded": sum(1 for entry in entries if entry["status"] == "done"),
+        "failed": sum(1 for entry in entries if entry["status"] != "done"),
+        "queries": entries
+    }
+    # 複数の接続先に振り分けている場合は接続先ごとの実績も残す
+    # （接続を作っていない replay モードでクライアントを作らないよう、作成済みの接続だけを見る）
+    if isinstance(_live_client, ClientPool):
+        summary["deployments"] = _live_client.stats()
+    with open(os.path.join(output_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump(summary, f, ensure_ascii=False, indent=2)
+    return summary
+
+def serve(host, port, max_jobs, max_queue, job_ttl_hours=24.0, max_finished_jobs=200):
+    """
+    調査をローカルHTTP APIで受け付けるサービスモード
+    
+    Args:
+        host: 待ち受けアドレス
+        port: 待ち受けポート
+        max_jobs: 同時に実行する調査の上限
+        max_queue: 実行待ちにできる調査の上限
+        job_ttl_hours: 終わった調査のレポートと進捗を保持する時間
+        max_finished_jobs: 保持する終わった調査の上限
+    """
+    from utils.research_service import JobManager, serve_jobs
+    
+    # 最初のジョブを待たせないよう、クライアントと接続プールを先に用意しておく
+    get_client()
+    get_brave_client()
+    get_http_session()
+    
+    def run_job(job):
+        # ジョブIDをそのままセッション名にする（--resume で再開できる）
+        # query と iterations はHTTPの受付時に検証済み
+        return run_research(job.params["query"], job.params["iterations"], session_id=job.id, log=job.log)
+    
+    manager = JobManager(run_job, max_jobs, max_queue, finished_ttl=job_ttl_hours * 3600, max_finished=max_finished_jobs)
+    serve_jobs(manager, host, port)
+
+def main():
+    # コマンドライン引数の解析
+    parser = argparse.ArgumentParser(description=f'DeepResearch: {MODEL_NAME}モデルとBrave Search APIを使用した深い調査') # 説明を動的に
+    parser.add_argument('--iterations', type=int, default=3, help='検索の最大繰り返し回数')
+    parser.add_argument('--query', type=str, help='最初の検索クエリ')
+    parser.add_argument('--scrape', action='store_true', help='ウェブページのスクレイピングを有効にする')
+    parser.add_argument('--session', type=str, help='チェックポイントのセッション名（省略時は日時から自動生成）')
+    parser.add_argument('--resume', type=str, metavar='SESSION', help='指定したセッションのチェックポイントから調査を再開する')
+    parser.add_argument('--no-knowledge', action='store_true', help='ローカル知識インデックスを使わずに毎回Web検索する')
+    parser.add_argument('--queries-file', type=str, help='複数のクエリを並行して調査する（1行に1クエリ、またはJSONL）')
+    parser.add_argument('--concurrency', type=int, default=4, help='--queries-file で同時に実行する調査の数')
+    parser.add_argument('--output-dir', type=str, default='reports', help='--queries-file のレポートとまとめの保存先')
+    parser.add_argument('--serve', action='store_true', help='ローカルHTTP APIとして常駐し、調査ジョブを受け付ける')
+    parser.add_argument('--host', type=str, default='127.0.0.1', help='サービスモードの待ち受けアドレス')
+    parser.add_argument('--port', type=int, default=8765, help='サービスモードの待ち受けポート')
+    parser.add_argument('--max-jobs', type=int, default=4, help='サービスモードで同時に実行する調査の上限')
+    parser.add_argument('--max-queue', type=int, default=100, help='サービスモードで待機できる調査の上限')
+    parser.add_argument('--job-ttl-hours', type=float, default=24.0, help='サービスモードで終わった調査のレポートを保持する時間')
+    parser.add_argument('--max-finished-jobs', type=int, default=200, help='サービスモードで保持する終わった調査の上限（超えたら古いものから削除）')
+    parser.add_argument('--profile', nargs='?', const='', metavar='PATH',
+                        help='実行全体をプロファイルし、終了時に .prof を書き出してCPU時間とネットワーク待ちの上位の関数を表示する（PATH 省略時は profiles/ に保存）')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP, help='--profile で表示する関数の数')
+    args = parser.parse_args()
+    
+    if args.profile is not None:
+        # スレッドプールを作る前に開始し、スクレイピングなどのスレッドも計測する（結果は終了時に表示）
+        profiler.start(args.profile or default_profile_path(__file__), args.profile_top)
+    
+    if not args.query and not args.resume and not args.serve and not args.queries_file:
+        parser.error('--query、--resume、--queries-file、--serve のいずれかを指定してください')
+    
+    # コマンドラインからスクレイピング設定を上書き
+    global SCRAPE_PAGES
+    if args.scrape:
+        SCRAPE_PAGES = True
+    
+    init_stores(not args.no_knowledge)
+    
+    if args.serve:
+        serve(args.host, args.port, args.max_jobs, args.max_queue, args.job_ttl_hours, args.max_finished_jobs)
+        return
+    
+    if args.queries_file:
+        summary = run_batch(load_queries(args.queries_file), args.concurrency, args.output_dir, args.iterations)
+        print(f"\n===== バッチ実行の結果（{summary['succeeded']}件成功 / {summary['failed']}件失敗、所要 {summary['wall']:.1f}秒）=====")
+        for entry in summary["queries"]:
+            detail = entry.get("report") or entry.get("error")
+            print(f"  [{entry['index']}] {entry['status']:<5} {entry['elapsed']:7.1f}s  {entry['query']} -> {detail}")
+        print(f"まとめ: {os.path.join(args.output_dir, 'summary.json')}")
+        return
+    
+    result = run_research(args.query, args.iterations, session_id=args.session, resume=args.resume)
     
     # 最終レポートの表示
     print("\n===== 最終調査レポート =====\n")
-    print(final_report)
+    print(result["final_report"])
     
 if __name__ == "__main__":
     try:
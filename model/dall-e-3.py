@@ -1,43 +1,185 @@
-from openai import AzureOpenAI
+# DALL-E 3 による画像生成
+# python dall-e-3.py                                   # 既定のプロンプトで1枚生成して表示
+# python dall-e-3.py --prompts prompts.txt --concurrency 4 --rpm 6
+#   prompts.txt は1行に1プロンプト、または {"prompt": ..., "name": ..., "size": ..., "quality": ..., "style": ...} のJSONL
+
 import os
-import requests
-from PIL import Image
+import re
+import sys
 import json
+import time
+import base64
+import argparse
+import threading
+import concurrent.futures
+import requests
 from dotenv import load_dotenv
 
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.client_pool import create_azure_client
+
 # 環境変数の読み込み　.envが使える
-load_dotenv() 
+load_dotenv()
+
+# --- 設定 ---
+MODEL_NAME = "dall-e-3"  # DALL-E 3 のデプロイ名
+DEFAULT_PROMPT = "a famous photograph of Albert Einstein sticking his tongue out and looking at the camera"
+DEFAULT_CONCURRENCY = 2  # 同時に生成する画像の数
+DEFAULT_RPM = 6          # 1分あたりのリクエスト数の上限（デプロイのクォータに合わせる）
+DOWNLOAD_CHUNK_SIZE = 64 * 1024  # URLから画像をダウンロードするときのチャンクサイズ
+# -------------
+
+class RateLimiter:
+    """リクエストの間隔を空けて1分あたりのリクエスト数を制限するクラス"""
+
+    def __init__(self, rpm):
+        self.interval = 60.0 / rpm if rpm > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_time = 0.0
+
+    def wait(self):
+        """次のリクエストを送ってよい時刻まで待つ"""
+        with self._lock:
+            now = time.monotonic()
+            start = max(self._next_time, now)
+            self._next_time = start + self.interval
+        if start > now:
+            time.sleep(start - now)
+
+def load_prompts(path):
+    """
+    プロンプトの一覧をファイルから読み込む
+
+    Args:
+        path: 1行に1プロンプト、またはJSONL形式のファイルのパス
+
+    Returns:
+        list: "prompt" と任意の "name", "size", "quality", "style" を持つ辞書のリスト
+    """
+    jobs = []
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            jobs.append(json.loads(line) if line.startswith("{") else {"prompt": line})
+    return jobs
+
+def slugify(text, max_length=40):
+    # ファイル名に使えない文字を取り除く
+    slug = re.sub(r"[^\w\-]+", "-", text).strip("-")
+    return slug[:max_length] or "image"
+
+def download_image(url, image_path):
+    """
+    画像をメモリに溜めずにチャンクごとにファイルへ書き出す
+
+    Args:
+        url: 画像のURL
+        image_path: 保存先のパス
+    """
+    with requests.get(url, stream=True, timeout=60) as response:
+        response.raise_for_status()
+        with open(image_path, "wb") as image_file:
+            for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                image_file.write(chunk)
+
+def generate_image(client, job, index, image_dir, response_format, rate_limiter):
+    """
+    1枚の画像を生成して保存する
+
+    Args:
+        client: AzureOpenAIクライアント
+        job: プロンプトと生成オプションの辞書
+        index: 画像の番号
+        image_dir: 保存先のディレクトリ
+        response_format: "b64_json"（応答に画像を含める）または "url"（別途ダウンロード）
+        rate_limiter: RateLimiter
+
+    Returns:
+        dict: マニフェストに記録する情報
+    """
+    # name もファイル名の一部になるので、パス区切りなどを取り除いてから使う
+    name = slugify(str(job["name"])) if job.get("name") else slugify(job["prompt"])
+    image_path = os.path.join(image_dir, f"{index:04d}-{name}.png")
+    entry = {"index": index, "prompt": job["prompt"], "file": image_path}
+    start = time.perf_counter()
+
+    try:
+        options = {key: job[key] for key in ("size", "quality", "style") if key in job}
+        rate_limiter.wait()
+        result = client.images.generate(
+            model=MODEL_NAME, # the name of your DALL-E 3 deployment
+            prompt=job["prompt"],
+            n=1,
+            response_format=response_format,
+            **options
+        )
+        image = result.data[0]
+
+        if response_format == "b64_json":
+            # 応答に含まれる画像をそのまま書き出す（2回目のダウンロードが不要）
+            with open(image_path, "wb") as image_file:
+                image_file.write(base64.b64decode(image.b64_json))
+        else:
+            download_image(image.url, image_path)
+
+        entry.update(status="ok", revised_prompt=image.revised_prompt)
+    except Exception as e:
+        entry.update(status="error", error=str(e), file=None)
+
+    entry["elapsed"] = round(time.perf_counter() - start, 3)
+    return entry
+
+def main():
+    parser = argparse.ArgumentParser(description='DALL-E 3 で画像を生成する')
+    parser.add_argument('--prompts', type=str, help='プロンプトの一覧ファイル（省略時は既定のプロンプトで1枚生成）')
+    parser.add_argument('--output-dir', type=str, default=os.path.join(os.curdir, 'images'), help='画像とマニフェストの保存先')
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY, help='同時に生成する画像の数')
+    parser.add_argument('--rpm', type=float, default=DEFAULT_RPM, help='1分あたりのリクエスト数の上限（0で無制限）')
+    parser.add_argument('--response-format', choices=['b64_json', 'url'], default='b64_json', help='画像の受け取り方')
+    parser.add_argument('--show', action='store_true', help='生成した画像を既定の画像ビューアで表示する（Pillowが必要）')
+    args = parser.parse_args()
 
-client = AzureOpenAI(
-    api_version="2024-02-01",  
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-)
+    jobs = load_prompts(args.prompts) if args.prompts else [{"prompt": DEFAULT_PROMPT, "name": "generated_image"}]
 
-result = client.images.generate(
-    model="dall-e-3", # the name of your DALL-E 3 deployment
-    prompt="a famous photograph of Albert Einstein sticking his tongue out and looking at the camera",
-    n=1
-)
+    # If the directory doesn't exist, create it
+    os.makedirs(args.output_dir, exist_ok=True)
 
-json_response = json.loads(result.model_dump_json())
+    # 他のモデルのスクリプトと同じ接続設定を使う
+    # （AZURE_OPENAI_DEPLOYMENTS を設定した場合、images は最初の接続先に送られる）
+    client = create_azure_client()
+    rate_limiter = RateLimiter(args.rpm)
 
-# Set the directory for the stored image
-image_dir = os.path.join(os.curdir, 'images')
+    print(f"{len(jobs)}件の画像を生成します（同時実行 {args.concurrency}、上限 {args.rpm:g} RPM）")
+    manifest_path = os.path.join(args.output_dir, "manifest.jsonl")
+    entries = []
 
-# If the directory doesn't exist, create it
-if not os.path.isdir(image_dir):
-    os.mkdir(image_dir)
+    with open(manifest_path, "a", encoding="utf-8") as manifest, \
+         concurrent.futures.ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        futures = [executor.submit(generate_image, client, job, index, args.output_dir, args.response_format, rate_limiter)
+                   for index, job in enumerate(jobs)]
+        for future in concurrent.futures.as_completed(futures):
+            entry = future.result()
+            entries.append(entry)
+            # 途中で止まっても結果が残るよう1件ずつ追記する
+            manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.flush()
+            if entry["status"] == "ok":
+                print(f"生成完了: {entry['file']}（{entry['elapsed']}秒）")
+            else:
+                print(f"生成エラー: {entry['prompt'][:40]} - {entry['error']}")
 
-# Initialize the image path (note the filetype should be png)
-image_path = os.path.join(image_dir, 'generated_image.png')
+    succeeded = sum(1 for entry in entries if entry["status"] == "ok")
+    print(f"{succeeded}/{len(entries)}件を生成しました。マニフェスト: {manifest_path}")
 
-# Retrieve the generated image
-image_url = json_response["data"][0]["url"]  # extract image URL from response
-generated_image = requests.get(image_url).content  # download the image
-with open(image_path, "wb") as image_file:
-    image_file.write(generated_image)
+    # Display the image in the default image viewer
+    if args.show:
+        from PIL import Image
+        for entry in sorted(entries, key=lambda e: e["index"]):
+            if entry["status"] == "ok":
+                Image.open(entry["file"]).show()
 
-# Display the image in the default image viewer
-image = Image.open(image_path)
-image.show()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
@@ -1,55 +1,260 @@
 # GPT-4-1 モデルを使用した画像説明
 # 画像に書かれたモデル
+# python gpt-4-1.py                                        # ../images/models.png を1枚処理
+# python gpt-4-1.py --dir screenshots --max-in-flight 4 --detail low --output results.jsonl
+# python gpt-4-1.py --chat shot.png                       # 画像について続けて質問する（/exit で終了）
 
-from openai import AzureOpenAI
 import os
+import io
+import sys
+import json
 import base64
+import hashlib
+import argparse
+import mimetypes
+import tempfile
+import concurrent.futures
 from dotenv import load_dotenv
 
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.completion_cache import wrap_client
+from utils.client_pool import create_azure_client
+from utils.chat_session import ChatSession, run_chat, DEFAULT_MAX_HISTORY_TOKENS
+
 # 環境変数の読み込み　.envが使える
 load_dotenv()
 
-# クライアントの作成
-client = AzureOpenAI(
-    api_version="2024-02-01",
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-)
-
-# 画像ファイルのパスを指定
-file_path = '../images/models.png'
-
-# ファイルをバイナリモードで開いて読み込む
-with open(file_path, 'rb') as image_file:
-    # ファイルの内容を読み込む
-    encoded_string = base64.b64encode(image_file.read()).decode('utf-8')
-
-# data URIスキームに従ってフォーマットする
-image_url = f"data:image/png;base64,{encoded_string}"
-
-# GPT-4-1でリクエストを送信
-response = client.chat.completions.create(
-    model="gpt-4.1", # GPT-4-1モデルのデプロイ名を指定
-    messages=[
-        {
-            "role": "user",
-            "content": [
-                {
-                    "type": "text",
-                    "text": "この画像にあるLLMモデルをすべて教えてください。"
-                },
-                {
-                    "type": "image_url",
-                    "image_url": {
-                        "url": image_url
-                    }
-                }
-            ]
-        }
-    ],
-    max_tokens=16384
-)
-
-# 応答内容を取得して表示
-content = response.choices[0].message.content
-print(content)
\ No newline at end of file
+# --- 設定 ---
+MODEL_NAME = "gpt-4.1"  # GPT-4-1モデルのデプロイ名を指定
+DEFAULT_IMAGE = '../images/models.png'
+DEFAULT_PROMPT = "この画像にあるLLMモデルをすべて教えてください。"
+MAX_TOKENS = 16384
+DEFAULT_MAX_IN_FLIGHT = 4  # 同時に送信するリクエストの上限
+IMAGE_CACHE_DIR = ".vision_cache"  # エンコード済みdata URIの保存先
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp", ".gif")
+JPEG_QUALITY = 85
+# detail ごとの縮小方法（サーバー側と同じ基準で先に縮小して送信量と画像トークンを抑える）
+#   low : 512x512 に収める
+#   high: 2048x2048 に収めたうえで短辺を768にする
+DETAIL_LIMITS = {
+    "low": {"fit": 512, "short_side": None},
+    "high": {"fit": 2048, "short_side": 768},
+}
+# -------------
+
+def target_size(width, height, detail):
+    """
+    detail に応じた縮小後の画像サイズを求める（拡大はしない）
+
+    Args:
+        width: 元の幅
+        height: 元の高さ
+        detail: "low" または "high"
+
+    Returns:
+        tuple: (幅, 高さ)
+    """
+    limits = DETAIL_LIMITS[detail]
+    scale = min(1.0, limits["fit"] / max(width, height))
+    if limits["short_side"]:
+        scale = min(scale, limits["short_side"] / min(width, height))
+    return max(1, round(width * scale)), max(1, round(height * scale))
+
+def encode_image(data, detail, image_format, file_path=None):
+    """
+    画像を縮小・再エンコードして data URI にする
+
+    Pillow がインストールされていない場合は元の画像をそのままエンコードする
+    （MIMEタイプはファイルの拡張子から推定し、分からなければ image/png とする）
+
+    Args:
+        data: 画像ファイルの内容
+        detail: "low" または "high"
+        image_format: "png" または "jpeg"
+        file_path: 画像ファイルのパス（Pillow がない場合のMIMEタイプの推定に使う）
+
+    Returns:
+        str: data URI
+    """
+    try:
+        from PIL import Image
+    except ImportError:
+        mime_type = mimetypes.guess_type(file_path)[0] if file_path else None
+        if not mime_type or not mime_type.startswith("image/"):
+            mime_type = "image/png"
+        return f"data:{mime_type};base64,{base64.b64encode(data).decode('utf-8')}"
+
+    with Image.open(io.BytesIO(data)) as image:
+        size = target_size(image.width, image.height, detail)
+        if size != image.size:
+            image = image.resize(size, Image.LANCZOS)
+        if image_format == "jpeg" and image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        buffer = io.BytesIO()
+        if image_format == "jpeg":
+            image.save(buffer, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        else:
+            image.save(buffer, format="PNG", optimize=True)
+    return f"data:image/{image_format};base64,{base64.b64encode(buffer.getvalue()).decode('utf-8')}"
+
+def load_image_url(file_path, detail, image_format, cache_dir=IMAGE_CACHE_DIR):
+    """
+    画像の data URI を取得する
+
+    ファイル内容のハッシュと変換条件をキーにキャッシュし、同じ画像は再エンコードしない
+
+    Args:
+        file_path: 画像ファイルのパス
+        detail: "low" または "high"
+        image_format: "png" または "jpeg"
+        cache_dir: キャッシュの保存先（Noneでキャッシュしない）
+
+    Returns:
+        str: data URI
+    """
+    # ファイルをバイナリモードで開いて読み込む
+    with open(file_path, 'rb') as image_file:
+        data = image_file.read()
+
+    if not cache_dir:
+        return encode_image(data, detail, image_format, file_path)
+
+    # Pillow がない場合は拡張子でMIMEタイプが変わるので、拡張子もキーに含める
+    extension = os.path.splitext(file_path)[1].lower()
+    key = hashlib.sha256(data + f"|{detail}|{image_format}|{JPEG_QUALITY}|{extension}".encode("utf-8")).hexdigest()
+    cache_path = os.path.join(cache_dir, key[:2], f"{key}.txt")
+    if os.path.exists(cache_path):
+        with open(cache_path, "r", encoding="utf-8") as f:
+            return f.read()
+
+    image_url = encode_image(data, detail, image_format, file_path)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+    # 複数のスレッドで変換しても一時ファイルが重ならないよう mkstemp で作る
+    fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=os.path.dirname(cache_path))
+    try:
+        with open(fd, "w", encoding="utf-8") as f:
+            f.write(image_url)
+        os.replace(tmp_path, cache_path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+    return image_url
+
+def build_image_message(file_paths, prompt, detail, image_format, cache_dir=IMAGE_CACHE_DIR):
+    """
+    指示と画像をまとめたユーザーの発言を作る
+
+    Args:
+        file_paths: 画像ファイルのパスのリスト
+        prompt: 画像と一緒に送る指示
+        detail: "low" または "high"
+        image_format: "png" または "jpeg"
+        cache_dir: data URI のキャッシュの保存先
+
+    Returns:
+        list: text / image_url パーツのリスト
+    """
+    content = [{"type": "text", "text": prompt}]
+    for file_path in file_paths:
+        content.append({
+            "type": "image_url",
+            "image_url": {
+                "url": load_image_url(file_path, detail, image_format, cache_dir),
+                "detail": detail
+            }
+        })
+    return content
+
+def describe_image(client, file_path, prompt, detail, image_format, cache_dir=IMAGE_CACHE_DIR):
+    """
+    1枚の画像について GPT-4-1 に問い合わせる
+
+    Args:
+        client: AzureOpenAIクライアント
+        file_path: 画像ファイルのパス
+        prompt: 画像と一緒に送る指示
+        detail: "low" または "high"
+        image_format: "png" または "jpeg"
+        cache_dir: data URI のキャッシュの保存先
+
+    Returns:
+        str: 応答内容
+    """
+    # GPT-4-1でリクエストを送信
+    response = client.chat.completions.create(
+        model=MODEL_NAME,
+        messages=[
+            {
+                "role": "user",
+                "content": build_image_message([file_path], prompt, detail, image_format, cache_dir)
+            }
+        ],
+        max_tokens=MAX_TOKENS
+    )
+    return response.choices[0].message.content
+
+def list_images(directory):
+    # ディレクトリ内の画像ファイルを名前順に列挙する
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory))
+            if name.lower().endswith(IMAGE_EXTENSIONS)]
+
+def main():
+    parser = argparse.ArgumentParser(description='GPT-4-1 で画像の内容を読み取る')
+    parser.add_argument('images', nargs='*', help=f'画像ファイル（省略時は {DEFAULT_IMAGE}）')
+    parser.add_argument('--dir', type=str, help='このディレクトリ内の画像をすべて処理する')
+    parser.add_argument('--prompt', type=str, default=DEFAULT_PROMPT, help='画像と一緒に送る指示')
+    parser.add_argument('--detail', choices=['low', 'high'], default='high', help='画像の詳細度（low は512px程度に縮小して画像トークンを固定にする）')
+    parser.add_argument('--format', dest='image_format', choices=['png', 'jpeg'], default='png', help='再エンコードの形式')
+    parser.add_argument('--max-in-flight', type=int, default=DEFAULT_MAX_IN_FLIGHT, help='同時に送信するリクエストの上限')
+    parser.add_argument('--no-image-cache', action='store_true', help='data URI のキャッシュを使わない')
+    parser.add_argument('--output', type=str, help='結果をJSONLで書き出すファイル')
+    parser.add_argument('--chat', action='store_true', help='画像を最初の発言に含めて、応答をストリーミングで表示しながら対話する')
+    parser.add_argument('--max-history-tokens', type=int, default=DEFAULT_MAX_HISTORY_TOKENS, help='会話履歴がこれを超えたら古いターンを要約する')
+    args = parser.parse_args()
+
+    files = list(args.images)
+    if args.dir:
+        files.extend(list_images(args.dir))
+    if not files:
+        files = [DEFAULT_IMAGE]
+    cache_dir = None if args.no_image_cache else IMAGE_CACHE_DIR
+
+    # クライアントの作成（AZURE_OPENAI_DEPLOYMENTS があれば複数の接続先に振り分け、LLM_CACHE_MODE に応じて応答キャッシュ付きでラップ）
+    client = wrap_client(create_azure_client)
+
+    if args.chat:
+        # 画像付きの最初の発言は履歴の先頭に残るので、以降のターンではプロンプトキャッシュが効く
+        session = ChatSession(client, MODEL_NAME, max_history_tokens=args.max_history_tokens,
+                              completion_params={"max_tokens": MAX_TOKENS})
+        run_chat(session, build_image_message(files, args.prompt, args.detail, args.image_format, cache_dir))
+        return
+
+    if len(files) == 1:
+        # 応答内容を取得して表示
+        content = describe_image(client, files[0], args.prompt, args.detail, args.image_format, cache_dir)
+        print(content)
+        results = [{"file": files[0], "content": content}]
+    else:
+        results = []
+        with concurrent.futures.ThreadPoolExecutor(max_workers=args.max_in_flight) as executor:
+            futures = {executor.submit(describe_image, client, file_path, args.prompt, args.detail, args.image_format, cache_dir): file_path
+                       for file_path in files}
+            for future in concurrent.futures.as_completed(futures):
+                file_path = futures[future]
+                try:
+                    result = {"file": file_path, "content": future.result()}
+                    print(f"=== {file_path} ===\n{result['content']}\n")
+                except Exception as e:
+                    result = {"file": file_path, "error": str(e)}
+                    print(f"エラー: {file_path} - {e}")
+                results.append(result)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            for result in sorted(results, key=lambda r: r["file"]):
+                f.write(json.dumps(result, ensure_ascii=False) + "\n")
+        print(f"{len(results)}件の結果を {args.output} に保存しました")
+
+if __name__ == "__main__":
+    main()
@@ -1,34 +1,60 @@
 # gpt-4oの場合 Max_token 4096 以下
 # o1-mini, gpt-4o, gpt-4o-mini
+# python o1-gpt-4.py                    # 1回だけ質問して応答を表示
+# python o1-gpt-4.py --chat             # ストリーミングで対話（/exit で終了、/stats でトークン使用量）
 
-from openai import AzureOpenAI
 import os
-import requests
-from PIL import Image
-import json
+import sys
+import argparse
 from dotenv import load_dotenv
 
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.completion_cache import wrap_client
+from utils.client_pool import create_azure_client
+from utils.chat_session import ChatSession, run_chat, DEFAULT_MAX_HISTORY_TOKENS
+
 # 環境変数の読み込み　.envが使える
-load_dotenv() 
+load_dotenv()
+
+# --- 設定 ---
+MODEL_NAME = "gpt-4o"  # replace with the model deployment name of your o1-preview, or o1-mini model
+DEFAULT_PROMPT = "o1 miniモデルについて教えて"
+MAX_COMPLETION_TOKENS = 4096
+# -------------
+
+def main():
+    parser = argparse.ArgumentParser(description='o1 / GPT-4o シリーズのモデルに質問する')
+    parser.add_argument('--prompt', type=str, help=f'質問（省略時は「{DEFAULT_PROMPT}」、--chat の場合は最初の発言）')
+    parser.add_argument('--model', type=str, default=MODEL_NAME, help='デプロイ名')
+    parser.add_argument('--chat', action='store_true', help='応答をストリーミングで表示しながら対話する')
+    parser.add_argument('--system', type=str, help='システムプロンプト（o1 系のモデルでは指定しない）')
+    parser.add_argument('--max-history-tokens', type=int, default=DEFAULT_MAX_HISTORY_TOKENS, help='会話履歴がこれを超えたら古いターンを要約する')
+    args = parser.parse_args()
+
+    # AZURE_OPENAI_DEPLOYMENTS があれば複数の接続先に振り分け、LLM_CACHE_MODE に応じて応答キャッシュ付きでラップ
+    client = wrap_client(create_azure_client)
 
+    if args.chat:
+        session = ChatSession(client, args.model, system_prompt=args.system, max_history_tokens=args.max_history_tokens,
+                              completion_params={"max_completion_tokens": MAX_COMPLETION_TOKENS})
+        run_chat(session, args.prompt)
+        return
 
-client = AzureOpenAI(
-    api_version="2024-02-01",  
-    api_key=os.getenv("AZURE_OPENAI_API_KEY"),  
-    azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-)
+    response = client.chat.completions.create(
+        model=args.model,
+        messages=[
+            {
+                "role": "user",
+                "content": args.prompt or DEFAULT_PROMPT},
+        ],
+        max_completion_tokens = MAX_COMPLETION_TOKENS
 
-response = client.chat.completions.create(
-    model="gpt-4o", # replace with the model deployment name of your o1-preview, or o1-mini model
-    messages=[
-        {
-            "role": "user", 
-            "content": "o1 miniモデルについて教えて"},
-    ],
-    max_completion_tokens = 4096
+    )
 
-)
+    # contentのみを表示
+    content = response.choices[0].message.content
+    print(content)
 
-# contentのみを表示
-content = response.choices[0].message.content
-print(content)
\ No newline at end of file
+if __name__ == "__main__":
+    main()
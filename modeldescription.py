@@ -1,10 +1,18 @@
 import os
 import requests
-from bs4 import BeautifulSoup
 import concurrent.futures
-from openai import AzureOpenAI
 from dotenv import load_dotenv
-import base64
+import argparse
+import json
+import time
+import datetime
+from utils.completion_cache import wrap_client
+from utils.client_pool import create_azure_client
+from utils.corpus_store import CorpusStore
+from utils.document_fetcher import fetch_document, UnsupportedDocumentError
+from utils.mention_index import MentionIndex
+from utils.stage_timer import stage
+from utils.profiler import profiler, default_profile_path, DEFAULT_TOP as PROFILE_TOP
 
 # .env ファイルから環境変数を読み込む
 load_dotenv()
@@ -12,6 +20,39 @@ load_dotenv()
 # スクレイピング設定
 MAX_SCRAPE_LENGTH = 100000  # スクレイピングするコンテンツの最大長さ（100万トークン相当）
 
+# 説明文生成の設定
+FAN_OUT_WORKERS = 4        # --fan-out 時に同時に処理するモデル数
+MAX_PASSAGE_CHARS = 20000  # --fan-out 時に1モデルのプロンプトに含める抜粋の最大文字数
+DESCRIPTION_LENGTH = 35    # 説明文の文字数
+REPAIR_MAX_ATTEMPTS = 3    # 文字数が合わない説明文を作り直す最大回数
+
+# バッチモード（--batch）の設定
+BATCH_API_VERSION = "2024-10-21"  # Batch API に対応したAPIバージョン
+BATCH_DEPLOYMENT = "gpt-4.1"      # バッチ用（Global Batch）のデプロイ名
+BATCH_POLL_INTERVAL = 30          # バッチの状態を確認する間隔（秒）
+BATCH_DIR = "batches"             # バッチの入力・出力JSONLを保存するディレクトリ
+
+# 説明文を生成する対象のモデル
+TARGET_MODELS = [
+    "GPT-4.1",
+    "GPT-4.1 mini",
+    "GPT-4.1 nano",
+    "GPT-4o",
+    "GPT-4o mini",
+    "o1 mini",
+    "Claude 3.7 Sonnet",
+    "Claude 3.5 Sonnet（v2）",
+    "Claude 3.5 Sonnet（v1）",
+    "Claude 3.5 Haiku",
+    "Claude 3 Haiku",
+    "Amazon Nova Pro",
+    "Amazon Nova Lite",
+    "Amazon Nova Micro",
+    "Llama 3.3 70B",
+    "Llama 3.2 90B Instruct",
+    "Llama 3.1 405B Instruct"
+]
+
 def scrape_webpage(url):
     """
     指定されたURLのウェブページをスクレイピングする
@@ -29,53 +70,17 @@ def scrape_webpage(url):
             "Accept-Language": "ja-JP,ja;q=0.9,en-US;q=0.8,en;q=0.7"
         }
         
-        response = requests.get(url, headers=headers, timeout=15)
-        response.raise_for_status()
-        
-        # HTMLを解析
-        soup = BeautifulSoup(response.text, 'html.parser')
-        
-        # タイトルの取得
-        title = soup.title.string if soup.title else "タイトルなし"
-        
-        # メタ説明を取得
-        meta_description = ""
-        meta_tag = soup.find("meta", attrs={"name": "description"})
-        if meta_tag and "content" in meta_tag.attrs:
-            meta_description = meta_tag["content"]
-        
-        # h1, h2, h3タグの内容を取得（見出し情報は重要）
-        headings = []
-        for h in soup.find_all(['h1', 'h2', 'h3']):
-            text = h.get_text().strip()
-            if text:
-                headings.append(f"{h.name}: {text}")
-        
-        # 不要なタグを削除
-        for tag in soup(["script", "style", "nav", "footer", "aside", "iframe", "noscript"]):
-            tag.decompose()
-        
-        # 本文のテキストを取得（pタグとリスト要素）
-        main_content = []
-        for element in soup.find_all(['p', 'li', 'div.content', 'div.description']):
-            text = element.get_text().strip()
-            if text and len(text) > 20:  # 短すぎるテキストは除外
-                main_content.append(text)
-        
-        # キーワードの強調されたテキストを取得（strong, b, emタグなど）
-        emphasized = []
-        for em in soup.find_all(['strong', 'b', 'em']):
-            text = em.get_text().strip()
-            if text and len(text) > 3:  # 短すぎる強調は除外
-                emphasized.append(text)
+        # Content-Type に応じて本文を抽出（HTMLは本文だけを重複なく、PDFは上限の文字数に達したページで取得を打ち切る）
+        document = fetch_document(url, headers=headers, max_chars=MAX_SCRAPE_LENGTH, timeout=15)
+        title = document["title"] or "タイトルなし"
+        meta_description = document["meta_description"]
+        main_content = document["text"]
         
         # スクレイピングしたデータを結合
         all_text = "\n\n".join([
             f"タイトル: {title}",
             f"メタ説明: {meta_description}",
-            "見出し:\n" + "\n".join(headings),
-            "主要なコンテンツ:\n" + "\n\n".join(main_content),
-            "強調されたテキスト:\n" + "\n".join(emphasized)
+            "主要なコンテンツ:\n" + main_content
         ])
         
         # 長いテキストを制限
@@ -94,20 +99,23 @@ def scrape_webpage(url):
         return {"error": f"HTTPエラー発生: {e} - URL: {url}"}
     except requests.exceptions.ConnectionError:
         return {"error": f"接続エラー: {url} に接続できません"}
+    except UnsupportedDocumentError as e:
+        return {"error": f"スクレイピングできません: {e}"}
     except Exception as e:
         return {"error": f"スクレイピングエラー: {str(e)} - URL: {url}"}
 
-def parallel_scrape_webpages(urls):
+def parallel_scrape_webpages(urls, corpus):
     """
-    複数のウェブページを並行してスクレイピングする
+    複数のウェブページを並行してスクレイピングし、終わったものから順にコーパスストアへ保存する
     
     Args:
         urls: スクレイピングするURLのリスト
+        corpus: 結果を保存するCorpusStore
         
     Returns:
-        list: スクレイピング結果のリスト
+        int: 保存したページ数
     """
-    results = []
+    saved = 0
     
     with concurrent.futures.ThreadPoolExecutor(max_workers=5) as executor:
         future_to_url = {executor.submit(scrape_webpage, url): url for url in urls}
@@ -115,16 +123,18 @@ def parallel_scrape_webpages(urls):
         for future in concurrent.futures.as_completed(future_to_url):
             url = future_to_url[future]
             try:
-                content = future.result()
-                results.append({
-                    "url": url,
-                    "data": content
-                })
+                data = future.result()
+                # エラーの場合もプロンプトに含めるためエラーメッセージを本文として保存する
+                if "error" in data:
+                    corpus.add(url, None, data["error"])
+                else:
+                    corpus.add(url, data["title"], data["content"])
+                saved += 1
                 print(f"スクレイピング完了: {url}")
             except Exception as e:
                 print(f"ページ {url} の処理中にエラー: {e}")
     
-    return results
+    return saved
 
 # def extract_llm_from_image():
 #     # クライアントの作成
@@ -177,77 +187,30 @@ def parallel_scrape_webpages(urls):
     
 #     return models
 
-def generate_model_descriptions(scraped_data):
+def create_client():
     """
-    スクレイピングしたコンテンツを基にAzure OpenAIを使って
-    モデル説明文を生成します
+    AzureOpenAIクライアントを作成する（LLM_CACHE_MODE に応じて応答キャッシュ付きでラップ）
+    
+    AZURE_OPENAI_DEPLOYMENTS が設定されていれば複数の接続先に振り分ける
+    
+    Returns:
+        AzureOpenAI: クライアント
+    """
+    return wrap_client(create_azure_client)
+
+def build_analysis_prompt(models, content):
+    """
+    モデルの特徴を分析させるプロンプトを作成する
     
     Args:
-        scraped_data: スクレイピングされたデータのリスト
+        models: 分析対象のモデル名のリスト
+        content: スクレイピングした内容
         
     Returns:
-        dict: モデル名をキー、説明文を値とする辞書
+        str: プロンプト
     """
-    try:
-        # AzureOpenAIクライアントの初期化
-        client = AzureOpenAI(
-            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
-            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
-            api_version="2024-02-01"
-        )
-        
-        # スクレイピングしたデータを整形
-        formatted_content = ""
-        for item in scraped_data:
-            url = item["url"]
-            data = item["data"]
-            
-            if "error" in data:
-                formatted_content += f"\n## URL: {url}\n{data['error']}\n\n"
-            else:
-                formatted_content += f"\n## URL: {url}\n{data['content']}\n\n"
-        
-        # プロンプトを設計して正確な長さの説明文を生成
-        prompt = f"""あなたはAI言語モデルの特徴を的確に表現する専門家です。
-スクレイピングしたWebサイトの内容から、各モデルの最も際立った特徴や主な利用シーンを分析し、
-各モデルを正確に35文字の簡潔な説明文を日本語で作成してください。
-
-要件:
-1. 説明文は必ず35文字になるようにしてください
-2. 各モデルの最も重要な特徴や強みを端的に表現してください
-3. 具体的な使用例や得意分野がわかるようにしてください
-4. 専門的すぎる表現は避け、一般ユーザーにもわかりやすい表現を使ってください
-5. 出力形式は以下のJSONフォーマットで返してください:
-{{
-  "モデル名1": "説明文1",
-  "モデル名2": "説明文2",
-  ...
-}}
-
-指定モデル:
-GPT-4.1  
-GPT-4.1 mini  
-GPT-4.1 nano  
-GPT-4o  
-GPT-4o mini  
-o1 mini
-Claude 3.7 Sonnet
-Claude 3.5 Sonnet（v2）
-Claude 3.5 Sonnet（v1）
-Claude 3.5 Haiku
-Claude 3 Haiku
-Amazon Nova Pro
-Amazon Nova Lite
-Amazon Nova Micro
-Llama 3.3 70B
-Llama 3.2 90B Instruct
-Llama 3.1 405B Instruct
-
-以下はスクレイピングした内容です：
-{formatted_content}"""
-
-        # まず徹底的に分析させる
-        analysis_prompt = f"""各モデルの特徴を徹底的に分析してください。
+    model_list = "\n".join(models)
+    return f"""各モデルの特徴を徹底的に分析してください。
 以下の項目について各モデルの情報を整理してください:
 1. 主な用途や得意分野
 2. 特徴的な機能
@@ -260,41 +223,22 @@ Llama 3.1 405B Instruct
 情報が不足している場合は「情報不足」と明記してください。
 
 分析対象モデル:
-GPT-4.1  
-GPT-4.1 mini  
-GPT-4.1 nano  
-GPT-4o  
-GPT-4o mini  
-o1 mini
-Claude 3.7 Sonnet
-Claude 3.5 Sonnet（v2）
-Claude 3.5 Sonnet（v1）
-Claude 3.5 Haiku
-Claude 3 Haiku
-Amazon Nova Pro
-Amazon Nova Lite
-Amazon Nova Micro
-Llama 3.3 70B
-Llama 3.2 90B Instruct
-Llama 3.1 405B Instruct
+{model_list}
 
 以下はスクレイピングした内容です:
-{formatted_content}"""
+{content}"""
 
-        # 分析ステップ
-        analysis_response = client.chat.completions.create(
-            model="gpt-4.1",
-            messages=[
-                {"role": "system", "content": "あなたはAI言語モデルの特徴を詳細に分析する専門家です。"},
-                {"role": "user", "content": analysis_prompt}
-            ],
-            max_tokens=32768
-        )
-        
-        analysis_result = analysis_response.choices[0].message.content.strip()
+def build_summary_prompt(analysis_result):
+    """
+    分析結果から35文字の説明文を作らせるプロンプトを作成する
+    
+    Args:
+        analysis_result: 分析ステップの出力
         
-        # 分析結果を元に説明文を生成
-        final_prompt = f"""あなたはAI言語モデルの特徴を簡潔に伝えるエキスパートです。
+    Returns:
+        str: プロンプト
+    """
+    return f"""あなたはAI言語モデルの特徴を簡潔に伝えるエキスパートです。
 以下の分析結果を基に、各モデルを35文字の簡潔な説明文にまとめてください。
 
 要件:
@@ -313,26 +257,291 @@ Llama 3.1 405B Instruct
 モデル分析結果:
 {analysis_result}"""
 
-        # 最終生成
+def analysis_request(models, content):
+    """
+    分析ステップのリクエストパラメータ（デプロイ名以外）を作成する
+    
+    Args:
+        models: 分析対象のモデル名のリスト
+        content: スクレイピングした内容
+        
+    Returns:
+        dict: chat.completions.create に渡すパラメータ
+    """
+    return {
+        "messages": [
+            {"role": "system", "content": "あなたはAI言語モデルの特徴を詳細に分析する専門家です。"},
+            {"role": "user", "content": build_analysis_prompt(models, content)}
+        ],
+        "max_tokens": 32768
+    }
+
+def summary_request(analysis_result):
+    """
+    説明文生成ステップのリクエストパラメータ（デプロイ名以外）を作成する
+    
+    Args:
+        analysis_result: 分析ステップの出力
+        
+    Returns:
+        dict: chat.completions.create に渡すパラメータ
+    """
+    return {
+        "messages": [
+            {"role": "system", "content": "モデルの特徴を正確かつ簡潔に表現するエキスパートです。JSONフォーマットで回答します。"},
+            {"role": "user", "content": build_summary_prompt(analysis_result)}
+        ],
+        "max_tokens": 32768,
+        "response_format": {"type": "json_object"}
+    }
+
+def request_analysis(client, models, content):
+    """
+    分析ステップを実行する
+    
+    Args:
+        client: AzureOpenAIクライアント
+        models: 分析対象のモデル名のリスト
+        content: スクレイピングした内容
+        
+    Returns:
+        str: 分析結果
+    """
+    with stage("analysis"):
+        response = client.chat.completions.create(model="gpt-4.1", **analysis_request(models, content))
+    return response.choices[0].message.content.strip()
+
+def request_summary(client, analysis_result):
+    """
+    分析結果から説明文を生成する
+    
+    Args:
+        client: AzureOpenAIクライアント
+        analysis_result: 分析ステップの出力
+        
+    Returns:
+        dict: モデル名をキー、説明文を値とする辞書
+    """
+    with stage("summary"):
+        response = client.chat.completions.create(model="gpt-4.1", **summary_request(analysis_result))
+    return json.loads(response.choices[0].message.content.strip())
+
+def describe_model(client, model_name, passages):
+    """
+    1つのモデルについて分析と説明文の生成を行う
+    
+    Args:
+        client: AzureOpenAIクライアント
+        model_name: モデル名
+        passages: そのモデルに言及している抜粋
+        
+    Returns:
+        tuple: (説明文, 分析結果)
+    """
+    analysis_result = request_analysis(client, [model_name], passages)
+    descriptions = request_summary(client, analysis_result)
+    # モデル名の表記が変わって返ってきた場合は最初の値を使う
+    return descriptions.get(model_name) or next(iter(descriptions.values()), ""), analysis_result
+
+def request_repair(client, model_name, analysis_result, previous):
+    """
+    文字数が合わなかった1モデルの説明文だけを作り直す
+    
+    Args:
+        client: AzureOpenAIクライアント
+        model_name: モデル名
+        analysis_result: 生成時に使った分析結果（再分析はしない）
+        previous: 前回の説明文（なければ空文字列）
+        
+    Returns:
+        str: 作り直した説明文
+    """
+    if previous:
+        feedback = f"前回の説明文「{previous}」は{len(previous)}文字でした。"
+    else:
+        feedback = "前回は説明文が出力されませんでした。"
+    prompt = f"""以下の分析結果を基に、「{model_name}」の説明文を作り直してください。
+{feedback}
+説明文は句読点を含めてちょうど{DESCRIPTION_LENGTH}文字にしてください。
+出力形式は以下のJSONフォーマットで返してください:
+{{
+  "{model_name}": "説明文"
+}}
+
+モデル分析結果:
+{analysis_result}"""
+    
+    with stage("repair"):
         response = client.chat.completions.create(
             model="gpt-4.1",
             messages=[
                 {"role": "system", "content": "モデルの特徴を正確かつ簡潔に表現するエキスパートです。JSONフォーマットで回答します。"},
-                {"role": "user", "content": final_prompt}
+                {"role": "user", "content": prompt}
             ],
-            max_tokens=32768,
+            max_tokens=1024,
             response_format={"type": "json_object"}
         )
+    descriptions = json.loads(response.choices[0].message.content.strip())
+    return descriptions.get(model_name) or next(iter(descriptions.values()), "")
+
+def align_descriptions(model_descriptions):
+    """
+    LLMが返したモデル名の表記ゆれ（"o1-mini" など）を TARGET_MODELS の名前に揃え、TARGET_MODELS の順に並べる
+    
+    どのモデルにも対応付けられない名前や、同じモデルの説明文が重複した場合も値は捨てず、元の名前のまま末尾に残す
+    
+    Args:
+        model_descriptions: モデル名をキー、説明文を値とする辞書
         
-        # 生成された説明文を取得して辞書に変換
-        import json
-        model_descriptions = json.loads(response.choices[0].message.content.strip())
+    Returns:
+        dict: 名前を揃えた説明文の辞書
+    """
+    index = MentionIndex(TARGET_MODELS)
+    aligned = {}
+    others = {}
+    # 表記が完全に一致するものを先に割り当て、表記ゆれのあるものが上書きしないようにする
+    for name, description in model_descriptions.items():
+        if name in TARGET_MODELS:
+            aligned[name] = description
+    for name, description in model_descriptions.items():
+        if name in TARGET_MODELS:
+            continue
+        canonical = index.canonical_name(name)
+        if canonical is None or canonical in aligned:
+            others[name] = description
+        else:
+            aligned[canonical] = description
+    result = {name: aligned[name] for name in TARGET_MODELS if name in aligned}
+    result.update(others)
+    return result
+
+def repair_descriptions(client, model_descriptions, analyses, max_attempts=REPAIR_MAX_ATTEMPTS, workers=FAN_OUT_WORKERS):
+    """
+    文字数が合わない（または出力されなかった）モデルの説明文だけを並行して作り直す
+    
+    Args:
+        client: AzureOpenAIクライアント
+        model_descriptions: 生成済みの説明文の辞書（この辞書を更新する）
+        analyses: モデル名をキー、生成時に使った分析結果を値とする辞書
+        max_attempts: 1モデルあたりの最大再試行回数
+        workers: 同時に作り直すモデル数
+        
+    Returns:
+        dict: 更新した説明文の辞書（モデル名は TARGET_MODELS に揃え、その順に並べる）
+    """
+    # 一括生成ではLLMがモデル名を別の表記で返すことがあるため、先に TARGET_MODELS の名前に揃える
+    model_descriptions = align_descriptions(model_descriptions)
+    
+    def is_valid(name):
+        return len(model_descriptions.get(name, "")) == DESCRIPTION_LENGTH
+    
+    failing = [name for name in TARGET_MODELS if name in analyses and not is_valid(name)]
+    if failing and max_attempts > 0:
+        _repair_failing(client, model_descriptions, analyses, failing, is_valid, max_attempts, workers)
+    
+    # 作り直しで追加したモデルも含めて、元のモデルの並び順に揃える
+    return align_descriptions(model_descriptions)
+
+def _repair_failing(client, model_descriptions, analyses, failing, is_valid, max_attempts, workers):
+    # 文字数が合わないモデルの説明文を最大 max_attempts 回まで作り直す（model_descriptions を更新する）
+    print(f"\n{len(failing)}件の説明文を作り直します...")
+    for attempt in range(1, max_attempts + 1):
+        targets = [name for name in failing if not is_valid(name)]
+        if not targets:
+            break
+        with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+            future_to_model = {
+                executor.submit(request_repair, client, name, analyses[name], model_descriptions.get(name, "")): name
+                for name in targets
+            }
+            for future in concurrent.futures.as_completed(future_to_model):
+                name = future_to_model[future]
+                try:
+                    candidate = future.result()
+                except Exception as e:
+                    print(f"{name}の説明文の修正エラー: {e}")
+                    continue
+                # 目標の文字数により近い方を残す
+                current = model_descriptions.get(name, "")
+                if not current or abs(len(candidate) - DESCRIPTION_LENGTH) < abs(len(current) - DESCRIPTION_LENGTH):
+                    model_descriptions[name] = candidate
+    
+    fixed = sum(1 for name in failing if is_valid(name))
+    print(f"説明文の修正: {len(failing)}件中{fixed}件を{DESCRIPTION_LENGTH}文字に修正しました（最大{max_attempts}回まで再試行）")
+
+def collect_passages(corpus, mention_index=None):
+    """
+    索引の位置から各モデルの抜粋を切り出す（コーパスストアは呼び出し元のスレッドでのみ読む）
+    
+    Args:
+        corpus: スクレイピングしたページを保存したCorpusStore
+        mention_index: モデルごとの言及箇所の索引（省略時はここで作成）
+        
+    Returns:
+        dict: モデル名をキー、抜粋を値とする辞書
+    """
+    if mention_index is None:
+        mention_index = MentionIndex.build(corpus, TARGET_MODELS)
+    return {
+        model_name: mention_index.passages(model_name, corpus, MAX_PASSAGE_CHARS) or "（このモデルに言及した箇所は見つかりませんでした）"
+        for model_name in TARGET_MODELS
+    }
+
+def generate_model_descriptions(corpus, mention_index=None, fan_out=False, workers=FAN_OUT_WORKERS, repair_attempts=REPAIR_MAX_ATTEMPTS):
+    """
+    スクレイピングしたコンテンツを基にAzure OpenAIを使って
+    モデル説明文を生成します
+    
+    Args:
+        corpus: スクレイピングしたページを保存したCorpusStore
+        mention_index: モデルごとの言及箇所の索引（fan_out 時に使用、省略時はここで作成）
+        fan_out: Trueならモデルごとに言及箇所だけを使って並行に生成する
+        workers: fan_out 時（および説明文の修正時）に同時に処理するモデル数
+        repair_attempts: 文字数が合わない説明文を作り直す最大回数（0なら作り直さない）
+        
+    Returns:
+        dict: モデル名をキー、説明文を値とする辞書
+    """
+    try:
+        client = create_client()
+        
+        if fan_out:
+            passages = collect_passages(corpus, mention_index)
+            
+            # モデルごとに小さなプロンプトで分析と要約を並行実行し、同じ形式の辞書にまとめる
+            model_descriptions = {}
+            analyses = {}
+            with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+                future_to_model = {
+                    executor.submit(describe_model, client, model_name, passages[model_name]): model_name
+                    for model_name in TARGET_MODELS
+                }
+                for future in concurrent.futures.as_completed(future_to_model):
+                    model_name = future_to_model[future]
+                    try:
+                        model_descriptions[model_name], analyses[model_name] = future.result()
+                    except Exception as e:
+                        print(f"{model_name}の説明文生成エラー: {e}")
+            # 元のモデルの並び順に揃える
+            model_descriptions = align_descriptions(model_descriptions)
+        else:
+            # スクレイピングしたデータを整形（ストアから1ページずつ読み出して一度に連結）
+            formatted_content = "".join(f"\n## URL: {page['url']}\n{page['content']}\n\n" for page in corpus.iter_pages())
+            
+            # まず徹底的に分析させ、分析結果を元に説明文を生成
+            analysis_result = request_analysis(client, TARGET_MODELS, formatted_content)
+            model_descriptions = request_summary(client, analysis_result)
+            analyses = {model_name: analysis_result for model_name in TARGET_MODELS}
+        
+        # 文字数が合わないモデルだけを、生成時の分析結果を再利用して作り直す
+        # （fan_out で分析自体に失敗したモデルは対象外）
+        model_descriptions = repair_descriptions(client, model_descriptions, analyses, repair_attempts, workers)
         
         # 文字数の検証
         for model, description in model_descriptions.items():
             char_count = len(description)
-            if char_count != 35:
-                print(f"警告: {model}の説明文は{char_count}文字です（目標: 35文字）")
+            if char_count != DESCRIPTION_LENGTH:
+                print(f"警告: {model}の説明文は{char_count}文字です（目標: {DESCRIPTION_LENGTH}文字）")
         
         return model_descriptions
     
@@ -340,7 +549,175 @@ Llama 3.1 405B Instruct
         print(f"説明文生成エラー: {str(e)}")
         return {}
 
+def create_batch_client():
+    """
+    Batch API用のAzureOpenAIクライアントを作成する
+    
+    Returns:
+        AzureOpenAI: クライアント
+    """
+    from openai import AzureOpenAI
+    return AzureOpenAI(
+        azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+        api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+        api_version=BATCH_API_VERSION
+    )
+
+def run_batch_job(client, name, batch_requests, deployment, poll_interval):
+    """
+    リクエストをJSONLに書き出してバッチジョブとして投入し、完了まで待って結果を返す
+    
+    Args:
+        client: Batch API用のAzureOpenAIクライアント
+        name: ジョブの名前（保存するファイル名に使う）
+        batch_requests: custom_id をキー、リクエストパラメータ（デプロイ名以外）を値とする辞書
+        deployment: バッチ用のデプロイ名
+        poll_interval: 状態を確認する間隔（秒）
+        
+    Returns:
+        dict: custom_id をキー、応答本文を値とする辞書（失敗したリクエストは含まない）
+    """
+    os.makedirs(BATCH_DIR, exist_ok=True)
+    prefix = os.path.join(BATCH_DIR, f"{datetime.datetime.now().strftime('%Y%m%d-%H%M%S')}-{name}")
+    
+    # バッチ入力のJSONLを作成
+    input_path = f"{prefix}-input.jsonl"
+    with open(input_path, "w", encoding="utf-8") as f:
+        for custom_id, params in batch_requests.items():
+            line = {"custom_id": custom_id, "method": "POST", "url": "/chat/completions", "body": {"model": deployment, **params}}
+            f.write(json.dumps(line, ensure_ascii=False) + "\n")
+    
+    with open(input_path, "rb") as f:
+        input_file = client.files.create(file=f, purpose="batch")
+    
+    # アップロードしたファイルの検証が終わるのを待つ
+    while getattr(input_file, "status", "processed") not in ("processed", "error"):
+        time.sleep(min(poll_interval, 5))
+        input_file = client.files.retrieve(input_file.id)
+    if input_file.status == "error":
+        raise RuntimeError(f"バッチ入力ファイルの検証に失敗しました: {input_file.id}")
+    
+    batch = client.batches.create(input_file_id=input_file.id, endpoint="/chat/completions", completion_window="24h")
+    print(f"バッチジョブ {batch.id} を投入しました（{name}: {len(batch_requests)}件）")
+    
+    with stage(f"batch_{name}"):
+        while batch.status not in ("completed", "failed", "expired", "cancelled"):
+            time.sleep(poll_interval)
+            batch = client.batches.retrieve(batch.id)
+            counts = batch.request_counts
+            if counts:
+                print(f"  {batch.status}: {counts.completed}/{counts.total}件完了（失敗 {counts.failed}件）")
+    
+    if batch.status != "completed" or not batch.output_file_id:
+        raise RuntimeError(f"バッチジョブ {batch.id} が完了しませんでした（状態: {batch.status}）")
+    
+    # 結果のJSONLを保存してから読み込む
+    output = client.files.content(batch.output_file_id).text
+    with open(f"{prefix}-output.jsonl", "w", encoding="utf-8") as f:
+        f.write(output)
+    
+    results = {}
+    for line in output.splitlines():
+        if not line.strip():
+            continue
+        item = json.loads(line)
+        response = item.get("response") or {}
+        if response.get("status_code") == 200:
+            results[item["custom_id"]] = response["body"]["choices"][0]["message"]["content"].strip()
+        else:
+            print(f"バッチ内のリクエスト {item.get('custom_id')} が失敗しました: {item.get('error') or response}")
+    return results
+
+def generate_model_descriptions_batch(corpus, mention_index=None, deployment=BATCH_DEPLOYMENT, poll_interval=BATCH_POLL_INTERVAL,
+                                      workers=FAN_OUT_WORKERS, repair_attempts=REPAIR_MAX_ATTEMPTS):
+    """
+    Batch API を使ってモデルごとの分析と説明文の生成を行う
+    
+    分析のバッチが終わってから、その結果を使った説明文生成のバッチを投入する。
+    文字数が合わない説明文の作り直しは件数が少ないため通常の呼び出しで行う。
+    
+    Args:
+        corpus: スクレイピングしたページを保存したCorpusStore
+        mention_index: モデルごとの言及箇所の索引（省略時はここで作成）
+        deployment: バッチ用のデプロイ名
+        poll_interval: 状態を確認する間隔（秒）
+        workers: 説明文の修正時に同時に処理するモデル数
+        repair_attempts: 文字数が合わない説明文を作り直す最大回数（0なら作り直さない）
+        
+    Returns:
+        dict: モデル名をキー、説明文を値とする辞書
+    """
+    try:
+        client = create_batch_client()
+        passages = collect_passages(corpus, mention_index)
+        
+        # custom_id には記号を含まない番号を使い、モデル名と対応付ける
+        ids = {f"model-{i}": model_name for i, model_name in enumerate(TARGET_MODELS)}
+        
+        analysis_results = run_batch_job(client, "analysis", {
+            custom_id: analysis_request([model_name], passages[model_name]) for custom_id, model_name in ids.items()
+        }, deployment, poll_interval)
+        analyses = {ids[custom_id]: result for custom_id, result in analysis_results.items()}
+        
+        summary_results = run_batch_job(client, "summary", {
+            custom_id: summary_request(analyses[model_name]) for custom_id, model_name in ids.items() if model_name in analyses
+        }, deployment, poll_interval)
+        
+        model_descriptions = {}
+        for custom_id, result in summary_results.items():
+            model_name = ids[custom_id]
+            try:
+                descriptions = json.loads(result)
+            except json.JSONDecodeError:
+                print(f"{model_name}の説明文をJSONとして読み込めませんでした")
+                continue
+            model_descriptions[model_name] = descriptions.get(model_name) or next(iter(descriptions.values()), "")
+        model_descriptions = align_descriptions(model_descriptions)
+        
+        # 文字数が合わないモデルだけを、バッチの分析結果を再利用して作り直す
+        model_descriptions = repair_descriptions(create_client(), model_descriptions, analyses, repair_attempts, workers)
+        
+        for model, description in model_descriptions.items():
+            if len(description) != DESCRIPTION_LENGTH:
+                print(f"警告: {model}の説明文は{len(description)}文字です（目標: {DESCRIPTION_LENGTH}文字）")
+        
+        return model_descriptions
+    
+    except Exception as e:
+        print(f"説明文生成エラー: {str(e)}")
+        return {}
+
+def load_urls(path):
+    """
+    スクレイピングするURLの一覧をファイルから読み込む
+    
+    Args:
+        path: 1行に1つURLを書いたテキストファイルのパス（#で始まる行は無視）
+        
+    Returns:
+        list: URLのリスト
+    """
+    with open(path, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.startswith("#")]
+
 def main():
+    parser = argparse.ArgumentParser(description='スクレイピングした内容からモデル説明文を生成する')
+    parser.add_argument('--urls-file', type=str, help='スクレイピングするURLの一覧ファイル（省略時は既定のURLを使用）')
+    parser.add_argument('--fan-out', action='store_true', help='モデルごとに言及箇所だけを使って並行に説明文を生成する')
+    parser.add_argument('--workers', type=int, default=FAN_OUT_WORKERS, help='--fan-out 時（および説明文の修正時）に同時に処理するモデル数')
+    parser.add_argument('--batch', action='store_true', help='Batch API を使ってオフラインで説明文を生成する')
+    parser.add_argument('--batch-deployment', type=str, default=BATCH_DEPLOYMENT, help='--batch 時に使うバッチ用のデプロイ名')
+    parser.add_argument('--poll-interval', type=float, default=BATCH_POLL_INTERVAL, help='--batch 時にジョブの状態を確認する間隔（秒）')
+    parser.add_argument('--repair-attempts', type=int, default=REPAIR_MAX_ATTEMPTS, help='文字数が合わない説明文を作り直す最大回数（0で無効）')
+    parser.add_argument('--profile', nargs='?', const='', metavar='PATH',
+                        help='実行全体をプロファイルし、終了時に .prof を書き出してCPU時間とネットワーク待ちの上位の関数を表示する（PATH 省略時は profiles/ に保存）')
+    parser.add_argument('--profile-top', type=int, default=PROFILE_TOP, help='--profile で表示する関数の数')
+    args = parser.parse_args()
+    
+    if args.profile is not None:
+        # スレッドプールを作る前に開始し、スクレイピングなどのスレッドも計測する（結果は終了時に表示）
+        profiler.start(args.profile or default_profile_path(__file__), args.profile_top)
+    
     # # 画像からLLMモデルを抽出
     # extracted_models = extract_llm_from_image()
     
@@ -356,13 +733,29 @@ def main():
         "https://docs.anthropic.com/ja/docs/about-claude/models/all-models",
         "https://llama.meta.com/"
     ]
+    if args.urls_file:
+        urls = load_urls(args.urls_file)
     
     print(f"指定された {len(urls)} 件のWebサイトをスクレイピングします...")
-    scraped_data = parallel_scrape_webpages(urls)
-    
-    print("\nモデル説明文を生成中...")
-    # 30文字の説明文を生成
-    model_descriptions = generate_model_descriptions(scraped_data)
+    # スクレイピングした本文は一時ファイルのコーパスストアに保存する
+    with CorpusStore() as corpus:
+        with stage("scrape"):
+            parallel_scrape_webpages(urls, corpus)
+        
+        # どのページでどのモデルが言及されているかの索引を一度だけ作る
+        mention_index = MentionIndex.build(corpus, TARGET_MODELS)
+        unmentioned = [name for name, count in mention_index.counts().items() if count == 0]
+        if unmentioned:
+            print(f"言及が見つからなかったモデル: {', '.join(unmentioned)}")
+        
+        print("\nモデル説明文を生成中...")
+        # 30文字の説明文を生成
+        if args.batch:
+            model_descriptions = generate_model_descriptions_batch(corpus, mention_index, args.batch_deployment, args.poll_interval,
+                                                                   workers=args.workers, repair_attempts=args.repair_attempts)
+        else:
+            model_descriptions = generate_model_descriptions(corpus, mention_index, fan_out=args.fan_out, workers=args.workers,
+                                                             repair_attempts=args.repair_attempts)
     
     print("\n===== 生成されたモデル説明文 =====")
     for model, description in model_descriptions.items():
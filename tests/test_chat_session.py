@@ -0,0 +1,61 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.chat_session import ChatSession
+
+IMAGE_MESSAGE = [
+    {"type": "text", "text": "この画像について説明してください"},
+    {"type": "image_url", "image_url": {"url": "data:image/png;base64,AAAA", "detail": "low"}},
+]
+
+
+class FakeClient:
+    """ストリーミングでは固定の応答を、要約の依頼では固定の要約を返すクライアント"""
+
+    def __init__(self):
+        self.requests = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.requests.append(kwargs)
+        if kwargs.get("stream"):
+            delta = SimpleNamespace(content="応答" * 50)
+            return iter([SimpleNamespace(usage=None, choices=[SimpleNamespace(delta=delta)])])
+        message = SimpleNamespace(content="要約")
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class ChatSessionTest(unittest.TestCase):
+    def test_stream_options_follow_api_version(self):
+        client = FakeClient()
+        ChatSession(client, "gpt-4.1").send("こんにちは")
+        ChatSession(client, "gpt-4.1", api_version="2024-02-01").send("こんにちは")
+
+        self.assertEqual(client.requests[0]["stream_options"], {"include_usage": True})
+        self.assertNotIn("stream_options", client.requests[1])
+
+    def test_latest_image_turn_survives_compaction(self):
+        client = FakeClient()
+        session = ChatSession(client, "gpt-4.1", max_history_tokens=300, keep_recent_turns=1)
+
+        session.send(IMAGE_MESSAGE)
+        for i in range(4):
+            session.send(f"質問{i}")
+
+        self.assertGreater(session.compactions, 0)
+        # 要約の直後に画像付きの発言がそのまま残る
+        messages = session.messages()
+        self.assertIn("これまでの会話の要約", messages[0]["content"])
+        self.assertEqual(messages[2]["content"], IMAGE_MESSAGE)
+        self.assertEqual(messages[-2]["content"], "質問3")
+        # 要約には画像のターンを含めない
+        summary_requests = [r for r in client.requests if not r.get("stream")]
+        self.assertTrue(all("この画像について" not in r["messages"][0]["content"] for r in summary_requests))
+
+
+if __name__ == "__main__":
+    unittest.main()
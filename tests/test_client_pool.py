@@ -0,0 +1,77 @@
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+import openai
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.client_pool import ClientPool, Deployment
+
+
+def _rate_limit_error(retry_after_ms):
+    # SDKのエラーが参照する属性だけを持つ応答
+    response = SimpleNamespace(status_code=429, headers={"retry-after-ms": str(retry_after_ms)}, request=None)
+    return openai.RateLimitError("rate limited", response=response, body=None)
+
+
+class FakeClient:
+    """with_raw_response.create の呼び出しを記録し、決めた順に応答またはエラーを返すクライアント"""
+
+    def __init__(self, name, outcomes=None):
+        self.name = name
+        self.outcomes = list(outcomes or [])
+        self.requested = []
+        raw = SimpleNamespace(create=self.create)
+        self.chat = SimpleNamespace(completions=SimpleNamespace(with_raw_response=raw))
+
+    def create(self, **kwargs):
+        self.requested.append(kwargs["model"])
+        outcome = self.outcomes.pop(0) if self.outcomes else "ok"
+        if isinstance(outcome, Exception):
+            raise outcome
+        return SimpleNamespace(headers={"x-ratelimit-remaining-tokens": "1000"},
+                               parse=lambda: f"{self.name}:{kwargs['model']}")
+
+
+class ClientPoolTest(unittest.TestCase):
+    def test_rate_limited_deployment_fails_over(self):
+        first = FakeClient("first", [_rate_limit_error(60000)])
+        second = FakeClient("second")
+        pool = ClientPool([Deployment("first", first, weight=10), Deployment("second", second)])
+
+        self.assertEqual(pool.chat.completions.create(model="gpt-4o", messages=[]), "second:gpt-4o")
+        # 429 を返した接続先は休ませ、次のリクエストも別の接続先に送る
+        self.assertEqual(pool.chat.completions.create(model="gpt-4o", messages=[]), "second:gpt-4o")
+        self.assertEqual(first.requested, ["gpt-4o"])
+
+        stats = pool.stats()
+        self.assertEqual(stats["first"]["rate_limited"], 1)
+        self.assertGreater(stats["first"]["cooling_down"], 0)
+        self.assertEqual(stats["second"]["successes"], 2)
+
+    def test_model_is_mapped_to_deployment_name(self):
+        japan = FakeClient("japaneast")
+        us = FakeClient("eastus2")
+        pool = ClientPool([Deployment("japaneast", japan, {"o1-mini": "o1-mini-je"}),
+                           Deployment("eastus2", us, {"gpt-4.1": "gpt-41-us"})])
+
+        self.assertEqual(pool.chat.completions.create(model="o1-mini", messages=[]), "japaneast:o1-mini-je")
+        self.assertEqual(pool.chat.completions.create(model="gpt-4.1", messages=[]), "eastus2:gpt-41-us")
+        with self.assertRaises(ValueError):
+            pool.chat.completions.create(model="gpt-4o", messages=[])
+
+    def test_all_deployments_cooling_down(self):
+        # どの接続先も待ちきれないほど長く休止している場合は、最後のエラーをそのまま返す
+        first = FakeClient("first", [_rate_limit_error(120000)])
+        second = FakeClient("second", [_rate_limit_error(120000)])
+        pool = ClientPool([Deployment("first", first), Deployment("second", second)])
+
+        with self.assertRaises(openai.RateLimitError):
+            pool.chat.completions.create(model="gpt-4o", messages=[])
+        self.assertEqual(len(first.requested) + len(second.requested), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
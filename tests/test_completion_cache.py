@@ -0,0 +1,97 @@
+import os
+import sys
+import tempfile
+import threading
+import unittest
+from types import SimpleNamespace
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.completion_cache import CompletionCache, CompletionCacheMiss, make_cache_key, wrap_client
+
+REQUEST = {"model": "gpt-4o", "messages": [{"role": "user", "content": "こんにちは"}]}
+
+
+def _completion(content):
+    from openai.types.chat import ChatCompletion
+    return ChatCompletion.model_validate({
+        "id": "chatcmpl-test",
+        "object": "chat.completion",
+        "created": 0,
+        "model": "gpt-4o",
+        "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+    })
+
+
+class FakeClient:
+    def __init__(self):
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        self.calls += 1
+        return _completion("応答")
+
+
+class CompletionCacheTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.cache_dir = tmp.name
+
+    def test_replay_does_not_create_client(self):
+        CompletionCache(self.cache_dir).store(make_cache_key(REQUEST), REQUEST, _completion("保存済み"))
+
+        def factory():
+            raise AssertionError("replayモードでクライアントを作りました")
+
+        client = wrap_client(factory, mode="replay", cache_dir=self.cache_dir)
+        response = client.chat.completions.create(**REQUEST)
+
+        self.assertEqual(response.choices[0].message.content, "保存済み")
+        with self.assertRaises(CompletionCacheMiss):
+            client.chat.completions.create(**{**REQUEST, "temperature": 0})
+
+    def test_record_creates_client_only_on_miss(self):
+        fake = FakeClient()
+        created = []
+
+        def factory():
+            created.append(fake)
+            return fake
+
+        client = wrap_client(factory, mode="record", cache_dir=self.cache_dir)
+        self.assertEqual(created, [])
+
+        client.chat.completions.create(**REQUEST)
+        client.chat.completions.create(**REQUEST)
+        self.assertEqual(len(created), 1)
+        self.assertEqual(fake.calls, 1)
+
+    def test_concurrent_store_of_same_key(self):
+        # 同じプロセスの複数スレッドが同じキーを書き込んでも一時ファイルが衝突しない
+        cache = CompletionCache(self.cache_dir)
+        key = make_cache_key(REQUEST)
+        response = _completion("応答")
+        errors = []
+
+        def store():
+            try:
+                for _ in range(20):
+                    cache.store(key, REQUEST, response)
+            except Exception as e:
+                errors.append(e)
+
+        threads = [threading.Thread(target=store) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(cache.load(key).choices[0].message.content, "応答")
+        self.assertEqual(os.listdir(os.path.join(self.cache_dir, key[:2])), [f"{key}.json"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,42 @@
+import os
+import sys
+import unittest
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.content_extractor import extract_main_content
+
+MODEL_TABLE_PAGE = """
+<html><head><title>Models</title></head><body>
+<nav><a href="/">Home</a> <a href="/docs">Docs</a></nav>
+<main>
+  <h2>Model list</h2>
+  <p>The following table lists every model available in this region with its limits.</p>
+  <table>
+    <tr><th>Model</th><th>Context</th></tr>
+    <tr><td>GPT-<b>4o</b></td><td>128K</td></tr>
+    <tr><td><p>GPT-4.1</p><p>(preview)</p></td><td>1M</td></tr>
+  </table>
+</main>
+</body></html>
+"""
+
+
+class ExtractMainContentTest(unittest.TestCase):
+    def test_table_rows_are_kept(self):
+        # 短いセルだけの行も1行ずつ残す
+        text = extract_main_content(MODEL_TABLE_PAGE)["text"]
+
+        self.assertIn("Model | Context", text)
+        self.assertIn("GPT-4o | 128K", text)
+        self.assertIn("GPT-4.1 (preview) | 1M", text)
+        self.assertNotIn("Home", text)
+
+    def test_short_page_falls_back_to_page_text(self):
+        result = extract_main_content("<html><head><title>t</title></head><body><p>Short page.</p></body></html>")
+
+        self.assertEqual(result["text"], "Short page.")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,72 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.domain_stats import BAD_DOMAIN_RETRY, STATS_WINDOW, DomainStats
+
+
+class DomainStatsTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.stats = DomainStats(os.path.join(tmp.name, "domain_stats.db"))
+        self.addCleanup(self.stats.close)
+
+    def record_failures(self, domain, count=3):
+        for _ in range(count):
+            self.stats.record(f"https://{domain}/page", 10.0, False, status=403)
+
+    def age(self, domain, seconds):
+        # 記録の時刻を過去にずらす
+        with self.stats._conn:
+            self.stats._conn.execute("UPDATE fetches SET fetched_at = fetched_at - ? WHERE domain = ?", (seconds, domain))
+
+    def test_bad_domain_is_skipped(self):
+        self.record_failures("blocked.example")
+        urls = ["https://blocked.example/a", "https://ok.example/b"]
+
+        chosen, skipped = self.stats.choose(urls, 3)
+
+        self.assertEqual(chosen, ["https://ok.example/b"])
+        self.assertEqual(skipped, ["https://blocked.example/a"])
+
+    def test_old_failures_expire(self):
+        self.record_failures("blocked.example")
+        self.age("blocked.example", STATS_WINDOW + 60)
+
+        self.assertFalse(self.stats.is_bad("https://blocked.example/a"))
+        self.assertEqual(self.stats.get("blocked.example")["fetches"], 0)
+
+    def test_bad_domains_are_probed_one_at_a_time(self):
+        for domain in ("first.example", "second.example"):
+            self.record_failures(domain)
+            self.age(domain, BAD_DOMAIN_RETRY + 60)
+        urls = ["https://first.example/a", "https://second.example/b"]
+
+        chosen, skipped = self.stats.choose(urls, 3)
+        self.assertEqual(chosen, ["https://first.example/a"])
+        self.assertEqual(skipped, ["https://second.example/b"])
+
+        # 試した結果が記録されると、次の間隔まではまた省略する
+        self.stats.record("https://first.example/a", 10.0, False, status=403)
+        chosen, skipped = self.stats.choose(urls, 3)
+        self.assertEqual(chosen, ["https://second.example/b"])
+
+    def test_search_rank_is_combined_with_score(self):
+        for _ in range(5):
+            self.stats.record("https://good.example/page", 0.5, True, text_length=5000)
+        urls = [f"https://new{i}.example/" for i in range(9)] + ["https://good.example/page"]
+
+        chosen, _ = self.stats.choose(urls, 3)
+        # 実績が良くても検索結果の最下位なら上位の候補を押しのけない
+        self.assertEqual(chosen, urls[:3])
+
+        chosen, _ = self.stats.choose([urls[0], "https://good.example/page"], 1)
+        self.assertEqual(chosen, ["https://good.example/page"])
+
+
+if __name__ == "__main__":
+    unittest.main()
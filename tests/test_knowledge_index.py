@@ -0,0 +1,40 @@
+import os
+import sys
+import tempfile
+import unittest
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.knowledge_index import KnowledgeIndex, split_query_terms
+
+
+class SplitQueryTermsTest(unittest.TestCase):
+    def test_particles_split_only_at_script_boundaries(self):
+        self.assertEqual(split_query_terms("生成AIの活用における課題"), ["生成AI", "活用", "課題"])
+        self.assertEqual(split_query_terms("データとAIの関係"), ["データ", "AI", "関係"])
+        self.assertEqual(split_query_terms("GPT-4o と Claude の比較"), ["GPT-4o", "Claude", "比較"])
+
+    def test_hiragana_words_are_not_broken(self):
+        self.assertEqual(split_query_terms("はじめにお読みください"), ["はじめにお読みください"])
+        self.assertEqual(split_query_terms("マルチモーダルのことはじめ"), ["マルチモーダル", "ことはじめ"])
+
+
+class KnowledgeIndexSearchTest(unittest.TestCase):
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.index = KnowledgeIndex(os.path.join(tmp.name, "knowledge.db"))
+        self.addCleanup(self.index.close)
+
+    def test_mixed_japanese_query(self):
+        self.index.add("https://example.com/rag", "RAGのことはじめ",
+                       "検索拡張生成のことはじめとして、ベクトルデータベースの選び方を説明します。")
+        self.index.add("https://example.com/other", "料理", "今日の献立と買い物のメモ。")
+
+        results = self.index.search("ベクトルデータベースとRAGのことはじめ")
+
+        self.assertEqual([page["url"] for page in results], ["https://example.com/rag"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,86 @@
+import os
+import sys
+import unittest
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.corpus_store import CorpusStore
+from utils.mention_index import MentionIndex
+
+
+class PassagesTest(unittest.TestCase):
+    def setUp(self):
+        self.corpus = CorpusStore()
+        self.addCleanup(self.corpus.close)
+
+    def test_first_page_larger_than_budget_is_truncated(self):
+        # 1ページだけで上限を超える場合も、空ではなく上限までの抜粋を返す
+        lines = [f"GPT-4o の言及 {i}: " + "x" * 150 for i in range(200)]
+        self.corpus.add("https://example.com/a", "a", "\n".join(lines))
+        index = MentionIndex.build(self.corpus, ["GPT-4o"])
+
+        passages = index.passages("GPT-4o", self.corpus, 2000)
+
+        self.assertTrue(passages.startswith("\n## URL: https://example.com/a\n"))
+        self.assertLessEqual(len(passages), 2000)
+        self.assertIn(lines[0], passages)
+        # 途中で切れた段落は含めない
+        self.assertTrue(passages.endswith("\n"))
+        for line in passages.strip().split("\n")[1:]:
+            self.assertIn(line, lines)
+
+    def test_later_page_is_truncated_to_remaining_budget(self):
+        self.corpus.add("https://example.com/a", "a", "GPT-4o は短い説明です。")
+        self.corpus.add("https://example.com/b", "b", "\n".join(f"GPT-4o の詳細 {i}: " + "y" * 100 for i in range(100)))
+        index = MentionIndex.build(self.corpus, ["GPT-4o"])
+
+        passages = index.passages("GPT-4o", self.corpus, 1000)
+
+        self.assertIn("## URL: https://example.com/a", passages)
+        self.assertIn("## URL: https://example.com/b", passages)
+        self.assertLessEqual(len(passages), 1000)
+
+    def test_no_mentions_returns_empty(self):
+        self.corpus.add("https://example.com/a", "a", "関係のない本文")
+        index = MentionIndex.build(self.corpus, ["GPT-4o"])
+
+        self.assertEqual(index.passages("GPT-4o", self.corpus, 1000), "")
+
+
+class AliasTest(unittest.TestCase):
+    NAMES = ["GPT-4.1", "GPT-4.1 mini", "Claude 3.5 Sonnet（v2）", "Claude 3.5 Sonnet（v1）", "Llama 3.1 405B Instruct"]
+
+    def mentioned(self, text):
+        index = MentionIndex(self.NAMES)
+        index.add_page("https://example.com/a", text)
+        return {name for name, count in index.counts().items() if count}
+
+    def test_versionless_family_matches_every_version(self):
+        self.assertEqual(self.mentioned("Claude 3.5 Sonnet は長い文脈に強い"),
+                         {"Claude 3.5 Sonnet（v2）", "Claude 3.5 Sonnet（v1）"})
+        self.assertEqual(self.mentioned("Claude 3.5 Sonnet (v1) は旧版"), {"Claude 3.5 Sonnet（v1）"})
+
+    def test_model_ids(self):
+        self.assertEqual(self.mentioned("model: claude-3-5-sonnet-20241022"),
+                         {"Claude 3.5 Sonnet（v2）", "Claude 3.5 Sonnet（v1）"})
+        self.assertEqual(self.mentioned("modelId: meta.llama3-1-405b-instruct-v1:0"), {"Llama 3.1 405B Instruct"})
+        self.assertEqual(self.mentioned("gpt-4.1-mini-2025-04-14"), {"GPT-4.1 mini"})
+
+    def test_size_and_variant_suffixes_can_be_omitted(self):
+        self.assertEqual(self.mentioned("Llama 3.1 405B の評価"), {"Llama 3.1 405B Instruct"})
+        self.assertEqual(self.mentioned("Llama 3.1 は多言語に対応"), {"Llama 3.1 405B Instruct"})
+        # 別のサイズのモデルには一致しない
+        self.assertEqual(self.mentioned("Llama 3.1 8B の評価"), set())
+
+    def test_canonical_name_of_ids(self):
+        index = MentionIndex(self.NAMES)
+
+        self.assertEqual(index.canonical_name("meta.llama3-1-405b-instruct-v1:0"), "Llama 3.1 405B Instruct")
+        self.assertEqual(index.canonical_name("Claude 3.5 Sonnet v1"), "Claude 3.5 Sonnet（v1）")
+        # 版のない表記は先に指定したモデルに対応付ける
+        self.assertEqual(index.canonical_name("claude-3-5-sonnet-20241022"), "Claude 3.5 Sonnet（v2）")
+        self.assertIsNone(index.canonical_name("Llama 3.1 8B"))
+
+
+if __name__ == "__main__":
+    unittest.main()
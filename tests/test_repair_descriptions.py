@@ -0,0 +1,70 @@
+import json
+import os
+import sys
+import unittest
+from types import SimpleNamespace
+
+# リポジトリ直下のスクリプトと utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+import modeldescription
+from modeldescription import DESCRIPTION_LENGTH, align_descriptions, repair_descriptions
+
+VALID = "あ" * DESCRIPTION_LENGTH
+
+
+class FakeClient:
+    """作り直しの依頼に、指定したモデル名で目標の文字数の説明文を返すクライアント"""
+
+    def __init__(self):
+        self.requested = []
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    def create(self, **kwargs):
+        prompt = kwargs["messages"][-1]["content"]
+        name = prompt.split("「", 1)[1].split("」", 1)[0]
+        self.requested.append(name)
+        message = SimpleNamespace(content=json.dumps({name: VALID}, ensure_ascii=False))
+        return SimpleNamespace(choices=[SimpleNamespace(message=message)])
+
+
+class RepairDescriptionsTest(unittest.TestCase):
+    def setUp(self):
+        # LLMが一括生成で別の表記のモデル名を返した場合
+        self.descriptions = {
+            "GPT-4.1": VALID,
+            "Claude 3.5 Sonnet (v2)": VALID,
+            "o1-mini": "短い",
+            "Gemini 2.0": VALID,
+        }
+        self.analyses = {name: "分析結果" for name in modeldescription.TARGET_MODELS}
+
+    def test_alternate_spellings_are_mapped_without_retry(self):
+        result = repair_descriptions(FakeClient(), dict(self.descriptions), self.analyses, max_attempts=0)
+
+        self.assertEqual(result["Claude 3.5 Sonnet（v2）"], VALID)
+        self.assertEqual(result["o1 mini"], "短い")
+        # どのモデルにも対応しない名前も捨てない
+        self.assertEqual(result["Gemini 2.0"], VALID)
+        self.assertEqual(list(result)[:3], ["GPT-4.1", "o1 mini", "Claude 3.5 Sonnet（v2）"])
+
+    def test_retry_keeps_the_same_shape(self):
+        client = FakeClient()
+        result = repair_descriptions(client, dict(self.descriptions), self.analyses, max_attempts=1)
+
+        # 表記を揃えたうえで、文字数が合わないモデルだけを作り直す
+        self.assertIn("o1 mini", client.requested)
+        self.assertNotIn("Claude 3.5 Sonnet（v2）", client.requested)
+        self.assertEqual(result["o1 mini"], VALID)
+        self.assertEqual(result["Claude 3.5 Sonnet（v2）"], VALID)
+        self.assertEqual(result["Gemini 2.0"], VALID)
+        self.assertNotIn("o1-mini", result)
+        self.assertEqual(list(result)[-1], "Gemini 2.0")
+
+    def test_exact_name_wins_over_alternate_spelling(self):
+        result = align_descriptions({"o1-mini": "表記ゆれ", "o1 mini": "一致"})
+
+        self.assertEqual(result, {"o1 mini": "一致", "o1-mini": "表記ゆれ"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,105 @@
+import json
+import os
+import sys
+import threading
+import time
+import unittest
+import urllib.error
+import urllib.request
+from http.server import ThreadingHTTPServer
+
+# リポジトリ直下の utils を読み込めるようにする
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from utils.research_service import JobManager, ResearchRequestHandler
+
+
+def _run_job(job):
+    job.log("調査中")
+    return {"final_report": f"# {job.params['query']}"}
+
+
+def _wait_finished(manager, job_ids, timeout=5):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        jobs = [manager.jobs.get(job_id) for job_id in job_ids]
+        if all(job is None or job.finished for job in jobs):
+            return
+        time.sleep(0.01)
+    raise AssertionError("ジョブが終わりませんでした")
+
+
+class ResearchServiceTest(unittest.TestCase):
+    def start_server(self, manager):
+        server = ThreadingHTTPServer(("127.0.0.1", 0), ResearchRequestHandler)
+        server.daemon_threads = True
+        server.manager = manager
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    def get(self, url):
+        try:
+            with urllib.request.urlopen(url, timeout=5) as response:
+                return response.status, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.read()
+
+    def test_invalid_since_returns_400(self):
+        manager = JobManager(_run_job, max_jobs=1)
+        base = self.start_server(manager)
+        job = manager.submit({"query": "テスト"})
+        _wait_finished(manager, [job.id])
+
+        for since in ("abc", "-1", "1.5", "²"):
+            status, body = self.get(f"{base}/jobs/{job.id}?since={urllib.request.quote(since)}")
+            self.assertEqual(status, 400, since)
+            status, body = self.get(f"{base}/jobs/{job.id}/events?since={urllib.request.quote(since)}")
+            self.assertEqual(status, 400, since)
+
+        status, body = self.get(f"{base}/jobs/{job.id}?since=1")
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(body)["events"], [])
+
+    def post(self, url, body):
+        data = body if isinstance(body, bytes) else json.dumps(body).encode("utf-8")
+        request = urllib.request.Request(url, data=data, headers={"Content-Type": "application/json"}, method="POST")
+        return self.get(request)
+
+    def test_invalid_job_parameters_return_400(self):
+        manager = JobManager(_run_job, max_jobs=1)
+        base = self.start_server(manager)
+
+        for body in ({}, {"query": ""}, {"query": "   "}, {"query": 1}, {"query": "テスト", "iterations": "3"},
+                     {"query": "テスト", "iterations": 0}, {"query": "テスト", "iterations": -1},
+                     {"query": "テスト", "iterations": 10 ** 9}, {"query": "テスト", "iterations": 1.5},
+                     {"query": "テスト", "iterations": True}, ["テスト"]):
+            status, _ = self.post(f"{base}/jobs", body)
+            self.assertEqual(status, 400, body)
+        self.assertEqual(manager.list(), [])
+
+        status, body = self.post(f"{base}/jobs", {"query": " テスト "})
+        self.assertEqual(status, 202)
+        self.assertEqual(manager.get(json.loads(body)["id"]).params, {"query": "テスト", "iterations": 3})
+
+    def test_finished_jobs_are_capped(self):
+        manager = JobManager(_run_job, max_jobs=1, max_finished=2)
+        jobs = [manager.submit({"query": f"クエリ{i}"}) for i in range(4)]
+        _wait_finished(manager, [job.id for job in jobs])
+
+        # 古いものから削除され、新しい2件だけが残る
+        self.assertEqual([job.id for job in manager.list()], [job.id for job in jobs[2:]])
+        self.assertIsNone(manager.get(jobs[0].id))
+
+    def test_finished_jobs_expire(self):
+        manager = JobManager(_run_job, max_jobs=1, finished_ttl=60)
+        job = manager.submit({"query": "テスト"})
+        _wait_finished(manager, [job.id])
+        self.assertIs(manager.get(job.id), job)
+
+        job.finished_at -= 61
+        self.assertIsNone(manager.get(job.id))
+
+
+if __name__ == "__main__":
+    unittest.main()
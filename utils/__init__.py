@@ -0,0 +1 @@
+"""各スクリプトで共有するユーティリティ"""
@@ -0,0 +1,266 @@
+"""
+ストリーミングで応答を表示する複数ターンの会話
+
+会話履歴はトークン数の上限（max_history_tokens）を超えたときだけ、古いターンをまとめて要約に置き換える。
+毎ターン古い発言を1つずつ削ると送信するメッセージの先頭が毎回変わり、
+プロンプトキャッシュ（同じ先頭部分の再利用）が効かなくなるため、
+要約していない間は「システムプロンプト → 要約 → ターン」の先頭部分を変えずに末尾へ追記だけしていく。
+画像付きの最新の発言は要約すると画像が失われるため、要約せずにそのまま残す。
+"""
+
+import json
+
+from utils.client_pool import DEFAULT_API_VERSION, supports_stream_usage
+
+DEFAULT_MAX_HISTORY_TOKENS = 8000  # 履歴（システムプロンプトを除く）のトークン数の上限
+DEFAULT_KEEP_RECENT_TURNS = 2      # 要約するときにそのまま残す直近のターン数
+IMAGE_TOKENS = {"low": 85, "high": 765, "auto": 765}  # 画像1枚のトークン数の目安
+SUMMARY_PROMPT = """以下はユーザーとアシスタントの会話の記録です。
+以降の会話を続けるのに必要な事実・決定事項・ユーザーの要望・未解決の質問を漏らさず、簡潔な日本語の箇条書きに要約してください。
+
+{conversation}"""
+
+
+_ENCODER = None  # 初回の estimate_tokens で読み込む（False は tiktoken がないことを表す）
+
+
+def _encoder():
+    # tiktoken があれば正確に数え、なければ文字種から概算する
+    global _ENCODER
+    if _ENCODER is None:
+        try:
+            import tiktoken
+            _ENCODER = tiktoken.get_encoding("o200k_base")
+        except Exception:
+            _ENCODER = False
+    return _ENCODER
+
+
+def estimate_tokens(content):
+    """
+    メッセージ本文のおおよそのトークン数を返す
+
+    Args:
+        content: 文字列、または text / image_url パーツのリスト
+
+    Returns:
+        int: トークン数
+    """
+    if isinstance(content, list):
+        total = 0
+        for part in content:
+            if part.get("type") == "image_url":
+                total += IMAGE_TOKENS.get(part["image_url"].get("detail", "auto"), 765)
+            else:
+                total += estimate_tokens(part.get("text", ""))
+        return total
+    text = content or ""
+    encoder = _encoder()
+    if encoder:
+        return len(encoder.encode(text))
+    # 英数字はおよそ4文字で1トークン、日本語などはおよそ1文字で1トークン
+    ascii_chars = sum(1 for ch in text if ord(ch) < 128)
+    return ascii_chars // 4 + (len(text) - ascii_chars) + 1
+
+
+def has_image(content):
+    # 画像のパーツを含む発言かどうか
+    return isinstance(content, list) and any(part.get("type") == "image_url" for part in content)
+
+
+def content_to_text(content):
+    # 要約用に本文を文字列にする（画像は目印だけ残す）
+    if isinstance(content, list):
+        return "\n".join(part.get("text", "") if part.get("type") != "image_url" else "[画像]" for part in content)
+    return content or ""
+
+
+class ChatSession:
+    """トークン数で上限を設けた履歴を持つ、ストリーミングの会話"""
+
+    def __init__(self, client, model, system_prompt=None, max_history_tokens=DEFAULT_MAX_HISTORY_TOKENS,
+                 keep_recent_turns=DEFAULT_KEEP_RECENT_TURNS, completion_params=None, api_version=DEFAULT_API_VERSION):
+        """
+        Args:
+            client: AzureOpenAIクライアント
+            model: デプロイ名
+            system_prompt: システムプロンプト（o1 系のように system を受け付けないモデルでは None）
+            max_history_tokens: 履歴のトークン数の上限
+            keep_recent_turns: 要約するときにそのまま残す直近のターン数
+            completion_params: chat.completions.create に追加で渡す引数（max_completion_tokens など）
+            api_version: client のAPIバージョン（対応していれば応答の最後に使用量を返させる）
+        """
+        self.client = client
+        self.model = model
+        self.system_prompt = system_prompt
+        self.max_history_tokens = max_history_tokens
+        self.keep_recent_turns = keep_recent_turns
+        self.completion_params = completion_params or {}
+        # stream_options は古いAPIバージョンでは400になるので、対応している場合だけ送る
+        self.stream_options = {"stream_options": {"include_usage": True}} if supports_stream_usage(api_version) else {}
+        self.summary = None
+        self.turns = []  # [{"user": content, "assistant": text}]
+        self.last_usage = None
+        self.compactions = 0
+
+    def messages(self, user_content=None):
+        """
+        送信するメッセージの一覧を作る（先頭から システムプロンプト → 要約 → 過去のターン → 今回の発言）
+
+        Args:
+            user_content: 今回のユーザーの発言
+
+        Returns:
+            list: メッセージのリスト
+        """
+        messages = []
+        if self.system_prompt:
+            messages.append({"role": "system", "content": self.system_prompt})
+        if self.summary:
+            messages.append({"role": "user", "content": f"（これまでの会話の要約）\n{self.summary}"})
+            messages.append({"role": "assistant", "content": "承知しました。要約の内容を踏まえて会話を続けます。"})
+        for turn in self.turns:
+            messages.append({"role": "user", "content": turn["user"]})
+            messages.append({"role": "assistant", "content": turn["assistant"]})
+        if user_content is not None:
+            messages.append({"role": "user", "content": user_content})
+        return messages
+
+    def history_tokens(self):
+        # 要約と過去のターンのおおよそのトークン数
+        total = estimate_tokens(self.summary) if self.summary else 0
+        for turn in self.turns:
+            total += estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"])
+        return total
+
+    def send(self, user_content, on_token=None):
+        """
+        発言を送り、応答をストリーミングで受け取る
+
+        Args:
+            user_content: ユーザーの発言（文字列、または text / image_url パーツのリスト）
+            on_token: 応答の断片を受け取るたびに呼ぶ関数
+
+        Returns:
+            str: 応答の全文
+        """
+        stream = self.client.chat.completions.create(
+            model=self.model,
+            messages=self.messages(user_content),
+            stream=True,
+            **self.stream_options,
+            **self.completion_params
+        )
+        pieces = []
+        for chunk in stream:
+            if chunk.usage is not None:
+                self.last_usage = chunk.usage
+            if chunk.choices and chunk.choices[0].delta.content:
+                pieces.append(chunk.choices[0].delta.content)
+                if on_token is not None:
+                    on_token(chunk.choices[0].delta.content)
+        reply = "".join(pieces)
+
+        self.turns.append({"user": user_content, "assistant": reply})
+        if self.history_tokens() > self.max_history_tokens:
+            self.compact()
+        return reply
+
+    def compact(self):
+        """
+        直近のターンを残して、それより古いターンを要約に置き換える
+
+        要約は前回の要約も含めて作り直すので、要約は常に1つだけになる。
+        要約の直後にまた上限を超えて毎ターン要約し直すことがないよう、
+        残すターンは keep_recent_turns 以内かつ上限の半分以内にする。
+        画像付きの最新のターンは、画像について続けて質問できるよう要約せずに要約の直後に残す
+        """
+        keep = 0
+        kept_tokens = 0
+        for turn in reversed(self.turns[-self.keep_recent_turns:] if self.keep_recent_turns else []):
+            kept_tokens += estimate_tokens(turn["user"]) + estimate_tokens(turn["assistant"])
+            if kept_tokens > self.max_history_tokens // 2:
+                break
+            keep += 1
+        old_turns = self.turns[:len(self.turns) - keep]
+        image_turn = next((turn for turn in reversed(self.turns) if has_image(turn["user"])), None)
+        pinned = [turn for turn in old_turns if turn is image_turn]
+        old_turns = [turn for turn in old_turns if turn is not image_turn]
+        if not old_turns:
+            return
+        lines = []
+        if self.summary:
+            lines.append(f"（以前の要約）\n{self.summary}")
+        for turn in old_turns:
+            lines.append(f"ユーザー: {content_to_text(turn['user'])}")
+            lines.append(f"アシスタント: {turn['assistant']}")
+
+        response = self.client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": SUMMARY_PROMPT.format(conversation="\n\n".join(lines))}],
+            **self.completion_params
+        )
+        self.summary = response.choices[0].message.content
+        self.turns = pinned + self.turns[len(self.turns) - keep:]
+        self.compactions += 1
+
+    def reset(self):
+        # 会話を最初からやり直す
+        self.summary = None
+        self.turns = []
+        self.last_usage = None
+
+    def stats(self):
+        """
+        会話の状態と直近のリクエストのトークン使用量を返す
+
+        Returns:
+            dict: ターン数・履歴のトークン数・要約回数・直近の入力/キャッシュ済み/出力トークン数
+        """
+        info = {"turns": len(self.turns), "history_tokens": self.history_tokens(), "compactions": self.compactions}
+        if self.last_usage is not None:
+            details = getattr(self.last_usage, "prompt_tokens_details", None)
+            info.update(prompt_tokens=self.last_usage.prompt_tokens,
+                        cached_tokens=getattr(details, "cached_tokens", None) if details else None,
+                        completion_tokens=self.last_usage.completion_tokens)
+        return info
+
+
+def run_chat(session, first_message=None):
+    """
+    標準入力から発言を読み、応答をストリーミングで表示する対話ループ
+
+    /exit で終了、/reset で会話をやり直し、/stats でトークン使用量を表示する
+
+    Args:
+        session: ChatSession
+        first_message: 最初に送る発言（画像付きの発言など）
+    """
+    def show(token):
+        print(token, end="", flush=True)
+
+    if first_message is not None:
+        print("AI> ", end="", flush=True)
+        session.send(first_message, on_token=show)
+        print()
+
+    while True:
+        try:
+            text = input("\nあなた> ").strip()
+        except (EOFError, KeyboardInterrupt):
+            print()
+            break
+        if not text:
+            continue
+        if text in ("/exit", "/quit"):
+            break
+        if text == "/reset":
+            session.reset()
+            print("会話をリセットしました。")
+            continue
+        if text == "/stats":
+            print(json.dumps(session.stats(), ensure_ascii=False))
+            continue
+        print("AI> ", end="", flush=True)
+        session.send(text, on_token=show)
+        print()
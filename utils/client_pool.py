@@ -0,0 +1,337 @@
+"""
+複数の Azure OpenAI デプロイメントに chat.completions.create を振り分けるクライアントプール
+
+環境変数 AZURE_OPENAI_DEPLOYMENTS に、JSONファイルのパスまたはJSON文字列で接続先の一覧を指定する。
+
+    [
+        {"name": "japaneast", "endpoint": "https://xxx.openai.azure.com/", "api_key": "...",
+         "deployments": {"o1-mini": "o1-mini-je", "gpt-4.1": "gpt-41-je"}},
+        {"name": "eastus2", "endpoint": "https://yyy.openai.azure.com/", "api_key_env": "AZURE_OPENAI_API_KEY_EASTUS2",
+         "weight": 2}
+    ]
+
+- deployments: スクリプトで指定するモデル名から、その接続先でのデプロイ名への対応（省略時はモデル名をそのまま使い、すべてのモデルを受け付ける）
+- api_key_env: キーをファイルに書かずに環境変数から読む場合の変数名
+- weight: 振り分けの重み（既定1）
+- api_version: その接続先だけ別のAPIバージョンを使う場合に指定（ストリーミングで使用量を受け取るには 2024-09-01 以降）
+
+各リクエストは、応答ヘッダーの残りクォータ（x-ratelimit-remaining-tokens / requests）、
+応答時間の移動平均、処理中のリクエスト数から最も余裕のある接続先に送る。
+429 の場合は Retry-After の間その接続先を休ませ、5xx・接続エラーの場合も少し休ませて、別の接続先で再試行する。
+AZURE_OPENAI_DEPLOYMENTS が未設定の場合は従来どおり AZURE_OPENAI_ENDPOINT の1つだけに接続する。
+"""
+
+import json
+import os
+import threading
+import time
+
+DEFAULT_API_VERSION = "2024-10-21"  # stream_options（ストリーミングでの使用量）に対応したGA版
+STREAM_USAGE_API_VERSION = "2024-09-01"  # stream_options を受け付ける最初のAPIバージョン（preview を含む）
+LATENCY_SMOOTHING = 0.3       # 応答時間の移動平均の重み
+DEFAULT_RATE_LIMIT_WAIT = 10  # Retry-After がない429で休ませる秒数
+SERVER_ERROR_WAIT = 5         # 5xx・接続エラーで休ませる秒数
+MAX_WAIT_FOR_DEPLOYMENT = 60  # すべての接続先が休止中のときに待つ最大秒数
+MAX_ROUNDS = 3                # 1リクエストにつき全接続先を何巡まで試すか
+
+
+class DeploymentStats:
+    """1つの接続先の実績（リクエスト数・エラー・応答時間・残りクォータ）"""
+
+    def __init__(self):
+        self.requests = 0
+        self.successes = 0
+        self.rate_limited = 0
+        self.errors = 0
+        self.in_flight = 0
+        self.latency = None          # 応答時間の移動平均（秒）
+        self.remaining_tokens = None
+        self.remaining_requests = None
+        self.max_remaining_tokens = None  # これまでに見た残りトークンの最大値（上限の推定）
+        self.cooldown_until = 0.0
+
+    def quota_fraction(self):
+        # 残りトークンの割合（ヘッダーが返っていなければ1）
+        if not self.remaining_tokens or not self.max_remaining_tokens:
+            return 1.0 if self.remaining_tokens is None else 0.01
+        return max(self.remaining_tokens / self.max_remaining_tokens, 0.01)
+
+    def as_dict(self):
+        return {
+            "requests": self.requests,
+            "successes": self.successes,
+            "rate_limited": self.rate_limited,
+            "errors": self.errors,
+            "in_flight": self.in_flight,
+            "latency": round(self.latency, 3) if self.latency is not None else None,
+            "remaining_tokens": self.remaining_tokens,
+            "remaining_requests": self.remaining_requests,
+            "cooling_down": max(0.0, round(self.cooldown_until - time.monotonic(), 1))
+        }
+
+
+class Deployment:
+    """プールに登録する1つの接続先"""
+
+    def __init__(self, name, client, deployments=None, weight=1.0):
+        """
+        Args:
+            name: 接続先の名前（統計の表示に使う）
+            client: AzureOpenAIクライアント（SDK側の再試行は無効にしておく）
+            deployments: モデル名からデプロイ名への対応（Noneならモデル名をそのまま使う）
+            weight: 振り分けの重み
+        """
+        self.name = name
+        self.client = client
+        self.deployments = deployments
+        self.weight = weight
+        self.stats = DeploymentStats()
+
+    def deployment_for(self, model):
+        # モデル名に対応するデプロイ名（この接続先で扱えなければNone）
+        if self.deployments is None:
+            return model
+        return self.deployments.get(model)
+
+
+def _header_int(headers, name):
+    value = headers.get(name)
+    try:
+        return int(float(value)) if value is not None else None
+    except ValueError:
+        return None
+
+
+def _retry_after(headers):
+    # 429 の応答から休ませる秒数を求める
+    if headers is None:
+        return DEFAULT_RATE_LIMIT_WAIT
+    milliseconds = _header_int(headers, "retry-after-ms")
+    if milliseconds is not None:
+        return milliseconds / 1000
+    seconds = _header_int(headers, "retry-after")
+    return seconds if seconds is not None else DEFAULT_RATE_LIMIT_WAIT
+
+
+class ClientPool:
+    """
+    複数の接続先に chat.completions.create を振り分けるクライアント
+
+    chat.completions.create 以外の属性（files, batches など）は最初の接続先のクライアントに委譲する。
+    """
+
+    def __init__(self, deployments):
+        if not deployments:
+            raise ValueError("接続先が1つもありません")
+        self.deployments = deployments
+        self._lock = threading.Lock()
+        self.chat = _PooledChat(self)
+
+    def __getattr__(self, name):
+        return getattr(self.deployments[0].client, name)
+
+    def stats(self):
+        """
+        接続先ごとの実績を返す
+
+        Returns:
+            dict: 接続先の名前をキー、実績の辞書を値とする辞書
+        """
+        with self._lock:
+            return {deployment.name: deployment.stats.as_dict() for deployment in self.deployments}
+
+    def _score(self, deployment, default_latency):
+        stats = deployment.stats
+        latency = stats.latency if stats.latency is not None else default_latency
+        return deployment.weight * stats.quota_fraction() / (latency * (1 + stats.in_flight))
+
+    def _acquire(self, model, tried):
+        """
+        次にリクエストを送る接続先を選び、処理中として数える
+
+        Returns:
+            tuple: (接続先, 休止が明けるまでの秒数) 送れる接続先がなければ接続先はNone
+        """
+        with self._lock:
+            now = time.monotonic()
+            candidates = [d for d in self.deployments if d.deployment_for(model) is not None and d not in tried]
+            if not candidates:
+                return None, None
+            available = [d for d in candidates if d.stats.cooldown_until <= now]
+            if not available:
+                return None, min(d.stats.cooldown_until for d in candidates) - now
+            latencies = [d.stats.latency for d in available if d.stats.latency is not None]
+            default_latency = sum(latencies) / len(latencies) if latencies else 1.0
+            chosen = max(available, key=lambda d: self._score(d, default_latency))
+            chosen.stats.in_flight += 1
+            chosen.stats.requests += 1
+            return chosen, 0.0
+
+    def _release(self, deployment, elapsed=None, headers=None, error=None, wait=0.0):
+        # リクエストの結果を実績に反映する
+        with self._lock:
+            stats = deployment.stats
+            stats.in_flight -= 1
+            if headers is not None:
+                remaining_tokens = _header_int(headers, "x-ratelimit-remaining-tokens")
+                if remaining_tokens is not None:
+                    stats.remaining_tokens = remaining_tokens
+                    stats.max_remaining_tokens = max(stats.max_remaining_tokens or 0, remaining_tokens)
+                remaining_requests = _header_int(headers, "x-ratelimit-remaining-requests")
+                if remaining_requests is not None:
+                    stats.remaining_requests = remaining_requests
+            if error == "rate_limited":
+                stats.rate_limited += 1
+            elif error:
+                stats.errors += 1
+            else:
+                stats.successes += 1
+                stats.latency = elapsed if stats.latency is None else (
+                    (1 - LATENCY_SMOOTHING) * stats.latency + LATENCY_SMOOTHING * elapsed)
+            if wait:
+                stats.cooldown_until = max(stats.cooldown_until, time.monotonic() + wait)
+
+    def create(self, **kwargs):
+        """
+        接続先を選んで chat.completions.create を呼び出し、失敗したら別の接続先で再試行する
+
+        Args:
+            kwargs: chat.completions.create に渡す引数（model はスクリプト側のモデル名）
+
+        Returns:
+            ChatCompletion、または stream=True の場合はストリーム
+        """
+        import openai
+
+        model = kwargs.get("model")
+        tried = set()
+        waited = 0.0
+        attempts = 0
+        last_error = None
+        while True:
+            if attempts >= MAX_ROUNDS * len(self.deployments):
+                raise last_error
+            deployment, wait = self._acquire(model, tried)
+            if deployment is None:
+                if wait is None and not tried:
+                    raise ValueError(f"モデル {model} を扱える接続先がありません")
+                if wait is None:
+                    # すべての接続先で失敗した場合は、休止が明けるのを待ってもう一巡する
+                    tried = set()
+                    continue
+                if waited + wait > MAX_WAIT_FOR_DEPLOYMENT:
+                    raise last_error or RuntimeError(f"モデル {model} の接続先がすべて休止中です")
+                time.sleep(wait)
+                waited += wait
+                continue
+
+            tried.add(deployment)
+            attempts += 1
+            request = dict(kwargs, model=deployment.deployment_for(model))
+            start = time.perf_counter()
+            try:
+                raw = deployment.client.chat.completions.with_raw_response.create(**request)
+            except openai.RateLimitError as e:
+                last_error = e
+                self._release(deployment, headers=e.response.headers, error="rate_limited", wait=_retry_after(e.response.headers))
+                continue
+            except openai.APIStatusError as e:
+                if e.status_code < 500:
+                    self._release(deployment, headers=e.response.headers, error="client_error")
+                    raise
+                last_error = e
+                self._release(deployment, headers=e.response.headers, error="server_error", wait=SERVER_ERROR_WAIT)
+                continue
+            except openai.APIConnectionError as e:
+                # APITimeoutError も含む
+                last_error = e
+                self._release(deployment, error="connection_error", wait=SERVER_ERROR_WAIT)
+                continue
+            except Exception:
+                self._release(deployment, error="client_error")
+                raise
+            self._release(deployment, elapsed=time.perf_counter() - start, headers=raw.headers)
+            return raw.parse()
+
+
+class _PooledCompletions:
+    def __init__(self, pool):
+        self._pool = pool
+
+    def create(self, **kwargs):
+        return self._pool.create(**kwargs)
+
+
+class _PooledChat:
+    def __init__(self, pool):
+        self.completions = _PooledCompletions(pool)
+
+
+def load_deployments_config(value):
+    """
+    接続先の一覧を読み込む
+
+    Args:
+        value: JSONファイルのパス、またはJSON文字列
+
+    Returns:
+        list: 接続先の設定の辞書のリスト
+    """
+    if value.lstrip().startswith("["):
+        return json.loads(value)
+    with open(value, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def supports_stream_usage(api_version):
+    """
+    APIバージョンが stream_options={"include_usage": True} を受け付けるか判定する
+
+    Args:
+        api_version: APIバージョン（"2024-10-21" や "2024-09-01-preview" の形式）
+
+    Returns:
+        bool: 受け付ける場合True
+    """
+    # 先頭の日付部分は文字列のまま比較できる
+    return api_version[:10] >= STREAM_USAGE_API_VERSION
+
+
+def create_azure_client(api_version=DEFAULT_API_VERSION, max_retries=None):
+    """
+    AzureOpenAIクライアントを作成する
+
+    AZURE_OPENAI_DEPLOYMENTS が設定されていれば複数の接続先に振り分ける ClientPool を、
+    なければ AZURE_OPENAI_ENDPOINT / AZURE_OPENAI_API_KEY の AzureOpenAI クライアントを返す
+
+    Args:
+        api_version: APIバージョン
+        max_retries: 1つの接続先の場合のSDKの再試行回数（Noneなら既定値。プールの場合は常に0で、別の接続先で再試行する）
+
+    Returns:
+        AzureOpenAI or ClientPool: クライアント
+    """
+    from openai import AzureOpenAI
+
+    config = os.getenv("AZURE_OPENAI_DEPLOYMENTS")
+    if not config:
+        options = {"max_retries": max_retries} if max_retries is not None else {}
+        return AzureOpenAI(
+            api_version=api_version,
+            api_key=os.getenv("AZURE_OPENAI_API_KEY"),
+            azure_endpoint=os.getenv("AZURE_OPENAI_ENDPOINT"),
+            **options
+        )
+
+    deployments = []
+    for index, entry in enumerate(load_deployments_config(config)):
+        api_key = entry.get("api_key") or os.getenv(entry.get("api_key_env", "AZURE_OPENAI_API_KEY"))
+        client = AzureOpenAI(
+            api_version=entry.get("api_version", api_version),
+            api_key=api_key,
+            azure_endpoint=entry["endpoint"],
+            max_retries=0,  # 再試行はプール側で別の接続先に対して行う
+        )
+        deployments.append(Deployment(entry.get("name", f"deployment-{index}"), client,
+                                      entry.get("deployments"), float(entry.get("weight", 1.0))))
+    return ClientPool(deployments)
@@ -0,0 +1,198 @@
+"""
+チャット補完（chat.completions.create）の記録・再生キャッシュ
+
+同じデプロイ名・パラメータ・プロンプトで送ったリクエストの応答をディスクに保存し、
+2回目以降はAzure OpenAIを呼ばずに保存済みの応答を返す。
+
+モード（環境変数 LLM_CACHE_MODE）:
+    off    : キャッシュを使わない（既定）
+    record : キャッシュにあれば再利用し、なければAPIを呼んで応答を保存する
+    replay : キャッシュからのみ応答を返し、見つからなければエラーにする
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+
+DEFAULT_CACHE_DIR = ".llm_cache"  # キャッシュの既定の保存先
+CACHE_MODES = ("off", "record", "replay")
+
+
+class CompletionCacheMiss(Exception):
+    """replayモードでキャッシュに応答が見つからなかったときのエラー"""
+
+
+def make_cache_key(request):
+    """
+    リクエストのパラメータからキャッシュキーを作成する
+    
+    Args:
+        request: chat.completions.create に渡すキーワード引数の辞書
+        
+    Returns:
+        str: キャッシュキー（SHA-256の16進文字列）
+    """
+    params = {k: v for k, v in request.items() if k not in ("model", "messages")}
+    messages = json.dumps(request.get("messages", []), ensure_ascii=False, sort_keys=True)
+    
+    key_source = json.dumps({
+        "deployment": request.get("model"),
+        "params": params,
+        "prompt": hashlib.sha256(messages.encode("utf-8")).hexdigest()
+    }, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(key_source.encode("utf-8")).hexdigest()
+
+
+class CompletionCache:
+    """チャット補完の応答をキーごとのJSONファイルとして保存するキャッシュ"""
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, mode="record"):
+        if mode not in CACHE_MODES:
+            raise ValueError(f"不明なキャッシュモードです: {mode}（{', '.join(CACHE_MODES)} のいずれか）")
+        self.cache_dir = cache_dir
+        self.mode = mode
+        self.hits = 0
+        self.misses = 0
+    
+    def _path(self, key):
+        # 1ディレクトリのファイル数が増えすぎないよう先頭2文字で振り分ける
+        return os.path.join(self.cache_dir, key[:2], f"{key}.json")
+    
+    def load(self, key):
+        """
+        キャッシュから応答を読み込む
+        
+        Args:
+            key: キャッシュキー
+            
+        Returns:
+            ChatCompletion or None: 保存されていた応答（なければNone）
+        """
+        try:
+            with open(self._path(key), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return None
+        # openai の型は読み込みが重いので、キャッシュを実際に使うときだけ読み込む
+        from openai.types.chat import ChatCompletion
+        return ChatCompletion.model_validate(entry["response"])
+    
+    def store(self, key, request, response):
+        """
+        応答をキャッシュに保存する
+        
+        Args:
+            key: キャッシュキー
+            request: リクエストのキーワード引数
+            response: APIから返されたChatCompletion
+        """
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        
+        entry = {
+            "deployment": request.get("model"),
+            "request": request,
+            "response": response.model_dump(mode="json")
+        }
+        # 並行して書き込まれても壊れたファイルを読まないよう一時ファイル経由で置き換える
+        # （一時ファイル名はスレッド・プロセスごとに重ならないよう mkstemp で作る）
+        fd, tmp_path = tempfile.mkstemp(prefix=f"{key}.", suffix=".tmp", dir=os.path.dirname(path))
+        try:
+            with open(fd, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False, default=str)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+    
+    def get_or_create(self, request, create):
+        """
+        キャッシュにあれば保存済みの応答を、なければAPIを呼んだ結果を返す
+        
+        Args:
+            request: chat.completions.create に渡すキーワード引数の辞書
+            create: キャッシュにない場合に実際のAPI呼び出しを行う関数
+            
+        Returns:
+            ChatCompletion: 応答
+        """
+        key = make_cache_key(request)
+        response = self.load(key)
+        if response is not None:
+            self.hits += 1
+            return response
+        
+        self.misses += 1
+        if self.mode == "replay":
+            raise CompletionCacheMiss(f"キャッシュに応答がありません（deployment: {request.get('model')}, key: {key}）")
+        
+        response = create()
+        self.store(key, request, response)
+        return response
+
+
+class _CachedCompletions:
+    """chat.completions の代わりに使うラッパー"""
+    
+    def __init__(self, owner, cache):
+        self._owner = owner
+        self._cache = cache
+    
+    def create(self, **kwargs):
+        # ストリーミングの応答はキャッシュせずにそのまま呼び出す
+        if kwargs.get("stream"):
+            return self._owner.client.chat.completions.create(**kwargs)
+        return self._cache.get_or_create(kwargs, lambda: self._owner.client.chat.completions.create(**kwargs))
+
+
+class _CachedChat:
+    def __init__(self, owner, cache):
+        self.completions = _CachedCompletions(owner, cache)
+
+
+class CachedClient:
+    """
+    AzureOpenAIクライアントのラッパー
+    
+    chat.completions.create だけをキャッシュ経由にし、それ以外の属性は元のクライアントに委譲する。
+    元のクライアントは実際にAPIを呼ぶときに初めて作るため、キャッシュだけで済む間は接続情報がなくても動く。
+    """
+    
+    def __init__(self, client_factory, cache):
+        self._client_factory = client_factory
+        self._client = None
+        self._client_lock = threading.Lock()
+        self.cache = cache
+        self.chat = _CachedChat(self, cache)
+    
+    @property
+    def client(self):
+        """元のクライアント（初めて使うときに作る）"""
+        with self._client_lock:
+            if self._client is None:
+                self._client = self._client_factory()
+            return self._client
+    
+    def __getattr__(self, name):
+        return getattr(self.client, name)
+
+
+def wrap_client(client_factory, mode=None, cache_dir=None):
+    """
+    環境変数の設定に応じてクライアントをキャッシュ付きでラップする
+    
+    Args:
+        client_factory: AzureOpenAIクライアントを作る関数（キャッシュにない応答が必要になったときだけ呼ぶ）
+        mode: キャッシュモード（省略時は環境変数 LLM_CACHE_MODE、既定は off）
+        cache_dir: キャッシュの保存先（省略時は環境変数 LLM_CACHE_DIR）
+        
+    Returns:
+        AzureOpenAI or CachedClient: offモードなら作成したクライアント、それ以外はラップしたクライアント
+    """
+    mode = mode or os.getenv("LLM_CACHE_MODE") or "off"
+    if mode == "off":
+        return client_factory()
+    cache_dir = cache_dir or os.getenv("LLM_CACHE_DIR") or DEFAULT_CACHE_DIR
+    return CachedClient(client_factory, CompletionCache(cache_dir, mode))
@@ -0,0 +1,212 @@
+"""
+Webページから本文だけを取り出す抽出器（Readability風）
+
+メニュー・Cookieバナー・関連記事一覧などの定型部分を除き、
+テキスト密度とリンク密度でブロックを評価して本文と思われる領域のテキストだけを返す。
+同じ文章が何度も出てこないよう重複も取り除く。
+"""
+
+import re
+
+# bs4 は読み込みに時間がかかるため、実際に抽出するときに読み込む
+
+# 中身ごと捨てるタグ
+REMOVE_TAGS = ["script", "style", "noscript", "iframe", "nav", "footer", "header", "aside", "form", "svg", "button", "select", "template"]
+
+# テキストをまとめる単位となるブロック要素
+# 表はセルごとではなく行（tr）ごとにまとめる（モデル名とコンテキスト長のような短いセルが文字数で捨てられないように）
+BLOCK_TAGS = {
+    "p", "li", "pre", "blockquote", "dd", "dt", "figcaption", "caption",
+    "h1", "h2", "h3", "h4", "h5", "h6",
+    "div", "section", "article", "main", "ul", "ol", "dl", "table", "tr", "tbody", "body"
+}
+HEADING_TAGS = {"h1", "h2", "h3", "h4", "h5", "h6"}
+CELL_TAGS = {"td", "th"}
+CELL_SEPARATOR = " | "
+CELL_MERGE_MAX_CHARS = 200  # セルの中の段落（<td><p>…</p></td>）は、セルがこれより短ければ行にまとめる
+
+# class/id にこれらを含む要素は定型部分とみなして除去する
+BOILERPLATE_PATTERN = re.compile(
+    r"cookie|consent|gdpr|banner|breadcrumb|share|social|related|recommend|ranking|sidebar|side-bar|"
+    r"comment|footer|menu|navbar|subscribe|newsletter|promo|advert|sponsor|popup|modal|pagination|pager",
+    re.IGNORECASE
+)
+# ただし本文のコンテナによく使われる名前を含む場合は残す
+CONTENT_HINT_PATTERN = re.compile(r"article|content|main|body|entry|post|story", re.IGNORECASE)
+
+MIN_BLOCK_CHARS = 25       # 本文のブロックとみなす最小文字数（見出しを除く）
+MAX_LINK_DENSITY = 0.5     # これ以上リンク文字の割合が高いブロックはナビゲーションとみなす
+SIBLING_SCORE_RATIO = 0.2  # 最良の領域に対してこの割合以上の評価の兄弟要素も本文に含める
+MIN_MAIN_CHARS = 200       # 本文領域の文字数がこれ未満なら良質なブロックをすべて使う
+
+
+def _normalize(text):
+    return " ".join(text.split())
+
+
+def _remove_boilerplate(soup):
+    for tag in soup(REMOVE_TAGS):
+        tag.decompose()
+    
+    page_chars = len(soup.get_text()) or 1
+    for element in soup.find_all(True):
+        if element.decomposed or element.name in ("html", "body", "main", "article"):
+            continue
+        names = " ".join(element.get("class") or []) + " " + (element.get("id") or "")
+        if not BOILERPLATE_PATTERN.search(names) or CONTENT_HINT_PATTERN.search(names):
+            continue
+        # ページ全体を包むようなラッパー要素を誤って消さないようにする
+        if len(element.get_text()) > page_chars * 0.5:
+            continue
+        element.decompose()
+
+
+def _collect_blocks(soup):
+    # 各テキストを最も近いブロック要素に割り当てる（入れ子のテキストを二重に数えない）
+    from bs4 import Comment, Doctype, ProcessingInstruction, Declaration
+    
+    blocks = {}
+    short_cells = {}
+    for string in soup.find_all(string=True):
+        if isinstance(string, (Comment, Doctype, ProcessingInstruction, Declaration)) or not string.strip():
+            continue
+        in_link = False
+        cell = None
+        parent = string.parent
+        while parent is not None and parent.name not in BLOCK_TAGS:
+            if parent.name == "a":
+                in_link = True
+            if cell is None and parent.name in CELL_TAGS:
+                cell = parent
+            parent = parent.parent
+        if parent is None:
+            continue
+        inner = None
+        if parent.name != "tr" and cell is None:
+            # 短いセルの中の段落は、セル単位ではなく行のブロックに含める（レイアウト用の大きな表は対象外）
+            enclosing = parent.find_parent(CELL_TAGS)
+            if enclosing is not None:
+                if id(enclosing) not in short_cells:
+                    short_cells[id(enclosing)] = len(enclosing.get_text().strip()) < CELL_MERGE_MAX_CHARS
+                row = enclosing.find_parent("tr")
+                if short_cells[id(enclosing)] and row is not None:
+                    cell, inner, parent = enclosing, id(parent), row
+        block = blocks.setdefault(id(parent), {"element": parent, "parts": [], "link_chars": 0})
+        block["parts"].append((id(cell) if cell is not None else None, inner, str(string)))
+        if in_link:
+            block["link_chars"] += len(string.strip())
+    
+    result = []
+    for block in blocks.values():
+        # 同じセルのテキストはつなげ（セル内の段落の間は空白）、セルの間は区切り文字で分ける
+        cells = []
+        previous_inner = None
+        for cell_id, inner, part in block["parts"]:
+            if cells and cells[-1][0] == cell_id:
+                cells[-1][1].append(part if inner == previous_inner else " " + part)
+            else:
+                cells.append((cell_id, [part]))
+            previous_inner = inner
+        text = CELL_SEPARATOR.join(filter(None, (_normalize("".join(parts)) for _, parts in cells)))
+        if not text:
+            continue
+        result.append({
+            "element": block["element"],
+            "text": text,
+            "link_density": min(block["link_chars"] / len(text), 1.0),
+            "heading": block["element"].name in HEADING_TAGS,
+            "table_row": block["element"].name == "tr"
+        })
+    return result
+
+
+def _is_content_block(block):
+    if block["link_density"] >= MAX_LINK_DENSITY:
+        return False
+    # 表の行は短くても本文として残す
+    return block["heading"] or block["table_row"] or len(block["text"]) >= MIN_BLOCK_CHARS
+
+
+def _select_main_region(blocks):
+    # 本文らしいブロックの評価を親（そのまま）と祖父（半分）に加算する
+    scores = {}
+    elements = {}
+    for block in blocks:
+        if block["heading"] or not _is_content_block(block):
+            continue
+        score = len(block["text"]) * (1 - block["link_density"])
+        parent = block["element"].parent
+        for weight in (1.0, 0.5):
+            if parent is None or parent.name in ("html", "[document]"):
+                break
+            bonus = 1.25 if parent.name in ("article", "main") else 1.0
+            scores[id(parent)] = scores.get(id(parent), 0) + score * weight * bonus
+            elements[id(parent)] = parent
+            parent = parent.parent
+    if not scores:
+        return None
+    
+    best_id = max(scores, key=scores.get)
+    best = elements[best_id]
+    region = [best]
+    # 最良の領域と同じ親を持ち、十分な評価の兄弟要素も本文として扱う
+    if best.parent is not None:
+        for sibling in best.parent.find_all(True, recursive=False):
+            if sibling is not best and scores.get(id(sibling), 0) >= scores[best_id] * SIBLING_SCORE_RATIO:
+                region.append(sibling)
+    return region
+
+
+def _inside(element, region):
+    for container in region:
+        if element is container:
+            return True
+        for parent in element.parents:
+            if parent is container:
+                return True
+    return False
+
+
+def extract_main_content(html):
+    """
+    HTMLから本文と思われるテキストを抽出する
+    
+    Args:
+        html: HTML文字列、またはBeautifulSoupオブジェクト
+        
+    Returns:
+        dict: "title"（ページタイトル）と "text"（重複を除いた本文、ブロックごとに改行区切り）
+    """
+    from bs4 import BeautifulSoup
+    
+    soup = html if isinstance(html, BeautifulSoup) else BeautifulSoup(html, "html.parser")
+    
+    title = soup.title.get_text(strip=True) if soup.title else None
+    if not title and soup.h1:
+        title = soup.h1.get_text(strip=True)
+    
+    _remove_boilerplate(soup)
+    blocks = _collect_blocks(soup)
+    content_blocks = [block for block in blocks if _is_content_block(block)]
+    
+    region = _select_main_region(blocks)
+    if region is not None:
+        main_blocks = [block for block in content_blocks if _inside(block["element"], region)]
+        if sum(len(block["text"]) for block in main_blocks) >= MIN_MAIN_CHARS:
+            content_blocks = main_blocks
+    
+    # 同じ文章（メニューの繰り返しや入れ子の要素など）は最初の1回だけ残す
+    lines = []
+    seen = set()
+    for block in content_blocks:
+        if block["text"] in seen:
+            continue
+        seen.add(block["text"])
+        lines.append(block["text"])
+    
+    if not lines:
+        # 本文と判定できるブロックがない（短い段落だけのページなど）場合は、定型部分を除いた残りのテキストをそのまま使う
+        root = soup.body or soup
+        lines = [line for line in (_normalize(line) for line in root.get_text("\n").splitlines()) if line]
+    
+    return {"title": title, "text": "\n".join(lines)}
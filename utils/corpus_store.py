@@ -0,0 +1,128 @@
+"""
+スクレイピングしたページ本文を保存するディスク上のコーパスストア
+
+ページ本文をメモリに溜め込まず SQLite に（既定では zlib 圧縮して）書き出し、
+プロンプトを組み立てるときは1ページずつ読み出して連結する。
+"""
+
+import os
+import sqlite3
+import tempfile
+import zlib
+
+
+class CorpusStore:
+    """URL・タイトル・本文をSQLiteに保存するページストア"""
+    
+    def __init__(self, path=None, compress=True):
+        """
+        Args:
+            path: データベースファイルのパス（省略時は一時ファイルを作成し、close時に削除する）
+            compress: 本文をzlib圧縮して保存するかどうか
+        """
+        self._temporary = path is None
+        if self._temporary:
+            fd, path = tempfile.mkstemp(prefix="corpus-", suffix=".db")
+            os.close(fd)
+        else:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        
+        self.path = path
+        self.compress = compress
+        self._conn = sqlite3.connect(path)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS pages (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                url TEXT UNIQUE NOT NULL,
+                title TEXT,
+                content BLOB,
+                compressed INTEGER NOT NULL
+            )
+        """)
+        self._conn.commit()
+    
+    def _encode(self, content):
+        data = content.encode("utf-8")
+        if self.compress:
+            return zlib.compress(data), 1
+        return data, 0
+    
+    @staticmethod
+    def _decode(data, compressed):
+        if compressed:
+            data = zlib.decompress(data)
+        return data.decode("utf-8")
+    
+    def add_pages(self, pages):
+        """
+        複数のページをまとめて保存する（同じURLのページは上書きする）
+        
+        Args:
+            pages: "url", "title", "content" を持つ辞書のリスト
+        """
+        rows = []
+        for page in pages:
+            content, compressed = self._encode(page["content"])
+            rows.append((page["url"], page.get("title"), content, compressed))
+        with self._conn:
+            self._conn.executemany(
+                "INSERT INTO pages (url, title, content, compressed) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(url) DO UPDATE SET title = excluded.title, content = excluded.content, compressed = excluded.compressed",
+                rows
+            )
+    
+    def add(self, url, title, content):
+        """
+        1ページを保存する
+        
+        Args:
+            url: ページのURL
+            title: ページのタイトル
+            content: 本文
+        """
+        self.add_pages([{"url": url, "title": title, "content": content}])
+    
+    def iter_pages(self):
+        """
+        保存した順にページを1件ずつ読み出す
+        
+        Yields:
+            dict: "url", "title", "content" を持つ辞書
+        """
+        cursor = self._conn.execute("SELECT url, title, content, compressed FROM pages ORDER BY id")
+        for url, title, content, compressed in cursor:
+            yield {"url": url, "title": title, "content": self._decode(content, compressed)}
+    
+    def get(self, url):
+        """
+        URLを指定してページを読み出す
+        
+        Args:
+            url: ページのURL
+            
+        Returns:
+            dict or None: ページの辞書（なければNone）
+        """
+        row = self._conn.execute("SELECT url, title, content, compressed FROM pages WHERE url = ?", (url,)).fetchone()
+        if row is None:
+            return None
+        return {"url": row[0], "title": row[1], "content": self._decode(row[2], row[3])}
+    
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM pages").fetchone()[0]
+    
+    def close(self):
+        """接続を閉じる（一時ファイルの場合は削除する）"""
+        self._conn.close()
+        if self._temporary:
+            for suffix in ("", "-wal", "-shm"):
+                if os.path.exists(self.path + suffix):
+                    os.remove(self.path + suffix)
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,341 @@
+"""
+Content-Type に応じて本文を取り出すドキュメントの取得
+
+検索結果には HTML のほかに PDF や巨大なテキストが含まれるため、応答を最後まで読み込む前に
+Content-Type（と URL の拡張子）を見て抽出方法を切り替え、必要な分だけダウンロードする。
+
+- HTML      : MAX_HTML_BYTES までだけ読み込んで extract_main_content で本文を抽出する
+- テキスト   : 文字数の上限に達したところで読み込みをやめる
+- PDF       : サーバーが Range リクエストに対応していれば、pypdf が読みに行った位置だけを
+              ブロック単位で取得し、ページごとにテキストを抽出して文字数の上限に達したら打ち切る
+              （PDF は末尾の相互参照表から読むため、先頭から順に読んで途中で止めることはできない）。
+              Range に対応していない場合は MAX_PDF_BYTES までダウンロードしてから同様に抽出する
+- 画像・動画・圧縮ファイルなど: 本文がないのでダウンロードせずに UnsupportedDocumentError にする
+
+pypdf はオプションで、インストールされていなければ PDF は UnsupportedDocumentError にする。
+"""
+
+import io
+import re
+
+import requests
+
+from utils.content_extractor import extract_main_content
+
+MAX_HTML_BYTES = 5 * 1024 * 1024   # HTMLを読み込む最大バイト数（これを超えた分は捨てる）
+MAX_PDF_BYTES = 30 * 1024 * 1024   # Range非対応のサーバーからPDFをダウンロードする最大バイト数
+RANGE_BLOCK_SIZE = 256 * 1024      # Range リクエストで取得する単位
+READ_CHUNK_SIZE = 64 * 1024        # ストリーミングで読み込む単位
+TEXT_BYTES_PER_CHAR = 4            # テキストの文字数の上限からバイト数を見積もる倍率（UTF-8の最大）
+
+PDF_CONTENT_TYPES = ("application/pdf", "application/x-pdf")
+TEXT_CONTENT_TYPES = ("text/plain", "text/markdown", "text/csv", "application/json")
+# 本文を取り出せない種類（ダウンロードしない）
+BINARY_CONTENT_PREFIXES = ("image/", "audio/", "video/", "font/", "application/zip", "application/gzip",
+                           "application/x-", "application/vnd.", "application/msword")
+
+# ページツリーの親から引き継ぐ属性
+INHERITABLE_PAGE_ATTRIBUTES = ("/Resources", "/MediaBox", "/CropBox", "/Rotate")
+
+CONTENT_RANGE_PATTERN = re.compile(r"bytes\s+(\d+)-(\d+)/(\d+|\*)")
+
+
+class UnsupportedDocumentError(Exception):
+    """本文を取り出せない種類のドキュメント"""
+
+
+def _content_type(response):
+    # "text/html; charset=utf-8" から "text/html" の部分を取り出す
+    return (response.headers.get("Content-Type") or "").split(";")[0].strip().lower()
+
+
+def _is_pdf_url(url):
+    return url.split("?")[0].split("#")[0].lower().endswith(".pdf")
+
+
+def _read_limited(response, max_bytes):
+    """
+    応答の本文を max_bytes まで読み込む
+
+    Returns:
+        tuple: (読み込んだバイト列, 上限で打ち切ったかどうか)
+    """
+    buffer = bytearray()
+    for chunk in response.iter_content(READ_CHUNK_SIZE):
+        buffer.extend(chunk)
+        if len(buffer) >= max_bytes:
+            return bytes(buffer[:max_bytes]), True
+    return bytes(buffer), False
+
+
+class RangeFile(io.RawIOBase):
+    """
+    HTTP の Range リクエストで必要な部分だけを取得する読み取り専用のファイル
+
+    取得したブロックは保持しておき、同じ位置を何度読んでも取得は1回にする。
+    """
+
+    def __init__(self, http, url, headers, size, timeout, first_block=b"", block_size=RANGE_BLOCK_SIZE):
+        """
+        Args:
+            http: requests.Session（または requests モジュール）
+            url: ファイルのURL
+            headers: リクエストヘッダー
+            size: ファイルの大きさ（バイト）
+            timeout: 1回の取得のタイムアウト（秒）
+            first_block: 取得済みの先頭部分
+            block_size: 1回に取得する単位
+        """
+        super().__init__()
+        self.http = http
+        self.url = url
+        self.headers = headers
+        self.size = size
+        self.timeout = timeout
+        self.block_size = block_size
+        self.bytes_fetched = len(first_block)
+        self.requests = 1 if first_block else 0
+        self._blocks = {}
+        self._position = 0
+        self._store(0, first_block)
+
+    def _store(self, start, data):
+        # start（ブロックの境界）から始まるデータをブロックごとに保持する（末尾の半端なブロックはファイル末尾の場合だけ）
+        for offset in range(0, len(data), self.block_size):
+            block = data[offset:offset + self.block_size]
+            if len(block) == self.block_size or start + offset + len(block) >= self.size:
+                self._blocks[(start + offset) // self.block_size] = block
+
+    def _fetch(self, first, last):
+        # ブロック first〜last をまとめて1回のリクエストで取得する
+        start = first * self.block_size
+        end = min((last + 1) * self.block_size, self.size) - 1
+        response = self.http.get(self.url, headers=dict(self.headers, Range=f"bytes={start}-{end}"), timeout=self.timeout)
+        response.raise_for_status()
+        self.requests += 1
+        self.bytes_fetched += len(response.content)
+        if response.status_code == 206:
+            self._store(start, response.content)
+        else:
+            # Range を無視して全体が返ってきた場合はそれをそのまま使う
+            self._store(0, response.content)
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_CUR:
+            offset += self._position
+        elif whence == io.SEEK_END:
+            offset += self.size
+        self._position = max(0, offset)
+        return self._position
+
+    def read(self, size=-1):
+        end = self.size if size is None or size < 0 else min(self._position + size, self.size)
+        if self._position >= end:
+            return b""
+        first = self._position // self.block_size
+        last = (end - 1) // self.block_size
+        missing = [index for index in range(first, last + 1) if index not in self._blocks]
+        if missing:
+            self._fetch(missing[0], missing[-1])
+        data = b"".join(self._blocks[index] for index in range(first, last + 1))
+        offset = self._position - first * self.block_size
+        result = data[offset:offset + end - self._position]
+        self._position += len(result)
+        return result
+
+    def readinto(self, buffer):
+        data = self.read(len(buffer))
+        buffer[:len(data)] = data
+        return len(data)
+
+
+def _iter_pages(reader):
+    """
+    ページツリーを先頭から順にたどり、ページを1つずつ返す
+
+    reader.pages は最初にすべてのページのオブジェクトを読み込むため、読まないページの分まで
+    Range で取得することになる。ここでは必要になったページのオブジェクトだけを読み込む。
+    """
+    from pypdf import PageObject
+
+    def walk(reference, inherited):
+        node = reference.get_object()
+        if "/Kids" in node:
+            attributes = dict(inherited)
+            attributes.update({key: node[key] for key in INHERITABLE_PAGE_ATTRIBUTES if key in node})
+            for kid in node["/Kids"]:
+                yield from walk(kid, attributes)
+            return
+        page = PageObject(reader, getattr(reference, "indirect_reference", None) or reference)
+        page.update(node)
+        for key, value in inherited.items():
+            if key not in page:
+                page[key] = value
+        yield page
+
+    yield from walk(reader.trailer["/Root"].raw_get("/Pages"), {})
+
+
+def extract_pdf_text(stream, max_chars):
+    """
+    PDFからページ順にテキストを抽出し、max_chars に達したら残りのページは読まない
+
+    Args:
+        stream: PDFを読み込むファイルオブジェクト（シーク可能なもの）
+        max_chars: 抽出する文字数の上限
+
+    Returns:
+        dict: "title", "text", "pages_read", "total_pages"
+    """
+    try:
+        from pypdf import PdfReader
+    except ImportError:
+        raise UnsupportedDocumentError("pypdf がインストールされていないためPDFを読み取れません（pip install pypdf）")
+
+    from pypdf.errors import PdfReadError
+
+    # strict=False で開くと相互参照表のすべてのオブジェクトの位置を確かめに行き、Range で取得しても
+    # 結局ファイル全体を読むことになる。まず strict=True で開き、壊れたPDFのときだけ strict=False で開き直す
+    try:
+        reader = PdfReader(stream, strict=True)
+        reader.strict = False  # 開いた後のページの読み取りは多少の不整合を許す
+    except PdfReadError:
+        stream.seek(0)
+        reader = PdfReader(stream, strict=False)
+    if reader.is_encrypted:
+        # 閲覧用のパスワードが空のPDFだけ読む
+        reader.decrypt("")
+    title = None
+    if reader.metadata is not None and reader.metadata.title:
+        title = str(reader.metadata.title).strip() or None
+
+    pages = []
+    total_chars = 0
+    pages_read = 0
+    for page in _iter_pages(reader):
+        text = " ".join((page.extract_text() or "").split())
+        pages_read += 1
+        if text:
+            pages.append(text)
+            total_chars += len(text)
+        if total_chars >= max_chars:
+            break
+    total_pages = reader.trailer["/Root"]["/Pages"].get("/Count", pages_read)
+    return {"title": title, "text": "\n\n".join(pages), "pages_read": pages_read, "total_pages": int(total_pages)}
+
+
+def _fetch_pdf(http, url, headers, response, max_chars, timeout):
+    # Range に対応していれば必要な部分だけを取得し、そうでなければ上限までダウンロードしてから抽出する
+    size = None
+    content_range = CONTENT_RANGE_PATTERN.match(response.headers.get("Content-Range", ""))
+    if response.status_code == 206 and content_range and content_range.group(3) != "*":
+        size = int(content_range.group(3))
+    elif (response.headers.get("Accept-Ranges", "").lower() == "bytes" and response.headers.get("Content-Length")
+          and not response.headers.get("Content-Encoding")):
+        size = int(response.headers["Content-Length"])
+
+    if size is not None:
+        # 先頭部分（Range で取得した場合はその応答の本文、そうでなければ最初のブロック）を読んだら接続を閉じる
+        first_block, _ = _read_limited(response, RANGE_BLOCK_SIZE)
+        response.close()
+        stream = RangeFile(http, url, headers, size, timeout, first_block=first_block)
+        result = extract_pdf_text(stream, max_chars)
+        result["bytes_read"] = stream.bytes_fetched
+        return result
+
+    data, truncated = _read_limited(response, MAX_PDF_BYTES)
+    if truncated:
+        raise UnsupportedDocumentError(f"PDFが大きすぎます（{MAX_PDF_BYTES // (1024 * 1024)}MB超、Range非対応）: {url}")
+    result = extract_pdf_text(io.BytesIO(data), max_chars)
+    result["bytes_read"] = len(data)
+    return result
+
+
+def _charset(response):
+    # Content-Type で明示された charset（なければNone）
+    if "charset=" in (response.headers.get("Content-Type") or "").lower():
+        return response.encoding
+    return None
+
+
+def _decode_text(data, response):
+    # charset の指定がなければ UTF-8 とみなす
+    return data.decode(_charset(response) or "utf-8", errors="replace")
+
+
+def fetch_document(url, headers=None, max_chars=100000, timeout=10, session=None):
+    """
+    URLのドキュメントを取得し、Content-Type に応じた方法で本文を抽出する
+
+    Args:
+        url: 取得するURL
+        headers: リクエストヘッダー
+        max_chars: PDF・テキストで読み進める文字数の上限（HTMLは MAX_HTML_BYTES まで読んで全体から抽出する）
+        timeout: タイムアウト（秒）
+        session: requests.Session（Noneなら requests.get を使う）
+
+    Returns:
+        dict: "title", "text", "meta_description", "content_type", "status_code", "bytes_read", "truncated"
+
+    Raises:
+        requests.exceptions.RequestException: 取得に失敗した場合
+        UnsupportedDocumentError: 本文を取り出せない種類のドキュメントの場合
+    """
+    http = session if session is not None else requests
+    headers = dict(headers or {})
+    request_headers = headers
+    if _is_pdf_url(url):
+        # PDFと分かっている場合は最初から先頭ブロックだけを要求し、Range への対応も同時に確かめる
+        request_headers = dict(headers, Range=f"bytes=0-{RANGE_BLOCK_SIZE - 1}")
+
+    response = http.get(url, headers=request_headers, timeout=timeout, stream=True)
+    try:
+        response.raise_for_status()
+        content_type = _content_type(response)
+        result = {"title": None, "text": "", "meta_description": "", "content_type": content_type,
+                  "status_code": response.status_code, "bytes_read": 0, "truncated": False}
+
+        if content_type in PDF_CONTENT_TYPES or (_is_pdf_url(url) and content_type in ("", "application/octet-stream")):
+            pdf = _fetch_pdf(http, url, headers, response, max_chars, timeout)
+            result.update(title=pdf["title"], text=pdf["text"], bytes_read=pdf["bytes_read"],
+                          truncated=pdf["pages_read"] < pdf["total_pages"])
+            return result
+
+        if content_type.startswith(BINARY_CONTENT_PREFIXES) or content_type == "application/octet-stream":
+            raise UnsupportedDocumentError(f"本文を抽出できない形式です（{content_type}）: {url}")
+
+        if response.status_code == 206:
+            # .pdf の URL が PDF 以外を返した場合は、先頭ブロックだけでなく全体を取り直す
+            response.close()
+            response = http.get(url, headers=headers, timeout=timeout, stream=True)
+            response.raise_for_status()
+
+        if content_type in TEXT_CONTENT_TYPES:
+            data, truncated = _read_limited(response, max_chars * TEXT_BYTES_PER_CHAR)
+            text = _decode_text(data, response)
+            result.update(text=text[:max_chars], bytes_read=len(data), truncated=truncated or len(text) > max_chars)
+            return result
+
+        # HTML（Content-Type が不明な場合も HTML とみなす）
+        data, truncated = _read_limited(response, MAX_HTML_BYTES)
+        from bs4 import BeautifulSoup
+        # charset の指定がなければバイト列のまま渡し、<meta charset> から文字コードを判定させる
+        charset = _charset(response)
+        soup = BeautifulSoup(data.decode(charset, errors="replace") if charset else data, "html.parser")
+        meta_tag = soup.find("meta", attrs={"name": "description"})
+        if meta_tag and "content" in meta_tag.attrs:
+            result["meta_description"] = meta_tag["content"]
+        extracted = extract_main_content(soup)
+        result.update(title=extracted["title"], text=extracted["text"], bytes_read=len(data), truncated=truncated)
+        return result
+    finally:
+        response.close()
@@ -0,0 +1,222 @@
+"""
+ドメインごとのスクレイピング実績（応答時間・エラー率・抽出できた本文の量）の記録
+
+スクレイピングのたびに結果を SQLite に記録し、どの検索結果をスクレイピングするかを
+選ぶときに、タイムアウトやアクセス拒否が多いドメイン、本文がほとんど取れないドメインを避ける。
+評価には直近 STATS_WINDOW の記録だけを使い、不調と判定したドメインも BAD_DOMAIN_RETRY ごとに
+1回は試して、回復していれば元に戻す。
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from urllib.parse import urlparse
+
+MAX_SAMPLES_PER_DOMAIN = 100  # ドメインごとに保持する直近の記録数
+MIN_FETCHES_FOR_JUDGE = 3     # 不調と判定するのに必要な記録数
+BAD_ERROR_RATE = 0.67         # これ以上のエラー率のドメインは不調とみなす
+BAD_TEXT_YIELD = 200          # 成功時の本文の文字数の中央値がこれ未満なら不調とみなす
+GOOD_TEXT_YIELD = 2000        # この文字数以上取れれば本文量として十分とみなす
+SLOW_LATENCY = 5.0            # 応答時間の評価の基準（秒）
+STATS_WINDOW = 7 * 24 * 60 * 60      # 評価に使う記録の期間（秒、これより古い失敗は忘れる）
+BAD_DOMAIN_RETRY = 6 * 60 * 60       # 不調なドメインを試し直す間隔（秒）
+RANK_DECAY = 0.2              # 検索結果の順位の評価（1 / (1 + RANK_DECAY * 順位)）の下がり方
+RANK_WEIGHT = 0.7             # 選ぶ順序での検索結果の順位の重み（残りはドメインの評価値）
+
+
+def domain_of(url):
+    """
+    URLからドメイン名を取り出す
+    
+    Args:
+        url: URL
+        
+    Returns:
+        str: ドメイン名（小文字）
+    """
+    return (urlparse(url).hostname or "").lower()
+
+
+def _percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def _is_bad(stats):
+    # 記録が足りていて、エラー率が高いか本文がほとんど取れないドメインなら不調
+    if stats["fetches"] < MIN_FETCHES_FOR_JUDGE:
+        return False
+    if stats["error_rate"] >= BAD_ERROR_RATE:
+        return True
+    return stats["text_yield_p50"] is not None and stats["text_yield_p50"] < BAD_TEXT_YIELD
+
+
+def _score(stats):
+    fetches = stats["fetches"]
+    successes = fetches - round(stats["error_rate"] * fetches)
+    
+    # 記録が少ないドメインでも極端な値にならないよう成功率を平滑化する
+    success_rate = (successes + 1) / (fetches + 2)
+    if stats["text_yield_p50"] is None:
+        yield_factor = 0.5
+    else:
+        yield_factor = min(stats["text_yield_p50"] / GOOD_TEXT_YIELD, 1.0)
+    latency = stats["latency_p90"] if stats["latency_p90"] is not None else SLOW_LATENCY / 2
+    latency_factor = 1 / (1 + latency / SLOW_LATENCY)
+    return success_rate * (0.5 + 0.5 * yield_factor) * latency_factor
+
+
+# 記録のないドメインの統計（試し直すドメインの評価に使う）
+_NO_STATS = {"fetches": 0, "error_rate": 0.0, "latency_p50": None, "latency_p90": None,
+             "text_yield_p50": None, "last_fetched_at": None}
+
+
+class DomainStats:
+    """ドメインごとのスクレイピング実績を永続化して評価するクラス"""
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: 記録を保存するSQLiteのファイルパス
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # スクレイピングのスレッドから書き込むため、接続を共有してロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS fetches (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                domain TEXT NOT NULL,
+                latency REAL NOT NULL,
+                ok INTEGER NOT NULL,
+                text_length INTEGER NOT NULL,
+                status INTEGER,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS fetches_domain ON fetches (domain, id)")
+        self._conn.commit()
+    
+    def record(self, url, latency, ok, text_length=0, status=None):
+        """
+        1回のスクレイピング結果を記録する
+        
+        Args:
+            url: スクレイピングしたURL
+            latency: 所要時間（秒）
+            ok: 成功したかどうか
+            text_length: 抽出できた本文の文字数
+            status: HTTPステータスコード（分かる場合）
+        """
+        domain = domain_of(url)
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO fetches (domain, latency, ok, text_length, status, fetched_at) VALUES (?, ?, ?, ?, ?, ?)",
+                (domain, latency, int(ok), text_length, status, time.time())
+            )
+            # 古い記録は捨てて直近の傾向だけを見る
+            self._conn.execute(
+                "DELETE FROM fetches WHERE domain = ? AND id NOT IN "
+                "(SELECT id FROM fetches WHERE domain = ? ORDER BY id DESC LIMIT ?)",
+                (domain, domain, MAX_SAMPLES_PER_DOMAIN)
+            )
+    
+    def get(self, domain):
+        """
+        ドメインの統計を返す（直近 STATS_WINDOW の記録だけを使う）
+        
+        Args:
+            domain: ドメイン名
+            
+        Returns:
+            dict: 記録数・エラー率・応答時間のパーセンタイル・本文の文字数の中央値・最後に取得した時刻
+        """
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT latency, ok, text_length, fetched_at FROM fetches WHERE domain = ? AND fetched_at >= ?",
+                (domain, time.time() - STATS_WINDOW)
+            ).fetchall()
+        
+        latencies = [latency for latency, _, _, _ in rows]
+        yields = [text_length for _, ok, text_length, _ in rows if ok]
+        errors = sum(1 for _, ok, _, _ in rows if not ok)
+        return {
+            "fetches": len(rows),
+            "error_rate": errors / len(rows) if rows else 0.0,
+            "latency_p50": _percentile(latencies, 50),
+            "latency_p90": _percentile(latencies, 90),
+            "text_yield_p50": _percentile(yields, 50),
+            "last_fetched_at": max((fetched_at for _, _, _, fetched_at in rows), default=None)
+        }
+    
+    def is_bad(self, url):
+        """
+        スクレイピングしても無駄になりやすいドメインかどうかを判定する
+        
+        Args:
+            url: 判定するURL
+            
+        Returns:
+            bool: 不調なドメインならTrue
+        """
+        return _is_bad(self.get(domain_of(url)))
+    
+    def score(self, url):
+        """
+        スクレイピング先としての評価値（0〜1、大きいほど良い）を返す
+        
+        記録のないドメインは成功率・本文量ともに中程度とみなす。
+        
+        Args:
+            url: 評価するURL
+            
+        Returns:
+            float: 評価値
+        """
+        return _score(self.get(domain_of(url)))
+    
+    def choose(self, urls, limit):
+        """
+        不調なドメインを除き、検索結果の順位とドメインの評価を合わせた順にスクレイピング先を選ぶ
+        
+        順位の評価とドメインの評価値を RANK_WEIGHT で重み付けして足し合わせるので、
+        実績の良いドメインでも検索結果の下位にあれば上位の候補より後になる。
+        不調なドメインでも最後の取得から BAD_DOMAIN_RETRY 以上経っていれば、1回の選択につき1件だけ
+        記録のないドメインと同じ評価で候補に戻す（回復したドメインを再び使えるようにするため）。
+        
+        Args:
+            urls: 候補のURLのリスト（検索結果の順）
+            limit: 選ぶ最大件数
+            
+        Returns:
+            tuple: (選んだURLのリスト, 不調のため除外したURLのリスト)
+        """
+        now = time.time()
+        stats_by_domain = {}
+        priorities = {}
+        skipped = []
+        probing = False
+        for rank, url in enumerate(urls):
+            domain = domain_of(url)
+            if domain not in stats_by_domain:
+                stats_by_domain[domain] = self.get(domain)
+            stats = stats_by_domain[domain]
+            if _is_bad(stats):
+                if probing or now - stats["last_fetched_at"] < BAD_DOMAIN_RETRY:
+                    skipped.append(url)
+                    continue
+                probing = True
+                stats = _NO_STATS
+            priorities[url] = RANK_WEIGHT / (1 + RANK_DECAY * rank) + (1 - RANK_WEIGHT) * _score(stats)
+        # 評価が同じ場合は元の順序（検索結果の順位）を保つ
+        ranked = sorted(priorities, key=priorities.get, reverse=True)
+        return ranked[:limit], skipped
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,148 @@
+"""
+セッションをまたいで使うローカル知識インデックス
+
+スクレイピングしたページを SQLite FTS5（trigramトークナイザ）で全文検索できるよう保存する。
+trigram は空白で区切られない日本語でも部分一致で検索できる。
+"""
+
+import os
+import re
+import sqlite3
+import threading
+import time
+
+# クエリを検索語に分けるときの区切り（空白・記号と、漢字・カタカナ・英数字の直後に続くよく使われる助詞）
+# 助詞は文字種が変わる位置だけで区切り、"はじめに" や "ことはじめ" のようなひらがなの語の中では区切らない
+_PARTICLES = "について|における|として|による|とは|では|には|への|から|まで|の|を|と|や|で|が|に|は|へ"
+_TERM_SEPARATOR = re.compile(r"[\s、。，．,!?！？:：;；・/「」『』（）()\[\]【】\"']+"
+                             r"|(?<=[\u30a1-\u30ff\u3400-\u4dbf\u4e00-\u9fff々〆A-Za-z0-9０-９Ａ-Ｚａ-ｚ])(?:" + _PARTICLES + ")"
+                             # 空白の直後（"GPT-4o と Claude"）は、続く文字がひらがなでない場合だけ助詞とみなす
+                             r"|(?<!\S)(?:" + _PARTICLES + r")(?![\u3041-\u3096])")
+
+
+def split_query_terms(query):
+    """
+    検索クエリを検索語のリストに分ける
+    
+    Args:
+        query: 検索クエリ
+        
+    Returns:
+        list: 重複を除いた検索語のリスト
+    """
+    terms = []
+    for term in _TERM_SEPARATOR.split(query):
+        term = term.strip()
+        if term and term not in terms:
+            terms.append(term)
+    return terms
+
+
+class KnowledgeIndex:
+    """スクレイピングしたページを鮮度情報付きで保存する全文検索インデックス"""
+    
+    def __init__(self, path):
+        """
+        Args:
+            path: インデックス（SQLite）のファイルパス
+        """
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self.path = path
+        # スクレイピングのスレッドから書き込むため、接続を共有してロックで保護する
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS documents (
+                id INTEGER PRIMARY KEY,
+                url TEXT UNIQUE NOT NULL,
+                title TEXT,
+                fetched_at REAL NOT NULL
+            )
+        """)
+        try:
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(title, content, tokenize='trigram')")
+        except sqlite3.OperationalError:
+            # trigramトークナイザがない古いSQLite（3.34未満）では既定のトークナイザを使う
+            self._conn.execute("CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(title, content)")
+        self._conn.commit()
+    
+    def add(self, url, title, content, fetched_at=None):
+        """
+        ページをインデックスに追加する（同じURLは最新の内容で置き換える）
+        
+        Args:
+            url: ページのURL
+            title: ページのタイトル
+            content: 本文
+            fetched_at: 取得時刻（UNIX時刻、省略時は現在時刻）
+        """
+        fetched_at = fetched_at or time.time()
+        with self._lock, self._conn:
+            row = self._conn.execute("SELECT id FROM documents WHERE url = ?", (url,)).fetchone()
+            if row:
+                doc_id = row[0]
+                self._conn.execute("UPDATE documents SET title = ?, fetched_at = ? WHERE id = ?", (title, fetched_at, doc_id))
+                self._conn.execute("DELETE FROM documents_fts WHERE rowid = ?", (doc_id,))
+            else:
+                doc_id = self._conn.execute(
+                    "INSERT INTO documents (url, title, fetched_at) VALUES (?, ?, ?)", (url, title, fetched_at)
+                ).lastrowid
+            self._conn.execute("INSERT INTO documents_fts (rowid, title, content) VALUES (?, ?, ?)", (doc_id, title or "", content))
+    
+    def search(self, query, limit=5, max_age_days=None, min_term_coverage=0.6):
+        """
+        クエリに関連するページを検索する
+        
+        3文字以上の検索語でFTS検索して候補を集め、2文字以下の語も含めた
+        検索語全体のうち min_term_coverage 以上を含むページだけを関連ありとみなす。
+        
+        Args:
+            query: 検索クエリ
+            limit: 返す最大件数
+            max_age_days: これより古いページは除外する（Noneなら鮮度を問わない）
+            min_term_coverage: 関連ありとみなす検索語の含有率
+            
+        Returns:
+            list: url, title, content, snippet, fetched_at を持つ辞書のリスト（関連度順）
+        """
+        terms = split_query_terms(query)
+        fts_terms = [term for term in terms if len(term) >= 3]
+        if not fts_terms:
+            return []
+        
+        match = " OR ".join('"' + term.replace('"', '""') + '"' for term in fts_terms)
+        min_fetched_at = time.time() - max_age_days * 86400 if max_age_days else 0
+        
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT d.url, d.title, f.content, snippet(documents_fts, 1, '', '', '…', 32), d.fetched_at
+                FROM documents_fts f JOIN documents d ON d.id = f.rowid
+                WHERE documents_fts MATCH ? AND d.fetched_at >= ?
+                ORDER BY bm25(documents_fts)
+                LIMIT ?
+            """, (match, min_fetched_at, limit * 4)).fetchall()
+        
+        results = []
+        for url, title, content, snippet, fetched_at in rows:
+            text = f"{title}\n{content}"
+            coverage = sum(1 for term in terms if term in text) / len(terms)
+            if coverage >= min_term_coverage:
+                results.append({
+                    "url": url,
+                    "title": title,
+                    "content": content,
+                    "snippet": snippet,
+                    "fetched_at": fetched_at
+                })
+            if len(results) >= limit:
+                break
+        return results
+    
+    def __len__(self):
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM documents").fetchone()[0]
+    
+    def close(self):
+        with self._lock:
+            self._conn.close()
@@ -0,0 +1,261 @@
+"""
+スクレイピングした内容のどこで各モデルが言及されているかの索引
+
+表記ゆれ（"GPT-4.1 mini" と "gpt-4.1-mini"、全角・半角の括弧、"Claude 3.5" と "claude-3-5" など）を
+正規化してモデル名を探し、言及している段落（行）の位置を記録する。
+"Claude 3.5 Sonnet" や "Llama 3.1 405B" のように版・サイズ・"Instruct" を省いた表記は、
+それに当てはまるすべてのモデルの言及として記録する。
+プロンプトを組み立てるときは記録した位置で本文を切り出すだけでよい。
+"""
+
+import re
+import unicodedata
+
+# 表記ゆれを吸収するために空白として扱う区切り文字
+SEPARATOR_CHARS = "-_‐‑‒–—/"
+# 省略されることの多いベンダー名
+VENDOR_PREFIXES = ("amazon ", "meta ", "anthropic ", "openai ", "microsoft ")
+# 省略されることの多い末尾の種類名（"llama 3.1 405b instruct" → "llama 3.1 405b"）
+VARIANT_SUFFIXES = (" instruct", " chat")
+# APIのモデルIDの先頭のプロバイダー名（"us.anthropic.claude-..."）と、末尾に付く日付・版（"...-20241022-v2:0"）
+_MODEL_ID_PREFIX = re.compile(r"^(?:[a-z]+\.)+(?=[a-z])")
+_MODEL_ID_SUFFIX = re.compile(r"(?:\s+(?:20\d{6}|v\d+(?::\d+)?|latest))+$")
+
+
+class _NormalizeTable(dict):
+    """str.translate 用の文字変換表（1文字ずつ正規化し、文字数を変えない）"""
+    
+    def __missing__(self, code):
+        char = chr(code)
+        normalized = unicodedata.normalize("NFKC", char).casefold()
+        if len(normalized) != 1:
+            # 文字数が変わると位置がずれるため、その文字は小文字化だけにとどめる
+            normalized = char.lower() if len(char.lower()) == 1 else char
+        if normalized in SEPARATOR_CHARS:
+            normalized = " "
+        self[code] = normalized
+        return normalized
+
+
+_TABLE = _NormalizeTable()
+
+
+def normalize_text(text):
+    """
+    文字数を変えずに表記ゆれを正規化する（全角→半角、小文字化、区切り文字→空白）
+    
+    Args:
+        text: 正規化する文字列
+        
+    Returns:
+        str: 正規化した文字列（元の文字列と同じ長さ）
+    """
+    return text.translate(_TABLE)
+
+
+def name_aliases(name):
+    """
+    モデル名の表記ゆれの候補を作る
+    
+    Args:
+        name: モデル名
+        
+    Returns:
+        list: 正規化した別名のリスト
+    """
+    base = " ".join(normalize_text(name).split())
+    base = re.sub(r"\s*\(\s*", " (", base).replace(" )", ")")
+    aliases = {base}
+    # 括弧を外した表記（"claude 3.5 sonnet v2"）
+    aliases.add(" ".join(re.sub(r"[()]", " ", base).split()))
+    return sorted(_expand_aliases(aliases), key=len, reverse=True)
+
+
+def family_aliases(name):
+    """
+    版・サイズ・種類名を省いた、複数のモデルに当てはまりうる表記の候補を作る
+    
+    "Claude 3.5 Sonnet（v2）" → "claude 3.5 sonnet"、"Llama 3.1 405B Instruct" → "llama 3.1 405b"、"llama 3.1"
+    
+    Args:
+        name: モデル名
+        
+    Returns:
+        list: 正規化した別名のリスト（name_aliases に含まれるものを除く）
+    """
+    aliases = set()
+    for alias in name_aliases(name):
+        # 版を省いた表記（"claude 3.5 sonnet (v2)" → "claude 3.5 sonnet"）
+        reduced = re.sub(r"\s*\(\s*v\d+\)$|\s+v\d+$", "", alias)
+        # 種類名とサイズを省いた表記（"llama 3.1 405b instruct" → "llama 3.1 405b" → "llama 3.1"）
+        for suffix in VARIANT_SUFFIXES:
+            if reduced.endswith(suffix):
+                reduced = reduced[:-len(suffix)]
+                aliases.add(reduced)
+        aliases.add(reduced)
+        sizeless = re.sub(r"\s+\d+(?:\.\d+)?b$", "", reduced)
+        # バージョン番号まで消える場合（"llama 70b" など）は省かない
+        if re.search(r"\d", sizeless):
+            aliases.add(sizeless)
+    return sorted(_expand_aliases(aliases) - set(name_aliases(name)), key=len, reverse=True)
+
+
+def _expand_aliases(aliases):
+    aliases = set(aliases)
+    # バージョン番号の "." を区切りにした表記（"claude 3 5 sonnet"、"gpt 4 1"）
+    aliases |= {re.sub(r"(\d)\.(\d)", r"\1 \2", alias) for alias in list(aliases)}
+    # ベンダー名を省いた表記（"nova pro"）
+    for alias in list(aliases):
+        for prefix in VENDOR_PREFIXES:
+            if alias.startswith(prefix):
+                aliases.add(alias[len(prefix):])
+    return aliases
+
+
+def _alias_pattern(alias):
+    pattern = re.escape(alias).replace(r"\ ", r"\s+")
+    # 英字と数字の間の空白は省略できる（モデルIDの "llama3-1"、"gpt4o"）
+    pattern = re.sub(r"(?<=[a-z])\\s\+(?=\d)", r"\\s*", pattern)
+    return pattern.replace(r"\s+\(", r"\s*\(")
+
+
+def _alias_key(text):
+    return re.sub(r"\s+", "", text)
+
+
+class MentionIndex:
+    """モデル名ごとに、言及している段落の位置（URL, 開始位置, 終了位置）を保持する索引"""
+    
+    def __init__(self, names):
+        """
+        Args:
+            names: 索引を作る対象のモデル名のリスト
+        """
+        self.names = list(names)
+        # 別名（空白を除いたもの）から、その表記が指すモデル名のリストへの対応
+        self._alias_to_names = {}
+        for name in self.names:
+            for alias in name_aliases(name):
+                self._alias_to_names.setdefault(_alias_key(alias), [name])
+        family = {}
+        for name in self.names:
+            for alias in family_aliases(name):
+                if _alias_key(alias) not in self._alias_to_names:
+                    family.setdefault(_alias_key(alias), []).append(name)
+        self._alias_to_names.update(family)
+        
+        # 長い別名を先に試すことで "gpt 4.1 mini" の中の "gpt 4.1" を誤検出しない
+        aliases = sorted({alias for name in self.names for alias in name_aliases(name) + family_aliases(name)},
+                         key=len, reverse=True)
+        # サイズを省いた表記が別のサイズ（"llama 3.1 8b"）の一部に一致しないよう、直後のサイズも除外する
+        self._pattern = re.compile(r"(?<![0-9a-z])(?:" + "|".join(_alias_pattern(a) for a in aliases) + r")"
+                                   r"(?!\.?[0-9a-z])(?!\s*\d+(?:\.\d+)?b(?![0-9a-z]))")
+        self._mentions = {name: [] for name in self.names}
+    
+    def add_page(self, url, content):
+        """
+        1ページ分の言及箇所を索引に加える
+        
+        Args:
+            url: ページのURL
+            content: ページの本文
+        """
+        normalized = normalize_text(content)
+        for line in re.finditer(r"[^\n]+", normalized):
+            found = {name for match in self._pattern.finditer(line.group(0))
+                     for name in self._alias_to_names[_alias_key(match.group(0))]}
+            for name in found:
+                self._mentions[name].append((url, line.start(), line.end()))
+    
+    @classmethod
+    def build(cls, corpus, names):
+        """
+        コーパスストアの全ページから索引を作る
+        
+        Args:
+            corpus: スクレイピングしたページを保存したCorpusStore
+            names: 対象のモデル名のリスト
+            
+        Returns:
+            MentionIndex: 作成した索引
+        """
+        index = cls(names)
+        for page in corpus.iter_pages():
+            index.add_page(page["url"], page["content"])
+        return index
+    
+    def canonical_name(self, text):
+        """
+        表記ゆれのあるモデル名（"o1-mini"、"Claude 3.5 Sonnet (v2)" など）を対象のモデル名に対応付ける
+        
+        Args:
+            text: モデル名の表記
+            
+        Returns:
+            str: 対象のモデル名（どのモデルの表記とも一致しなければNone）
+        """
+        text = " ".join(normalize_text(text).split())
+        match = self._pattern.fullmatch(text) or self._pattern.fullmatch(_MODEL_ID_SUFFIX.sub("", _MODEL_ID_PREFIX.sub("", text)))
+        if match is None:
+            return None
+        # 複数のモデルに当てはまる表記（"claude 3.5 sonnet"）は先に指定したモデルに対応付ける
+        return self._alias_to_names[_alias_key(match.group(0))][0]
+    
+    def mentions(self, name):
+        """
+        モデルに言及している段落の位置を返す
+        
+        Args:
+            name: モデル名
+            
+        Returns:
+            list: (URL, 開始位置, 終了位置) のリスト
+        """
+        return self._mentions.get(name, [])
+    
+    def counts(self):
+        """
+        モデルごとの言及段落数を返す
+        
+        Returns:
+            dict: モデル名をキー、段落数を値とする辞書
+        """
+        return {name: len(spans) for name, spans in self._mentions.items()}
+    
+    def passages(self, name, corpus, max_chars):
+        """
+        記録した位置をもとに、モデルに言及している段落をページごとにまとめて返す
+        
+        Args:
+            name: モデル名
+            corpus: 索引を作ったCorpusStore
+            max_chars: 返す最大文字数
+            
+        Returns:
+            str: 抜粋（ページごとにURLの見出し付き）、言及がなければ空文字列
+        """
+        spans_by_url = {}
+        for url, start, end in self.mentions(name):
+            spans_by_url.setdefault(url, []).append((start, end))
+        
+        sections = []
+        total = 0
+        for url, spans in spans_by_url.items():
+            content = corpus.get(url)["content"]
+            header = f"\n## URL: {url}\n"
+            section = header + "\n".join(content[start:end] for start, end in spans) + "\n\n"
+            remaining = max_chars - total
+            if len(section) > remaining:
+                # 上限を超えるページは捨てずに残りの文字数まで切り詰める
+                # （最初のページだけで上限を超えると抜粋が空になり、最も言及の多いモデルの根拠がなくなるため）
+                section = section[:remaining]
+                line_end = section.rfind("\n")
+                if line_end > len(header):
+                    # 途中で切れた段落は含めない
+                    section = section[:line_end + 1]
+                if len(section) > len(header):
+                    sections.append(section)
+                break
+            sections.append(section)
+            total += len(section)
+        return "".join(sections)
@@ -0,0 +1,220 @@
+"""
+実行全体のプロファイル（cProfile）と、CPU時間とネットワーク待ちを分けたホットパスの表示
+
+--profile を指定したスクリプトで profiler.start() を呼ぶと、プロセス終了時に
+全スレッドの計測結果をまとめて .prof ファイル（pstats / snakeviz で開ける）に書き出し、
+上位の関数を次の2つに分けて表示する。
+
+    - CPU時間      : 正規表現・HTML解析・文字列の組み立てなど、Pythonの処理そのものにかかった時間
+    - ネットワーク待ち: ソケットの送受信・TLS・名前解決・select など、応答を待っていた時間
+
+ロックの獲得や time.sleep（ほかのスレッドの完了やレート制限の待ち）はどちらにも含めず別に集計する。
+各関数には、その時間を使った呼び出し元のうちこのリポジトリの関数（例: clean_report ← re.sub）を添える。
+
+Python 3.11 以前の cProfile は有効にしたスレッドしか計測しないため、スクレイピングなどの
+スレッドプールのスレッドごとにプロファイラを開始して、終了時に合算する。
+Python 3.12 以降の cProfile は sys.monitoring で全スレッドを計測する（同時に1つしか有効にできない）。
+"""
+
+import atexit
+import os
+import re
+import sys
+import threading
+import time
+
+# cProfile / pstats は --profile を指定したときだけ読み込む
+
+DEFAULT_TOP = 25  # 表示する関数の数
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MAX_CALLER_DEPTH = 30  # リポジトリの呼び出し元を探すときにさかのぼる最大の深さ
+
+# ネットワークの応答を待つ組み込み関数
+NETWORK_WAIT_PATTERN = re.compile(
+    r"'(recv|recv_into|recvfrom|send|sendall|connect|connect_ex|accept)' of '_socket\.socket'|"
+    r"'(read|write|do_handshake)' of '_ssl\._SSLSocket'|getaddrinfo|gethostbyname|select\.select|'(poll|select)' of 'select\."
+)
+# ほかのスレッド・タイマーを待つ組み込み関数（ネットワーク待ちとも CPU時間とも別に数える。
+# スレッドプールの空いているスレッドが次の処理を待つ SimpleQueue.get も含む）
+OTHER_WAIT_PATTERN = re.compile(r"'acquire' of '_thread\.|time\.sleep|'get' of '_queue\.SimpleQueue'")
+
+
+class _Snapshot:
+    # 別スレッドで有効にしたプロファイラを、そのスレッドの計測を止めずに pstats に渡すための入れ物
+    def __init__(self, profile):
+        profile.snapshot_stats()
+        self.stats = profile.stats
+
+    def create_stats(self):
+        pass
+
+
+def _function_name(key):
+    filename, line, name = key
+    if filename == "~":
+        return name
+    path = os.path.relpath(filename, REPO_DIR) if filename.startswith(REPO_DIR) else os.path.basename(filename)
+    return f"{name} ({path}:{line})"
+
+
+def _category(key):
+    # 関数をネットワーク待ち・その他の待ち・CPU時間のいずれかに分類する
+    if key[0] != "~":
+        return "cpu"
+    if NETWORK_WAIT_PATTERN.search(key[2]):
+        return "network"
+    if OTHER_WAIT_PATTERN.search(key[2]):
+        return "wait"
+    return "cpu"
+
+
+def _is_repo_function(key):
+    filename = key[0]
+    return filename.startswith(REPO_DIR) and os.sep + "site-packages" + os.sep not in filename
+
+
+def _repo_caller(stats, key):
+    """
+    その関数を最も多くの時間呼び出した経路をさかのぼり、最初に見つかったリポジトリの関数を返す
+
+    Returns:
+        str: 呼び出し元の関数名（見つからなければNone）
+    """
+    seen = {key}
+    for _ in range(MAX_CALLER_DEPTH):
+        callers = stats[key][4] if key in stats else {}
+        candidates = [caller for caller in callers if caller not in seen]
+        if not candidates:
+            return None
+        # 累積時間（呼び出し元ごとの値の4番目）が最も大きい呼び出し元をたどる
+        key = max(candidates, key=lambda caller: callers[caller][3])
+        if _is_repo_function(key):
+            return key[2]
+        seen.add(key)
+    return None
+
+
+class RunProfiler:
+    """実行全体（全スレッド）の cProfile を取り、終了時に書き出して要約を表示するクラス"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._profiles = []
+        self._main = None
+        self._profile_class = None
+        self.path = None
+        self.top = DEFAULT_TOP
+        self._started = None
+
+    def start(self, path, top=DEFAULT_TOP):
+        """
+        計測を開始し、プロセス終了時に結果を書き出して表示するよう登録する
+
+        Args:
+            path: 計測結果（.prof）の書き出し先
+            top: 表示する関数の数
+        """
+        if self._main is not None:
+            return
+        import cProfile
+        self._profile_class = cProfile.Profile
+        self.path = path
+        self.top = top
+        self._started = (time.perf_counter(), time.process_time())
+        if sys.version_info < (3, 12):
+            # これから開始するスレッドでは、最初の関数呼び出しのときにそのスレッド用のプロファイラを開始する
+            threading.setprofile(self._start_thread)
+        self._main = self._profile_class()
+        self._main.enable()
+        atexit.register(self.finish)
+
+    def _start_thread(self, frame, event, arg):
+        sys.setprofile(None)
+        profile = self._profile_class()
+        with self._lock:
+            self._profiles.append(profile)
+        profile.enable()
+
+    def stop(self):
+        """
+        計測を止めて、全スレッドの結果を合算する
+
+        Returns:
+            pstats.Stats: 計測結果（開始していなければNone）
+        """
+        import pstats
+
+        if self._main is None:
+            return None
+        threading.setprofile(None)
+        self._main.disable()
+        stats = pstats.Stats(self._main)
+        with self._lock:
+            profiles, self._profiles = self._profiles, []
+        for profile in profiles:
+            stats.add(_Snapshot(profile))
+        self._main = None
+        return stats
+
+    def finish(self):
+        # 計測を止めて結果を書き出し、要約を表示する（atexit から呼ばれる）
+        started = self._started
+        stats = self.stop()
+        if stats is None:
+            return
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        stats.dump_stats(self.path)
+        wall = time.perf_counter() - started[0]
+        cpu = time.process_time() - started[1]
+        print_report(stats, self.top, wall, cpu, self.path)
+
+
+def print_report(stats, top=DEFAULT_TOP, wall=None, cpu=None, path=None):
+    """
+    CPU時間・ネットワーク待ちそれぞれの上位の関数を表示する
+
+    時間は各関数の自身の処理時間（tottime）を全スレッドで合計したもので、
+    スレッドが並行して動いていれば実行時間より大きくなる。
+
+    Args:
+        stats: pstats.Stats
+        top: 表示する関数の数
+        wall: 実行時間（秒）
+        cpu: プロセスのCPU時間（秒）
+        path: 計測結果の書き出し先
+    """
+    entries = {"cpu": [], "network": [], "wait": []}
+    for key, (_, calls, self_time, cumulative, _) in stats.stats.items():
+        entries[_category(key)].append((self_time, cumulative, calls, key))
+    totals = {category: sum(entry[0] for entry in values) for category, values in entries.items()}
+
+    print(f"\n===== プロファイル{f'（{path}）' if path else ''} =====")
+    if wall is not None:
+        print(f"実行時間 {wall:.2f}秒 / プロセスのCPU時間 {cpu:.2f}秒")
+    print(f"全スレッドの合計: CPU {totals['cpu']:.2f}秒 / ネットワーク待ち {totals['network']:.2f}秒 / "
+          f"ロック・sleepの待ち {totals['wait']:.2f}秒")
+
+    for category, heading in (("cpu", "CPU時間"), ("network", "ネットワーク待ち")):
+        print(f"\n--- {heading}の上位{top}関数 ---")
+        print(f"{'自身(s)':>9} {'累積(s)':>9} {'呼出回数':>9}  関数  <- リポジトリ内の呼び出し元")
+        for self_time, cumulative, calls, key in sorted(entries[category], key=lambda entry: entry[0], reverse=True)[:top]:
+            caller = None if _is_repo_function(key) else _repo_caller(stats.stats, key)
+            print(f"{self_time:9.3f} {cumulative:9.3f} {calls:9d}  {_function_name(key)}{f'  <- {caller}' if caller else ''}")
+
+    # このリポジトリの関数は累積時間（呼び出した先の処理と待ちを含む）でも並べる
+    repo_entries = [entry for entry in entries["cpu"] if _is_repo_function(entry[3])]
+    print(f"\n--- リポジトリ内の関数の累積時間の上位{top}（待ちを含む）---")
+    for self_time, cumulative, calls, key in sorted(repo_entries, key=lambda entry: entry[1], reverse=True)[:top]:
+        print(f"{self_time:9.3f} {cumulative:9.3f} {calls:9d}  {_function_name(key)}")
+
+
+# スクリプト全体で共有するプロファイラ
+profiler = RunProfiler()
+
+
+def default_profile_path(script_name):
+    # profiles/<スクリプト名>-<日時>.prof
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join("profiles", f"{os.path.splitext(os.path.basename(script_name))[0]}-{stamp}.prof")
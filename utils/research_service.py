@@ -0,0 +1,308 @@
+"""
+調査ジョブを受け付けるローカルHTTPサービス
+
+ジョブキューと固定数のワーカースレッドで調査を実行し、同時に動く調査の数を制限する。
+ワーカーは同じプロセス内で動くため、APIクライアントやHTTPの接続プールは使い回される。
+
+    POST /jobs                 {"query": "...", "iterations": 3} を投入（202で "id" を返す、iterations は1〜MAX_ITERATIONS）
+    GET  /jobs                 ジョブの一覧
+    GET  /jobs/<id>?since=N    ジョブの状態とN件目以降の進捗メッセージ
+    GET  /jobs/<id>/events     進捗をServer-Sent Eventsで配信（完了するまで接続を保つ）
+    GET  /jobs/<id>/report     最終レポート（Markdown、未完了なら409）
+
+終わったジョブは DEFAULT_FINISHED_JOB_TTL の間だけ保持し、保持数が DEFAULT_MAX_FINISHED_JOBS を
+超えたら古いものから削除する（常駐しても完了したレポートと進捗がメモリに溜まり続けないように）。
+"""
+
+import json
+import queue
+import threading
+import time
+import traceback
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+JOB_STATUSES = ("queued", "running", "done", "error")
+DEFAULT_ITERATIONS = 3   # iterations を省略したジョブの検索の最大繰り返し回数
+MAX_ITERATIONS = 20      # 1つのジョブで指定できる検索の最大繰り返し回数
+DEFAULT_FINISHED_JOB_TTL = 24 * 60 * 60  # 終わったジョブ（レポートと進捗）を保持する秒数
+DEFAULT_MAX_FINISHED_JOBS = 200          # 保持する終わったジョブの上限（超えたら古いものから削除）
+
+
+class Job:
+    """1件の調査ジョブ（進捗メッセージを溜め、待っているスレッドに知らせる）"""
+
+    def __init__(self, job_id, params):
+        self.id = job_id
+        self.params = params
+        self.status = "queued"
+        self.events = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._condition = threading.Condition()
+
+    def log(self, message):
+        """進捗メッセージを追加する（run_research の log に渡す）"""
+        with self._condition:
+            self.events.append({"time": time.time(), "message": str(message).strip()})
+            self._condition.notify_all()
+
+    def set_status(self, status, result=None, error=None):
+        with self._condition:
+            self.status = status
+            if status == "running":
+                self.started_at = time.time()
+            elif status in ("done", "error"):
+                self.finished_at = time.time()
+                self.result = result
+                self.error = error
+            self._condition.notify_all()
+
+    @property
+    def finished(self):
+        return self.status in ("done", "error")
+
+    def wait_events(self, since, timeout):
+        """
+        since 件目以降の進捗が届くか、ジョブが終わるまで待つ
+
+        Args:
+            since: 既に受け取った進捗の件数
+            timeout: 最大の待ち時間（秒）
+
+        Returns:
+            tuple: (新しい進捗のリスト, ジョブが終わったかどうか)
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: len(self.events) > since or self.finished, timeout)
+            return self.events[since:], self.finished
+
+    def summary(self, since=None):
+        # APIで返すジョブの情報
+        info = {
+            "id": self.id,
+            "status": self.status,
+            "params": self.params,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "event_count": len(self.events),
+            "error": self.error
+        }
+        if since is not None:
+            info["events"] = self.events[since:]
+        return info
+
+
+class JobManager:
+    """ジョブキューと、同時実行数を制限するワーカースレッド"""
+
+    def __init__(self, runner, max_jobs=4, max_queue=100, finished_ttl=DEFAULT_FINISHED_JOB_TTL,
+                 max_finished=DEFAULT_MAX_FINISHED_JOBS):
+        """
+        Args:
+            runner: Job を受け取って結果の辞書を返す関数（"final_report" を含む）
+            max_jobs: 同時に実行するジョブの上限
+            max_queue: 実行待ちにできるジョブの上限
+            finished_ttl: 終わったジョブを保持する秒数
+            max_finished: 保持する終わったジョブの上限
+        """
+        self.runner = runner
+        self.finished_ttl = finished_ttl
+        self.max_finished = max_finished
+        self.jobs = {}
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._lock = threading.Lock()
+        self._workers = [threading.Thread(target=self._work, name=f"job-worker-{i}", daemon=True) for i in range(max_jobs)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, params, job_id=None):
+        """
+        ジョブを投入する
+
+        Args:
+            params: runner に渡すパラメータ
+            job_id: ジョブID（省略時は自動生成）
+
+        Returns:
+            Job: 投入したジョブ
+
+        Raises:
+            queue.Full: 実行待ちのジョブが上限に達している場合
+        """
+        job = Job(job_id or f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}", params)
+        with self._lock:
+            self._queue.put_nowait(job)
+            self.jobs[job.id] = job
+        return job
+
+    def get(self, job_id):
+        with self._lock:
+            self._evict()
+            return self.jobs.get(job_id)
+
+    def list(self):
+        with self._lock:
+            self._evict()
+            return list(self.jobs.values())
+
+    def _evict(self):
+        # 保持期間を過ぎた、または上限を超えた終わったジョブを古いものから削除する（_lock を取得して呼ぶ）
+        now = time.time()
+        finished = sorted((job for job in self.jobs.values() if job.finished), key=lambda job: job.finished_at)
+        expired = [job for job in finished if now - job.finished_at > self.finished_ttl]
+        remaining = finished[len(expired):]
+        if len(remaining) > self.max_finished:
+            expired.extend(remaining[:len(remaining) - self.max_finished])
+        for job in expired:
+            del self.jobs[job.id]
+
+    def _work(self):
+        while True:
+            job = self._queue.get()
+            job.set_status("running")
+            try:
+                result = self.runner(job)
+                job.set_status("done", result=result)
+            except Exception as e:
+                job.log(traceback.format_exc())
+                job.set_status("error", error=str(e))
+            finally:
+                self._queue.task_done()
+                with self._lock:
+                    self._evict()
+
+
+class ResearchRequestHandler(BaseHTTPRequestHandler):
+    """調査ジョブのHTTP API（server.manager に JobManager を持たせて使う）"""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        # アクセスログは出さない（進捗はジョブごとに確認できる）
+        pass
+
+    def _send(self, status, body, content_type="application/json; charset=utf-8"):
+        if not isinstance(body, (bytes, str)):
+            body = json.dumps(body, ensure_ascii=False)
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _route(self):
+        # パスを ("jobs", ジョブID, 操作) に分解する
+        parsed = urlparse(self.path)
+        parts = [part for part in parsed.path.split("/") if part]
+        query = parse_qs(parsed.query)
+        if not parts or parts[0] != "jobs" or len(parts) > 3:
+            return None, None, None, query
+        return parts[0], (parts[1] if len(parts) > 1 else None), (parts[2] if len(parts) > 2 else None), query
+
+    def do_POST(self):
+        resource, job_id, action, _ = self._route()
+        if resource != "jobs" or job_id is not None:
+            self._send(404, {"error": "not found"})
+            return
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            params = json.loads(self.rfile.read(length) or b"{}")
+        except (ValueError, json.JSONDecodeError):
+            self._send(400, {"error": "リクエスト本文はJSONで指定してください"})
+            return
+        if not isinstance(params, dict) or not isinstance(params.get("query"), str) or not params["query"].strip():
+            self._send(400, {"error": "query を指定してください"})
+            return
+        iterations = params.get("iterations", DEFAULT_ITERATIONS)
+        # bool は int のサブクラスなので別に除く
+        if not isinstance(iterations, int) or isinstance(iterations, bool) or not 1 <= iterations <= MAX_ITERATIONS:
+            self._send(400, {"error": f"iterations には1〜{MAX_ITERATIONS}の整数を指定してください"})
+            return
+        params = dict(params, query=params["query"].strip(), iterations=iterations)
+        try:
+            job = self.server.manager.submit(params)
+        except queue.Full:
+            self._send(503, {"error": "実行待ちの調査が上限に達しています"})
+            return
+        self._send(202, {"id": job.id, "status": job.status})
+
+    def do_GET(self):
+        resource, job_id, action, query = self._route()
+        if resource != "jobs":
+            self._send(404, {"error": "not found"})
+            return
+        if job_id is None:
+            self._send(200, {"jobs": [job.summary() for job in self.server.manager.list()]})
+            return
+
+        since = query.get("since", ["0"])[0]
+        if not (since.isascii() and since.isdigit()):
+            self._send(400, {"error": "since には0以上の整数を指定してください"})
+            return
+        since = int(since)
+
+        job = self.server.manager.get(job_id)
+        if job is None:
+            self._send(404, {"error": f"ジョブ {job_id} はありません（終わってから時間が経ったジョブは削除されます）"})
+        elif action is None:
+            self._send(200, job.summary(since=since))
+        elif action == "report":
+            if job.status != "done":
+                self._send(409, {"error": f"ジョブは {job.status} です", "status": job.status})
+            else:
+                self._send(200, job.result["final_report"], "text/markdown; charset=utf-8")
+        elif action == "events":
+            self._stream_events(job, since)
+        else:
+            self._send(404, {"error": "not found"})
+
+    def _stream_events(self, job, since):
+        # 進捗をServer-Sent Eventsで送り、ジョブが終わったら status イベントを送って閉じる
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream; charset=utf-8")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        try:
+            while True:
+                events, finished = job.wait_events(since, timeout=15)
+                for event in events:
+                    self.wfile.write(f"data: {json.dumps(event, ensure_ascii=False)}\n\n".encode("utf-8"))
+                since += len(events)
+                if finished and not events:
+                    self.wfile.write(f"event: status\ndata: {json.dumps(job.summary(), ensure_ascii=False)}\n\n".encode("utf-8"))
+                    break
+                if not events:
+                    # 接続を保つためのコメント行
+                    self.wfile.write(b": keep-alive\n\n")
+                self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+
+
+def serve_jobs(manager, host="127.0.0.1", port=8765):
+    """
+    HTTP APIを起動して止められるまで待ち受ける
+
+    Args:
+        manager: JobManager
+        host: 待ち受けアドレス
+        port: 待ち受けポート（0なら空いているポート）
+    """
+    server = ThreadingHTTPServer((host, port), ResearchRequestHandler)
+    server.daemon_threads = True
+    server.manager = manager
+    print(f"調査サービスを http://{server.server_address[0]}:{server.server_address[1]} で起動しました")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
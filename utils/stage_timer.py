@@ -0,0 +1,82 @@
+"""
+処理段階（検索・スクレイピング・LLM呼び出しなど）ごとの所要時間の計測
+
+環境変数 STAGE_TIMINGS_FILE が設定されている場合、プロセス終了時に
+計測結果をそのファイルへJSONで書き出す（ベンチマークから利用する）。
+"""
+
+import atexit
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+
+class StageTimer:
+    """段階名ごとに所要時間（秒）を記録するクラス"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self.records = {}
+    
+    @contextmanager
+    def stage(self, name):
+        """
+        with文で囲んだ処理の所要時間を記録する
+        
+        Args:
+            name: 段階名
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.records.setdefault(name, []).append(elapsed)
+            collector = getattr(self._local, "collector", None)
+            if collector is not None:
+                collector.setdefault(name, []).append(elapsed)
+    
+    @contextmanager
+    def collect(self):
+        """
+        with文の中でこのスレッドが記録した所要時間を別に集める（並行する調査ごとの内訳に使う）
+        
+        Returns:
+            dict: 段階名をキー、所要時間のリストを値とする辞書（with文を抜けた時点で確定）
+        """
+        records = {}
+        self._local.collector = records
+        try:
+            yield records
+        finally:
+            self._local.collector = None
+    
+    def dump(self, path):
+        """
+        計測結果をJSONファイルに書き出す
+        
+        Args:
+            path: 書き出し先のファイルパス
+        """
+        with self._lock:
+            records = {name: list(durations) for name, durations in self.records.items()}
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(records, f, ensure_ascii=False)
+
+
+# スクリプト全体で共有するタイマー
+timer = StageTimer()
+stage = timer.stage
+
+
+def _dump_on_exit():
+    path = os.getenv("STAGE_TIMINGS_FILE")
+    if path:
+        timer.dump(path)
+
+
+atexit.register(_dump_on_exit)